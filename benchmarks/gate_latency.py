@@ -0,0 +1,67 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+Benchmark of the per-gate latency of the installed backends of :mod:`mrmustard.math`.
+
+Each gate is applied to a squeezed state (phase space) and to a Fock state with few modes, where
+the fixed per-call overhead of a backend dominates the run time.
+
+Run with ``python benchmarks/gate_latency.py``.
+"""
+
+import timeit
+
+from mrmustard import settings
+from mrmustard.math import _BACKENDS
+from mrmustard.lab.gates import Attenuator, BSgate, Dgate, Rgate, Sgate
+from mrmustard.lab.states import Fock, SqueezedVacuum
+from mrmustard.utils.cache import fock_cache
+
+GATES = {
+    "Sgate": lambda: Sgate([0.2], [0.1]),
+    "Dgate": lambda: Dgate([0.2], [0.1]),
+    "Rgate": lambda: Rgate([0.3]),
+    "BSgate": lambda: BSgate(0.3, 0.1),
+    "Attenuator": lambda: Attenuator([0.8]),
+}
+
+
+def time_gate(gate, fock: bool, number: int = 50) -> float:
+    r"""Returns the time in microseconds to apply ``gate`` to a state with as many modes."""
+    num_modes = len(gate.modes)
+    if fock:
+        state = Fock([5] * num_modes)
+        run = lambda: (state >> gate).dm()
+    else:
+        state = SqueezedVacuum([0.3] * num_modes)
+        run = lambda: (state >> gate).cov
+    run()  # warm-up (tracing, numba compilation, cache)
+    timer = timeit.Timer(run)
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e6
+
+
+if __name__ == "__main__":
+    backends = list(_BACKENDS)
+    print(f"{'gate':<12}{'state':<10}" + "".join(f"{b:>14}" for b in backends) + "   (us/gate)")
+    for fock in [False, True]:
+        for name, make_gate in GATES.items():
+            times = []
+            for backend in backends:
+                settings.backend = backend
+                fock_cache.clear()
+                times.append(time_gate(make_gate(), fock))
+            kind = "fock" if fock else "gaussian"
+            print(f"{name:<12}{kind:<10}" + "".join(f"{t:14.1f}" for t in times))
+    settings.backend = "tensorflow"
@@ -0,0 +1,305 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+Benchmark suite of the Gaussian and Fock hot paths of Mr Mustard.
+
+Each benchmark case is a function decorated with :func:`benchmark`, which declares the grid of
+parameters (e.g. number of modes and cutoffs) it runs over. A case builds its inputs and returns
+the callable to time, so that only the hot path is measured. Each callable is run once to warm
+up (tracing, Numba compilation), then timed with :mod:`timeit` over ``repeat`` rounds.
+
+The results are written to a JSON file together with a description of the machine, the versions
+of the dependencies, the backend and the git revision, so that the runs of different commits can
+be compared:
+
+.. code-block:: bash
+
+    python benchmarks/hot_paths.py --output before.json
+    # ... change the code ...
+    python benchmarks/hot_paths.py --output after.json --compare before.json
+
+Use ``--filter`` to run the cases whose name contains a string and ``--backend`` to select the
+backend of :mod:`mrmustard.math`.
+"""
+
+import argparse
+import datetime
+import importlib
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+from mrmustard import settings
+from mrmustard.lab import Circuit, GaussianEngine
+from mrmustard.lab.abstract import State
+from mrmustard.lab.detectors import PNRDetector
+from mrmustard.lab.gates import Attenuator, BSgate, Dgate, Ggate, Interferometer, Sgate
+from mrmustard.lab.states import SqueezedVacuum, Thermal, Vacuum
+from mrmustard.math import Math
+from mrmustard.physics import fock, gaussian, gbs
+from mrmustard.utils.cache import fock_cache
+from mrmustard.utils import xptensor
+from mrmustard.utils.training import Optimizer, _trainable_parameters
+
+math = Math()
+
+CASES = []
+
+
+def benchmark(name: str, **grid):
+    r"""Registers a benchmark case that runs over the product of the values in ``grid``.
+
+    The decorated function takes the parameters of the grid as keyword arguments and returns the
+    callable to time.
+    """
+
+    def register(setup):
+        keys = list(grid)
+        for values in itertools.product(*grid.values()):
+            CASES.append((name, dict(zip(keys, values)), setup))
+        return setup
+
+    return register
+
+
+def mixed_state(num_modes: int):
+    r"""A mixed Gaussian state with correlations between all the modes."""
+    state = Thermal(nbar=[0.3] * num_modes) >> Sgate([0.2] * num_modes, [0.1] * num_modes)
+    return state >> Ggate(num_modes) >> Attenuator([0.9] * num_modes)
+
+
+@benchmark("fock.fock_representation[pure]", num_modes=[1, 2, 3], cutoff=[10, 20, 40])
+def fock_representation_pure(num_modes, cutoff):
+    state = SqueezedVacuum([0.3] * num_modes) >> Ggate(num_modes)
+    cov, means = state.cov, state.means
+    return lambda: fock.fock_representation(cov, means, shape=[cutoff] * num_modes, return_dm=False)
+
+
+@benchmark("fock.fock_representation[mixed]", num_modes=[1, 2], cutoff=[5, 10, 20])
+def fock_representation_mixed(num_modes, cutoff):
+    state = mixed_state(num_modes)
+    cov, means = state.cov, state.means
+    shape = [cutoff] * 2 * num_modes
+    return lambda: fock.fock_representation(cov, means, shape=shape, return_dm=True)
+
+
+@benchmark("gaussian.CPTP", num_modes=[2, 10, 50])
+def gaussian_CPTP(num_modes):
+    state = mixed_state(num_modes)
+    X, Y, d = (Ggate(num_modes) >> Attenuator([0.8] * num_modes)).XYd
+    modes = list(range(num_modes))
+    return lambda: gaussian.CPTP(state.cov, state.means, X, Y, d, modes, modes)
+
+
+@benchmark("gaussian.CPTP[few modes]", num_modes=[100, 500], channel=["Attenuator", "Sgate"])
+def gaussian_CPTP_few_modes(num_modes, channel):
+    state = Thermal(nbar=[0.3] * num_modes) >> Sgate([0.2] * num_modes, [0.1] * num_modes)
+    ops = {"Attenuator": Attenuator([0.8] * 4, modes=[0, 1, 2, 3]), "Sgate": Sgate([0.1] * 4)}
+    X, Y, d = ops[channel].XYd
+    state_modes = list(range(num_modes))
+    return lambda: gaussian.CPTP(state.cov, state.means, X, Y, d, state_modes, [0, 1, 2, 3])
+
+
+@benchmark("Circuit.XYd", num_modes=[2, 8, 32], layers=[1, 4])
+def circuit_XYd(num_modes, layers):
+    ops = []
+    for _ in range(layers):
+        ops.append(Sgate([0.1] * num_modes, [0.2] * num_modes))
+        ops += [BSgate(0.3, 0.1)[m, m + 1] for m in range(num_modes - 1)]
+        ops.append(Attenuator([0.9] * num_modes))
+    circuit = Circuit(ops)
+    return lambda: circuit.XYd
+
+
+@benchmark("compose_XYd", num_modes=[100], gates=[1000], differentiable=[True, False])
+def compose_XYd(num_modes, gates, differentiable):
+    rng = np.random.default_rng(0)
+    pairs = [rng.choice(num_modes, 2, replace=False).tolist() for _ in range(gates)]
+    channels = [(*BSgate(0.3, 0.1)[a, b].XYd, [a, b]) for a, b in pairs]
+    return lambda: xptensor.compose_XYd(channels, differentiable=differentiable)
+
+
+@benchmark("GaussianEngine", num_modes=[100, 250, 500, 1000])
+def gaussian_engine(num_modes):
+    squeezed = SqueezedVacuum([0.2] * num_modes)
+    cov, means = np.array(squeezed.cov), np.array(squeezed.means)
+    ops = [Sgate([0.1] * num_modes, [0.2] * num_modes)]
+    for layer in range(10):
+        ops += [BSgate(0.3, 0.1)[m, m + 1] for m in range(layer % 2, num_modes - 1, 2)]
+    return lambda: GaussianEngine(cov, means).apply(ops)
+
+
+@benchmark("Transformation.U", gate=["Sgate", "Dgate", "BSgate"], cutoff=[10, 20, 40])
+def transformation_U(gate, cutoff):
+    op = {"Sgate": Sgate([0.3], [0.1]), "Dgate": Dgate([0.3], [0.1]), "BSgate": BSgate(0.3, 0.1)}
+    op = op[gate]
+    cutoffs = [cutoff] * len(op.modes)
+
+    def run():
+        fock_cache.clear()  # time the computation, not the cache lookup
+        return op.U(cutoffs)
+
+    return run
+
+
+@benchmark("FockMeasurement.primal", state=["pure", "mixed"], cutoff=[5, 10, 15])
+def fock_measurement_primal(state, cutoff):
+    if state == "pure":
+        state = State(ket=(SqueezedVacuum([0.3, 0.2]) >> BSgate(0.4)).ket([cutoff, cutoff]))
+    else:
+        state = State(dm=mixed_state(2).dm([cutoff, cutoff]))
+    detector = PNRDetector(efficiency=0.9, dark_counts=0.01, modes=[0])
+    return lambda: detector.primal(state)
+
+
+@benchmark("gbs.pnr_probabilities", num_modes=[2, 4, 8, 16], workers=[1, 4])
+def gbs_pnr_probabilities(num_modes, workers):
+    state = mixed_state(num_modes)
+    patterns = np.random.default_rng(0).poisson(0.3, size=(100, num_modes))
+    return lambda: gbs.pnr_probabilities(state.cov, state.means, patterns, workers=workers)
+
+
+@benchmark("fock.trace", num_modes=[2, 3], cutoff=[5, 10])
+def fock_trace(num_modes, cutoff):
+    dm = mixed_state(num_modes).dm([cutoff] * num_modes)
+    return lambda: fock.trace(dm, keep=[0])
+
+
+@benchmark("gaussian.fidelity", num_modes=[1, 5, 20])
+def gaussian_fidelity(num_modes):
+    a, b = mixed_state(num_modes), mixed_state(num_modes)
+    return lambda: gaussian.fidelity(a.means, a.cov, b.means, b.cov, settings.HBAR)
+
+
+@benchmark("fock.fidelity[mixed]", num_modes=[1, 2], cutoff=[10, 20])
+def fock_fidelity_mixed(num_modes, cutoff):
+    rho = mixed_state(num_modes).dm([cutoff] * num_modes)
+    sigma = (mixed_state(num_modes) >> Dgate([0.1] * num_modes)).dm([cutoff] * num_modes)
+    return lambda: fock.fidelity(rho, sigma, a_ket=False, b_ket=False)
+
+
+@benchmark("Optimizer step", compiled=[False, True])
+def optimizer_step(compiled):
+    np.random.seed(0)
+    G = Ggate(num_modes=2, symplectic_trainable=True)
+    I = Interferometer(num_modes=2, orthogonal_trainable=True)
+    state_in = Vacuum(2)
+
+    def cost_fn():
+        amps = (state_in >> G >> I).ket(cutoffs=[3, 3])
+        return -math.abs(amps[1, 1]) ** 2 + math.abs(amps[0, 1]) ** 2
+
+    opt = Optimizer(symplectic_lr=0.1, orthogonal_lr=0.1)
+    params = _trainable_parameters([G, I])
+    if compiled:
+        return opt._compiled_step(cost_fn, params)  # pylint: disable=protected-access
+    return lambda: opt._step(cost_fn, params)  # pylint: disable=protected-access
+
+
+def time_case(run, repeat: int, min_time: float) -> dict:
+    r"""Times ``run`` and returns the statistics of the time per call in seconds."""
+    run()  # warm-up
+    timer = timeit.Timer(run)
+    number = 1
+    while True:  # as in timeit.Timer.autorange, but with a configurable minimum time
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min": min(times),
+        "mean": statistics.mean(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": repeat,
+        "number": number,
+    }
+
+
+def machine_info() -> dict:
+    r"""Returns a description of the machine, of the installed dependencies and of the revision."""
+    versions = {}
+    for package in ["mrmustard", "numpy", "scipy", "numba", "tensorflow", "torch", "thewalrus"]:
+        module = importlib.import_module(package) if importlib.util.find_spec(package) else None
+        versions[package] = getattr(module, "__version__", None)
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "versions": versions,
+        "backend": settings.backend,
+        "commit": commit,
+    }
+
+
+def run(filter_: str = "", repeat: int = 5, min_time: float = 0.2) -> dict:
+    r"""Runs the benchmark cases whose name contains ``filter_`` and returns the results."""
+    results = []
+    for name, params, setup in CASES:
+        if filter_ not in name:
+            continue
+        fock_cache.clear()
+        params_str = ", ".join(f"{k}={v}" for k, v in params.items())
+        try:
+            stats = time_case(setup(**params), repeat, min_time)
+        except NotImplementedError:  # e.g. gradients on the numpy backend
+            print(f"{name:<34}{params_str:<30}{'not implemented':>15}")
+            continue
+        results.append({"name": name, "params": params, **stats})
+        print(f"{name:<34}{params_str:<30}{stats['min'] * 1e3:12.3f} ms")
+    return {"machine": machine_info(), "benchmarks": results}
+
+
+def compare(results: dict, baseline: dict):
+    r"""Prints the ratio of the minimum times of ``results`` and ``baseline`` for each case."""
+    key = lambda b: (b["name"], json.dumps(b["params"], sort_keys=True))
+    before = {key(b): b["min"] for b in baseline["benchmarks"]}
+    print(f"\n{'case':<64}{'before':>12}{'after':>12}{'ratio':>8}")
+    for b in results["benchmarks"]:
+        if key(b) in before:
+            old = before[key(b)]
+            label = f"{b['name']} {key(b)[1]}"
+            print(f"{label:<64}{old * 1e3:10.3f}ms{b['min'] * 1e3:10.3f}ms{b['min'] / old:8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--output", default="benchmark_results.json", help="the JSON file")
+    parser.add_argument("--filter", default="", help="run the cases whose name contains this")
+    parser.add_argument("--backend", default=settings.backend, help="the backend of math")
+    parser.add_argument("--repeat", type=int, default=5, help="the number of timed rounds")
+    parser.add_argument("--min-time", type=float, default=0.2, help="the minimum time per round")
+    parser.add_argument("--compare", default=None, help="a JSON file of a previous run")
+    args = parser.parse_args()
+
+    settings.backend = args.backend
+    results = run(args.filter, args.repeat, args.min_time)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"results written to {args.output}")
+    if args.compare is not None:
+        compare(results, json.loads(Path(args.compare).read_text()))
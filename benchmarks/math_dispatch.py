@@ -0,0 +1,50 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+Micro-benchmark of the per-call overhead of the :class:`~mrmustard.math.Math` switcher.
+
+It compares the cached dispatch of :class:`~mrmustard.math.Math` with the previous dispatch,
+which checked ``settings.backend`` and constructed the backend object on every attribute lookup.
+
+Run with ``python benchmarks/math_dispatch.py``.
+"""
+
+import timeit
+
+from mrmustard import settings
+from mrmustard.math import Math, TFMath
+
+
+class UncachedMath:
+    r"""The switcher as it was before the backend was cached."""
+
+    def __getattribute__(self, name):
+        if settings.backend == "tensorflow":
+            return object.__getattribute__(TFMath(), name)
+        raise ValueError(f"No `{settings.backend}` backend found.")
+
+
+def time_lookup(switcher, number: int = 1_000_000) -> float:
+    r"""Returns the time per attribute lookup in nanoseconds."""
+    timer = timeit.Timer("switcher.matmul", globals={"switcher": switcher})
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e9
+
+
+if __name__ == "__main__":
+    uncached = time_lookup(UncachedMath())
+    cached = time_lookup(Math())
+    print(f"uncached dispatch: {uncached:8.1f} ns per lookup")
+    print(f"cached dispatch:   {cached:8.1f} ns per lookup")
+    print(f"speedup:           {uncached / cached:8.1f}x")
@@ -10,6 +10,9 @@ class Settings:
 
     def __init__(self):
         self._backend = "tensorflow"
+        self._backend_callbacks = []
+        self._profile = False
+        self._profile_callbacks = []
         self.HBAR = 2.0
         self.CHOI_R = 0.881373587019543  # np.arcsinh(1.0)
         self.DEBUG = False
@@ -24,20 +27,63 @@ class Settings:
         # for the detectors
         self.PNR_INTERNAL_CUTOFF = 50
         self.HOMODYNE_SQUEEZING = 10.0
+        # memory budget (in bytes) of the cache of Fock representations of transformations (0 disables it)
+        self.FOCK_CACHE_MAX_BYTES = 2**28
+        # memory budget (in bytes) of a single Fock tensor (None disables the check): larger tensors
+        # raise a FockMemoryError, or are stored in a numpy.memmap in FOCK_MEMMAP_DIR (None for the
+        # temporary directory) and processed in chunks if FOCK_OUT_OF_CORE is True
+        self.FOCK_MAX_BYTES = 2**34
+        self.FOCK_OUT_OF_CORE = False
+        self.FOCK_MEMMAP_DIR = None
 
     @property
     def backend(self):
         """The backend which is used.
 
-        Can be either ``'tensorflow'`` or ``'torch'``.
+        Can be ``'tensorflow'``, ``'torch'`` or ``'numpy'``. The ``'numpy'`` backend is not
+        differentiable, so it cannot be used to optimize circuits.
         """
         return self._backend
 
     @backend.setter
     def backend(self, backend_name: str):
-        if backend_name not in ["tensorflow", "torch"]:
-            raise ValueError("Backend must be either 'tensorflow' or 'torch'")
+        if backend_name not in ["tensorflow", "torch", "numpy"]:
+            raise ValueError("Backend must be either 'tensorflow', 'torch' or 'numpy'")
+        changed = backend_name != self._backend
         self._backend = backend_name
+        if changed:
+            for callback in self._backend_callbacks:
+                callback(backend_name)
+
+    def on_backend_change(self, callback):
+        """Registers a callback that is called with the new backend name whenever the
+        backend is changed.
+
+        The callback is also called once with the current backend when it is registered.
+        """
+        self._backend_callbacks.append(callback)
+        callback(self._backend)
+
+    @property
+    def PROFILE(self):
+        """Whether the hot paths record their call counts, wall times and tensor sizes.
+
+        See :func:`mrmustard.logger.profile`.
+        """
+        return self._profile
+
+    @PROFILE.setter
+    def PROFILE(self, value: bool):
+        changed = bool(value) != self._profile
+        self._profile = bool(value)
+        if changed:
+            for callback in self._profile_callbacks:
+                callback(self._profile)
+
+    def on_profile_change(self, callback):
+        """Registers a callback that is called with the new value of ``PROFILE`` whenever it is
+        changed."""
+        self._profile_callbacks.append(callback)
 
 
 settings = Settings()
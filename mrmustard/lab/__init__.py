@@ -20,10 +20,12 @@ It contains the items you'd find in a lab:
 * transformations (Sgate, BSgate, LossChannel, etc.)
 * detectors (PNRDetector, Homodyne, etc.)
 * the Circuit class
+* the GaussianEngine, a simulator of Gaussian circuits on many modes
 """
 
 from .circuit import *
 from .states import *
 from .gates import *
 from .detectors import *
+from .gaussian_engine import *
 from .abstract import State
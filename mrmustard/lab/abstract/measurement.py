@@ -18,8 +18,9 @@ from __future__ import annotations
 from abc import ABC
 from mrmustard.math import Math
 
-from mrmustard.types import Tensor, Callable, Sequence, Iterable
+from mrmustard.types import Tensor, Callable, Sequence, Iterable, List
 from mrmustard import settings
+from mrmustard.physics import fock
 from .state import State
 
 math = Math()
@@ -38,6 +39,7 @@ class FockMeasurement(ABC):
     def __init__(self) -> None:
         super().__init__()
         self.modes = None
+        self._channel_cutoffs = None  # the input cutoffs of the current stochastic channels
 
     def primal(self, state: State) -> Tensor:
         r"""
@@ -50,20 +52,22 @@ class FockMeasurement(ABC):
         Returns
             Tensor: a tensor representing the post-measurement state
         """
+        # the photon numbers of the measured modes of a Gaussian state are resolved up to the
+        # internal cutoff, while a state in Fock representation has no photons beyond its cutoffs
         cutoffs = []
-        used = 0
         for mode in state.modes:
-            if mode in self._modes:
-                cutoffs.append(
-                    max(settings.PNR_INTERNAL_CUTOFF, state.cutoffs[state.indices(mode)])
-                )
-                used += 1
-            else:
-                cutoffs.append(state.cutoffs[state.indices(mode)])
-        if self.should_recompute_stochastic_channel() or math.any(
-            [c > settings.PNR_INTERNAL_CUTOFF for c in state.cutoffs]
-        ):
-            self.recompute_stochastic_channel(cutoffs)
+            cutoff = state.cutoffs[state.indices(mode)]
+            if mode in self._modes and state.is_gaussian:
+                cutoff = max(settings.PNR_INTERNAL_CUTOFF, cutoff)
+            cutoffs.append(cutoff)
+        measured_cutoffs = [cutoffs[state.indices(mode)] for mode in self._modes]
+        if self.should_recompute_stochastic_channel() or measured_cutoffs != self._channel_cutoffs:
+            # the channels are cached, so they are only computed for new parameters or cutoffs
+            self.recompute_stochastic_channel(measured_cutoffs)
+            self._channel_cutoffs = measured_cutoffs
+        ket = state.ket(cutoffs) if state.is_pure else None
+        if ket is not None:
+            return self._primal_ket(ket, [state.indices(mode) for mode in self._modes])
         dm = state.dm(cutoffs)
         for k, (mode, stoch) in enumerate(zip(self._modes, self._internal_stochastic_channel)):
             # move the mode indices to the end
@@ -72,7 +76,7 @@ class FockMeasurement(ABC):
             dm = math.transpose(dm, perm)
             # compute sum_m P(meas|m)rho_mm
             dm = math.diag_part(dm)
-            dm = math.tensordot(dm, stoch[: self._cutoffs[k], : dm.shape[-1]], [[-1], [1]])
+            dm = self._apply_stochastic_channel(dm, stoch, k, -1)
         # put back the last len(self.modes) modes at the beginning
         output = math.transpose(
             dm,
@@ -83,6 +87,56 @@ class FockMeasurement(ABC):
             output = math.real(output)  # return probabilities
         return output
 
+    def _primal_ket(self, ket: Tensor, indices: List[int]) -> Tensor:
+        r"""Returns the same tensor as :meth:`primal` for a pure state, without building the
+        density matrix of the whole state.
+
+        The measured modes only enter through the diagonal of the density matrix, i.e. through
+        :math:`\psi_{n,i}\psi^*_{n,j}` where :math:`n` runs over the measured modes and :math:`i, j`
+        over the unmeasured ones. If all the modes are measured this is just :math:`|\psi_n|^2`.
+
+        Args:
+            ket (Tensor): the ket of the state
+            indices (List[int]): the indices of the measured modes in the ket
+
+        Returns:
+            Tensor: a tensor representing the post-measurement state
+        """
+        others = [i for i in range(len(ket.shape)) if i not in indices]
+        ket = math.transpose(ket, indices + others)
+        if others:
+            shape = list(ket.shape)
+            flat = math.reshape(ket, shape[: len(indices)] + [-1])
+            tensor = math.expand_dims(flat, -1) * math.expand_dims(math.conj(flat), -2)
+            tensor = math.reshape(tensor, shape + shape[len(indices) :])
+        else:
+            tensor = math.abs(ket) ** 2
+        for k, stoch in enumerate(self._internal_stochastic_channel):
+            # the measured mode is always the first index and the outcome goes at the end
+            tensor = self._apply_stochastic_channel(tensor, stoch, k, 0)
+        output = math.transpose(
+            tensor,
+            list(range(len(tensor.shape) - len(indices), len(tensor.shape)))
+            + list(range(len(tensor.shape) - len(indices))),
+        )
+        if not others:  # all modes are measured
+            output = math.real(output)  # return probabilities
+        return output
+
+    def _apply_stochastic_channel(self, tensor: Tensor, stoch, k: int, axis: int) -> Tensor:
+        r"""Applies the stochastic channel ``stoch`` of the ``k``-th measured mode to the axis
+        ``axis`` of ``tensor``, which holds the photon numbers of that mode, and returns the tensor
+        with the outcomes at the end.
+
+        The channels computed by the detectors (see :class:`~.fock.PNRChannel`) are applied in
+        factored form, while a user-supplied channel is a dense matrix.
+        """
+        if isinstance(stoch, (fock.PNRChannel, fock.ThresholdChannel)):
+            return stoch.contract(tensor, axis)
+        return math.tensordot(
+            tensor, stoch[: self._cutoffs[k], : tensor.shape[axis]], [[axis], [1]]
+        )
+
     #  pylint: disable=no-self-use
     def should_recompute_stochastic_channel(self) -> bool:  # override in subclasses
         """Returns `True` if the stochastic channel has to be recomputed.
@@ -33,6 +33,7 @@ from mrmustard.types import (
     Iterable,
 )
 from mrmustard.utils import graphics
+from mrmustard.utils.cache import array_key
 from mrmustard import settings
 from mrmustard.physics import gaussian, fock
 from mrmustard.math import Math
@@ -57,6 +58,7 @@ class State:
         modes: Sequence[int] = None,
         cutoffs: Sequence[int] = None,
         _norm: float = 1.0,
+        _purity: Optional[float] = None,
     ):
         r"""Initializes the state.
 
@@ -65,6 +67,11 @@ class State:
             * an eigenvalues array and symplectic matrix
             * a fock representation (ket or dm)
 
+        A batch of Gaussian states can be represented by a single ``State`` by supplying a
+        covariance matrix of shape ``(K, 2N, 2N)`` and a means vector of shape ``(K, 2N)``.
+        Transformations, measurements and the Fock representation then act on all the states of
+        the batch in a single vectorized call.
+
         Args:
             cov (Matrix): the covariance matrix
             means (Vector): the means vector
@@ -74,9 +81,12 @@ class State:
             modes (optional, Sequence[int]): the modes in which the state is defined
             cutoffs (Sequence[int], default=None): set to force the cutoff dimensions of the state
             _norm (float, default=1.0): the norm of the state. Warning: only set if you know what you are doing.
+            _purity (float, default=None): the purity of the state, if it is known without computing
+                it (e.g. for a pure state or after a unitary). Warning: only set if you know what you are doing.
 
         """
-        self._purity = None
+        self._purity = _purity
+        self._williamson = None
         self._fock_probabilities = None
         self._cutoffs = cutoffs
         self._cov = cov
@@ -85,6 +95,7 @@ class State:
         self._symplectic = symplectic
         self._ket = ket
         self._dm = dm
+        self._gaussian_fock_cache = None  # (key, tensor) of the largest Fock tensor computed
         self._norm = _norm
         if cov is not None and means is not None:
             self.is_gaussian = True
@@ -129,13 +140,46 @@ class State:
     @property
     def purity(self) -> float:
         """Returns the purity of the state."""
-        if self._purity is None:
-            if self.is_gaussian:
-                self._purity = gaussian.purity(self.cov, settings.HBAR)
-                # TODO: add symplectic representation
-            else:
-                self._purity = fock.purity(self.fock)  # has to be dm
-        return self._purity
+        if self._purity is not None:
+            return self._purity
+        if self.is_gaussian:
+            purity = gaussian.purity_from_eigenvals(self.symplectic_eigenvalues)
+        else:
+            purity = fock.purity(self.fock)  # has to be dm
+        if math.executing_eagerly():  # traced values must not outlive the trace
+            self._purity = purity
+        return purity
+
+    @property
+    def williamson(self) -> Tuple[Vector, Matrix]:
+        r"""Returns the Williamson decomposition of the covariance matrix of a Gaussian state: the
+        symplectic eigenvalues and the symplectic matrix (see :func:`gaussian.williamson`).
+
+        It is computed once per covariance matrix and shared by the purity, the entropy and the
+        mixedness of the state.
+        """
+        if not self.is_gaussian:
+            raise ValueError("The Williamson decomposition is only defined for Gaussian states.")
+        cov = self.cov
+        if self._williamson is not None and self._williamson[0] is cov:
+            return self._williamson[1]
+        decomposition = gaussian.williamson(cov, settings.HBAR)
+        if math.executing_eagerly():  # traced values must not outlive the trace
+            self._williamson = (cov, decomposition)
+        return decomposition
+
+    @property
+    def symplectic_eigenvalues(self) -> Vector:
+        r"""Returns the symplectic eigenvalues of a Gaussian state in increasing order (one row per
+        state of a batch)."""
+        return self.williamson[0]
+
+    @property
+    def batch_size(self) -> Optional[int]:
+        r"""Returns the number of states in the batch or ``None`` if the state is not batched."""
+        if self.is_gaussian and self._cov is not None and len(self._cov.shape) == 3:
+            return self._cov.shape[0]
+        return None
 
     @property
     def is_mixed(self):
@@ -144,8 +188,15 @@ class State:
 
     @property
     def is_pure(self):
-        r"""Returns ``True`` if the state is pure and ``False`` otherwise."""
-        return np.isclose(self.purity, 1.0, atol=1e-6)
+        r"""Returns ``True`` if the state is pure (all the states of a batch are pure) and ``False`` otherwise.
+
+        While a function is traced (e.g. a compiled training step) a state whose purity is not known
+        without computing it (e.g. the output of a non-unitary channel) is treated as mixed, as its
+        purity has no concrete value to branch on.
+        """
+        if self._purity is None and not math.executing_eagerly():
+            return False
+        return bool(np.all(np.isclose(self.purity, 1.0, atol=1e-6)))
 
     @property
     def means(self) -> Optional[Vector]:
@@ -248,20 +299,19 @@ class State:
             else [c if c is not None else self.cutoffs[i] for i, c in enumerate(cutoffs)]
         )
         if self.is_gaussian:
-            self._ket = fock.fock_representation(
-                self.cov, self.means, shape=cutoffs, return_dm=False
-            )
-        else:  # only fock representation is available
-            if self._ket is None:
-                return None
-            current_cutoffs = list(self._ket.shape[: self.num_modes])
-            if cutoffs != current_cutoffs:
-                paddings = [(0, max(0, new - old)) for new, old in zip(cutoffs, current_cutoffs)]
-                if any(p != (0, 0) for p in paddings):
-                    padded = fock.math.pad(self._ket, paddings, mode="constant")
-                else:
-                    padded = self._ket
-                return padded[tuple(slice(s) for s in cutoffs)]
+            self._ket = self._gaussian_fock(cutoffs, return_dm=False)
+            return self._ket
+        # only fock representation is available
+        if self._ket is None:
+            return None
+        current_cutoffs = list(self._ket.shape[: self.num_modes])
+        if cutoffs != current_cutoffs:
+            paddings = [(0, max(0, new - old)) for new, old in zip(cutoffs, current_cutoffs)]
+            if any(p != (0, 0) for p in paddings):
+                padded = fock.math.pad(self._ket, paddings, mode="constant")
+            else:
+                padded = self._ket
+            return padded[tuple(slice(s) for s in cutoffs)]
         return self._ket
 
     def dm(self, cutoffs: List[int] = None) -> Tensor:
@@ -282,20 +332,63 @@ class State:
             ket = self.ket(cutoffs=cutoffs)
             if ket is not None:
                 return fock.ket_to_dm(ket)
-        else:
-            if self.is_gaussian:
-                self._dm = fock.fock_representation(
-                    self.cov, self.means, shape=cutoffs * 2, return_dm=True
-                )
-            elif cutoffs != (current_cutoffs := list(self._dm.shape[: self.num_modes])):
-                paddings = [(0, max(0, new - old)) for new, old in zip(cutoffs, current_cutoffs)]
-                if any(p != (0, 0) for p in paddings):
-                    padded = fock.math.pad(self._dm, paddings + paddings, mode="constant")
-                else:
-                    padded = self._dm
-                return padded[tuple(slice(s) for s in cutoffs + cutoffs)]
+        elif self.is_gaussian:
+            self._dm = self._gaussian_fock(cutoffs * 2, return_dm=True)
+            return self._dm
+        # only the density matrix in fock representation is available (the state may be pure)
+        if cutoffs != (current_cutoffs := list(self._dm.shape[: self.num_modes])):
+            paddings = [(0, max(0, new - old)) for new, old in zip(cutoffs, current_cutoffs)]
+            if any(p != (0, 0) for p in paddings):
+                padded = fock.math.pad(self._dm, paddings + paddings, mode="constant")
+            else:
+                padded = self._dm
+            return padded[tuple(slice(s) for s in cutoffs + cutoffs)]
         return self._dm
 
+    def _gaussian_fock(self, shape: List[int], return_dm: bool) -> Tensor:
+        r"""Returns the Fock representation of a Gaussian state with the given shape, reusing the
+        largest tensor computed so far for the same covariance matrix and means vector.
+
+        If that tensor is at least as large as ``shape`` along every axis the result is a slice of
+        it, otherwise it is extended by continuing the recursion from its entries. Batched states,
+        states with trainable parameters (whose tensor must be computed in the differentiable
+        context of each call) and traced functions always recompute it.
+
+        Args:
+            shape (List[int]): the shape of the requested tensor
+            return_dm (bool): whether to compute the density matrix or the ket
+
+        Returns:
+            Tensor: the ket or the density matrix
+        """
+        shape = list(shape)
+        if (
+            self.batch_size is not None
+            or getattr(self, "_trainable_parameters", None)
+            or not math.executing_eagerly()
+        ):
+            return fock.fock_representation(self.cov, self.means, shape=shape, return_dm=return_dm)
+        key = (return_dm,) + array_key(self.cov, self.means)
+        tensor = None
+        if self._gaussian_fock_cache is not None and self._gaussian_fock_cache[0] == key:
+            tensor = self._gaussian_fock_cache[1]
+        if tensor is None:
+            tensor = fock.fock_representation(
+                self.cov, self.means, shape=shape, return_dm=return_dm
+            )
+            current = needed = shape
+        else:
+            current = list(tensor.shape)
+            needed = [max(old, new) for old, new in zip(current, shape)]
+        if needed != current:
+            tensor = fock.fock_representation(
+                self.cov, self.means, shape=needed, return_dm=return_dm, known=tensor
+            )
+        self._gaussian_fock_cache = (key, tensor)
+        if needed == shape:
+            return tensor
+        return tensor[tuple(slice(s) for s in shape)]
+
     def fock_probabilities(self, cutoffs: Sequence[int]) -> Tensor:
         r"""Returns the probabilities in Fock representation.
 
@@ -309,14 +402,67 @@ class State:
             Array: the probabilities
         """
         if self._fock_probabilities is None:
-            if self.is_mixed:
+            ket = None if self.is_mixed else self.ket(cutoffs=cutoffs)
+            if ket is None:
                 dm = self.dm(cutoffs=cutoffs)
                 self._fock_probabilities = fock.dm_to_probs(dm)
             else:
-                ket = self.ket(cutoffs=cutoffs)
                 self._fock_probabilities = fock.ket_to_probs(ket)
         return self._fock_probabilities
 
+    def marginal_probabilities(
+        self, modes: Union[int, Sequence[int]], cutoffs: Sequence[int]
+    ) -> Tensor:
+        r"""Returns the marginal probabilities in Fock representation of the given modes.
+
+        The modes of a Gaussian state that are not in ``modes`` are traced out in the Gaussian
+        representation first (see :func:`~.gaussian.trace`), so that only the Fock representation
+        of the reduced state is computed: the cost grows exponentially with the number of kept
+        modes rather than with the number of modes of the state. The probabilities of a state in
+        Fock representation are summed over the other modes.
+
+        Args:
+            modes (int or Sequence[int]): the modes to keep
+            cutoffs (Sequence[int]): the cutoff dimensions of the kept modes
+
+        Returns:
+            Tensor: the probabilities, with the axes in the order of ``modes`` (after the batch axis
+            of a batched state)
+        """
+        modes = [modes] if isinstance(modes, int) else list(modes)
+        if len(cutoffs) != len(modes):
+            raise ValueError(f"There are {len(modes)} modes but {len(cutoffs)} cutoffs.")
+        indices = list(self.indices(modes))
+        kept = sorted(indices)  # the order of the modes of the reduced state
+        if self.is_gaussian:
+            others = [i for i in range(self.num_modes) if i not in indices]
+            cov, means = gaussian.trace(self.cov, self.means, others)
+            reduced = State(cov=cov, means=means)
+            kept_cutoffs = [cutoffs[indices.index(i)] for i in kept]
+            if reduced.is_pure:
+                probs = math.abs(reduced.ket(cutoffs=kept_cutoffs)) ** 2
+            else:  # the diagonal of the density matrix (of each state of a batch)
+                dm = reduced.dm(cutoffs=kept_cutoffs)
+                shape = list(dm.shape[: len(dm.shape) - 2 * len(kept)])
+                size = int(np.prod(kept_cutoffs))
+                probs = math.real(math.diag_part(math.reshape(dm, shape + [size, size])))
+                probs = math.reshape(probs, shape + kept_cutoffs)
+        else:
+            full_cutoffs = list(self.cutoffs)
+            for i, cutoff in zip(indices, cutoffs):
+                full_cutoffs[i] = cutoff
+            ket = self.ket(cutoffs=full_cutoffs) if self.is_pure else None
+            if ket is not None:
+                probs = fock.ket_to_probs(ket)
+            else:  # a mixed state, or a pure state given by its density matrix
+                probs = fock.dm_to_probs(self.dm(cutoffs=full_cutoffs))
+            others = [i for i in range(self.num_modes) if i not in indices]
+            if others:
+                probs = math.sum(probs, axes=others)
+        batch = len(probs.shape) - len(modes)
+        perm = list(range(batch)) + [batch + kept.index(i) for i in indices]
+        return math.transpose(probs, perm) if perm != sorted(perm) else probs
+
     def primal(self, other: Union[State, Transformation]) -> State:
         r"""Returns the post-measurement state after ``other`` is projected onto ``self``.
 
@@ -397,8 +543,14 @@ class State:
 
         cov = gaussian.join_covs([self.cov, other.cov])
         means = gaussian.join_means([self.means, other.means])
+        purity = None
+        if self._purity is not None and other._purity is not None:
+            purity = self._purity * other._purity
         return State(
-            cov=cov, means=means, modes=self.modes + [m + self.num_modes for m in other.modes]
+            cov=cov,
+            means=means,
+            modes=self.modes + [m + self.num_modes for m in other.modes],
+            _purity=purity,
         )
 
     def __getitem__(self, item):
@@ -431,9 +583,7 @@ class State:
             return State(cov=cov, means=means, modes=item)
 
         # if not gaussian
-        fock_partitioned = fock.trace(
-            self.dm(self.cutoffs), [m for m in range(self.num_modes) if m not in item]
-        )
+        fock_partitioned = fock.trace(self.dm(self.cutoffs), keep=list(self.indices(item)))
         return State(dm=fock_partitioned, modes=item)
 
     # TODO: refactor
@@ -33,7 +33,9 @@ from mrmustard.types import (
     Union,
 )
 from mrmustard import settings
+from mrmustard.logger import instrumented
 from mrmustard.math import Math
+from mrmustard.utils.cache import fock_cache, array_key
 from .state import State
 
 math = Math()
@@ -77,18 +79,21 @@ class Transformation:
     @property
     def bell(self):
         r"""The N-mode two-mode squeezed vacuum for the choi-jamiolkowksi isomorphism."""
-        if self._bell is None:
+        bell = self._bell
+        if bell is None:
             cov = gaussian.two_mode_squeezed_vacuum_cov(
                 r=settings.CHOI_R, phi=0.0, hbar=settings.HBAR
             )
             means = gaussian.vacuum_means(num_modes=2, hbar=settings.HBAR)
-            bell = bell_single = State(cov=cov, means=means)
+            bell = bell_single = State(cov=cov, means=means, _purity=1.0)
             for _ in range(self.num_modes - 1):
                 bell = bell & bell_single
             tot = 2 * self.num_modes
             order = tuple(range(0, tot, 2)) + tuple(range(1, tot, 2))
-            self._bell = bell.get_modes(order)
-        return self._bell[self.modes + [m + self.num_modes for m in self.modes]]
+            bell = bell.get_modes(order)
+            if math.executing_eagerly():  # traced values must not outlive the trace
+                self._bell = bell
+        return bell[self.modes + [m + self.num_modes for m in self.modes]]
 
     def transform_gaussian(self, state: State, dual: bool) -> State:
         r"""Transforms a Gaussian state into a Gaussian state.
@@ -102,8 +107,13 @@ class Transformation:
         """
         X, Y, d = self.XYd if not dual else self.XYd_dual
         cov, means = gaussian.CPTP(state.cov, state.means, X, Y, d, state.modes, self.modes)
+        # the purity is invariant under unitaries, so it is known without recomputing it
         new_state = State(
-            cov=cov, means=means, modes=state.modes, _norm=state.norm
+            cov=cov,
+            means=means,
+            modes=state.modes,
+            _norm=state.norm,
+            _purity=state._purity if self.is_unitary else None,
         )  # NOTE: assumes modes don't change
         return new_state
 
@@ -221,40 +231,81 @@ class Transformation:
         X, Y, d = self.XYd
         if d is not None:
             return False
-        if X is not None and not math.allclose(self.X, math.diag(math.diag_part(self.X))):
+        if X is not None and not math.allclose(X, math.diag(math.diag_part(X))):
             return False
-        if Y is not None and not math.allclose(self.Y, math.diag(math.diag_part(self.Y))):
+        if Y is not None and not math.allclose(Y, math.diag(math.diag_part(Y))):
             return False
         return True
 
+    @instrumented("Transformation.U")
     def U(self, cutoffs: Sequence[int]):
-        r"""Returns the unitary representation of the transformation."""
+        r"""Returns the unitary representation of the transformation.
+
+        The result is stored in ``mrmustard.utils.cache.fock_cache`` (if the transformation is
+        trainable, only within a step of the optimizer).
+        """
         if not self.is_unitary:
             return None
-        choi_state = self.bell >> self
-        return fock.fock_representation(
-            choi_state.cov,
-            choi_state.means,
-            shape=cutoffs * 2,
-            return_unitary=True,
-            choi_r=settings.CHOI_R,
+        return self._cached_fock(
+            "U", cutoffs, lambda: self._fock_representation(cutoffs, return_unitary=True)
         )
 
+    @instrumented("Transformation.choi")
     def choi(self, cutoffs: Sequence[int]):
-        r"""Returns the Choi representation of the transformation."""
+        r"""Returns the Choi representation of the transformation.
+
+        The result is stored in ``mrmustard.utils.cache.fock_cache`` (if the transformation is
+        trainable, only within a step of the optimizer).
+        """
         if self.is_unitary:
-            U = self.U(cutoffs)
-            return fock.U_to_choi(U)
+            compute = lambda: fock.U_to_choi(self.U(cutoffs))
+        else:
+            compute = lambda: self._fock_representation(cutoffs, return_unitary=False)
+        return self._cached_fock("choi", cutoffs, compute)
 
+    def _cached_fock(self, kind: str, cutoffs: Sequence[int], compute: Callable):
+        r"""Returns the Fock representation from the cache, computing it on a miss.
+
+        While a compiled function is being traced the parameters have no concrete value to key the
+        cache on, so the representation is computed in the traced graph.
+        """
+        if not math.executing_eagerly():
+            return compute()
+        return fock_cache.get_or_compute(
+            self._fock_cache_key(kind, cutoffs), compute, trainable=self._has_trainable_parameters
+        )
+
+    def _fock_representation(self, cutoffs: Sequence[int], return_unitary: bool):
+        r"""Computes the unitary (or Choi) representation of the transformation from its action on
+        the Bell state."""
         choi_state = self.bell >> self
-        choi_op = fock.fock_representation(
+        return fock.fock_representation(
             choi_state.cov,
             choi_state.means,
-            shape=cutoffs * 4,
-            return_unitary=False,
+            shape=list(cutoffs) * (2 if return_unitary else 4),
+            return_unitary=return_unitary,
             choi_r=settings.CHOI_R,
         )
-        return choi_op
+
+    def _fock_cache_key(self, kind: str, cutoffs: Sequence[int]) -> tuple:
+        r"""The key of the Fock representation in the cache.
+
+        The parameters enter the key through the ``(X, Y, d)`` triple, which is fully determined by
+        the parameter values (and it is also available for circuits).
+        """
+        return (
+            kind,
+            tuple(self.modes),
+            tuple(int(c) for c in cutoffs),
+            settings.HBAR,
+            settings.CHOI_R,
+        ) + array_key(*self.XYd)
+
+    @property
+    def _has_trainable_parameters(self) -> bool:
+        r"""Whether any of the parameters of the transformation is trainable."""
+        trainable = getattr(self, "trainable_parameters", {})
+        return any(len(params) > 0 for params in trainable.values())
 
     def __getitem__(self, items) -> Callable:
         r"""Sets the modes on which the transformation acts.
@@ -18,16 +18,20 @@ This module implements the :class:`.Circuit` class which acts as a representatio
 
 from __future__ import annotations
 
-__all__ = ["Circuit"]
+__all__ = ["Circuit", "FusedGaussian"]
 
 
 from typing import List, Tuple, Optional
 from mrmustard.types import Matrix, Vector
+from mrmustard.math import Math
+from mrmustard.physics import gaussian
 from mrmustard.utils.parametrized import Parametrized
-from mrmustard.utils.xptensor import XPMatrix, XPVector
+from mrmustard.utils.xptensor import compose_XYd
 from mrmustard.lab.abstract import Transformation
 from mrmustard.lab.abstract import State
 
+math = Math()
+
 
 class Circuit(Transformation, Parametrized):
     """Represents a quantum circuit: a set of operations to be applied on quantum states.
@@ -44,45 +48,68 @@ class Circuit(Transformation, Parametrized):
     def reset(self):
         """Resets the state of the circuit clearing the list of modes and setting the compiled flag to false."""
         self._compiled: bool = False
+        self._compiled_ops: List = []
         self._modes: List[int] = []
 
+    def compile(self) -> Circuit:
+        r"""Fuses each maximal run of consecutive Gaussian ops into a single :class:`FusedGaussian`
+        transformation, so that states in Fock representation go through one Fock conversion and
+        one contraction per run rather than per op.
+
+        The fused ops keep a reference to the original ops, so changes to their parameters
+        (e.g. during an optimization) are reflected in the compiled circuit.
+
+        Returns:
+            Circuit: the circuit itself (``self._compiled`` is set to ``True``)
+        """
+        compiled, run = [], []
+        for op in self._ops:
+            if op.is_gaussian:
+                run.append(op)
+            else:
+                compiled += self._fuse(run) + [op]
+                run = []
+        self._compiled_ops = compiled + self._fuse(run)
+        self._compiled = True
+        return self
+
+    @staticmethod
+    def _fuse(ops: List) -> List:
+        r"""Returns a single fused op for a run of more than one Gaussian op."""
+        return [FusedGaussian(ops)] if len(ops) > 1 else list(ops)
+
     @property
     def num_modes(self) -> int:
         all_modes = {mode for op in self._ops for mode in op.modes}
         return len(all_modes)
 
     def primal(self, state: State) -> State:
-        for op in self._ops:
+        for op in self._ops_for(state):
             state = op.primal(state)
         return state
 
     def dual(self, state: State) -> State:
-        for op in reversed(self._ops):
+        for op in reversed(self._ops_for(state)):
             state = op.dual(state)
         return state
 
+    def _ops_for(self, state: State) -> List:
+        r"""Returns the ops to apply to the given state: Gaussian states go through the ops one by
+        one (which is cheap), the others go through the compiled circuit."""
+        if state.is_gaussian:
+            return self._ops
+        if not self._compiled:
+            self.compile()
+        return self._compiled_ops
+
     @property
     def XYd(
         self,
     ) -> Tuple[Matrix, Matrix, Vector]:  # NOTE: Overriding Transformation.XYd for efficiency
-        X = XPMatrix(like_1=True)
-        Y = XPMatrix(like_0=True)
-        d = XPVector()
-        for op in self._ops:
-            opx, opy, opd = op.XYd
-            opX = XPMatrix.from_xxpp(opx, modes=(op.modes, op.modes), like_1=True)
-            opY = XPMatrix.from_xxpp(opy, modes=(op.modes, op.modes), like_0=True)
-            opd = XPVector.from_xxpp(opd, modes=op.modes)
-            if opX.shape is not None and opX.shape[-1] == 1 and len(op.modes) > 1:
-                opX = opX.clone(len(op.modes), modes=(op.modes, op.modes))
-            if opY.shape is not None and opY.shape[-1] == 1 and len(op.modes) > 1:
-                opY = opY.clone(len(op.modes), modes=(op.modes, op.modes))
-            if opd.shape is not None and opd.shape[-1] == 1 and len(op.modes) > 1:
-                opd = opd.clone(len(op.modes), modes=op.modes)
-            X = opX @ X
-            Y = opX @ Y @ opX.T + opY
-            d = opX @ d + opd
-        return X.to_xxpp(), Y.to_xxpp(), d.to_xxpp()
+        return compose_XYd(
+            [(*op.XYd, op.modes) for op in self._ops],
+            differentiable=self._has_trainable_parameters,
+        )
 
     @property
     def is_gaussian(self):
@@ -100,3 +127,42 @@ class Circuit(Transformation, Parametrized):
         """String to display the object on the command line."""
         ops_repr = [repr(op) for op in self._ops]
         return "Circuit([" + ",".join(ops_repr) + "])"
+
+
+class FusedGaussian(Circuit):
+    r"""A run of consecutive Gaussian ops fused into a single Gaussian transformation.
+
+    The ``(X, Y, d)`` triple is computed from the ops on the union of their modes, so the fused op
+    is converted to Fock representation (and contracted with a state) only once.
+
+    Args:
+        ops (list): the Gaussian operations to fuse
+    """
+
+    def __init__(self, ops: List):
+        super().__init__(ops)
+        self._modes = sorted({mode for op in self._ops for mode in op.modes})
+        self.is_unitary = all(op.is_unitary for op in self._ops)
+
+    primal = Transformation.primal
+    dual = Transformation.dual
+
+    @property
+    def XYd(self) -> Tuple[Matrix, Matrix, Vector]:
+        # composing on all the modes keeps the result aligned with self.modes
+        return compose_XYd(
+            [(*op.XYd, op.modes) for op in self._ops],
+            modes=self._modes,
+            differentiable=self._has_trainable_parameters,
+        )
+
+    @property
+    def XYd_dual(self) -> Tuple[Matrix, Matrix, Vector]:
+        return gaussian.XYd_dual(*self.XYd)
+
+    @property
+    def modes(self) -> List[int]:
+        return self._modes
+
+    def __repr__(self) -> str:
+        return "FusedGaussian([" + ",".join(repr(op) for op in self._ops) + "])"
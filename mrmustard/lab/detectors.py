@@ -17,10 +17,13 @@ This module implements the set of detector classes that perform measurements on
 """
 
 from typing import List, Tuple, Union, Optional
-from mrmustard.types import Matrix
+import numpy as np
+from mrmustard.types import Matrix, Vector
 from mrmustard.utils.parametrized import Parametrized
-from mrmustard.lab.abstract import FockMeasurement
+from mrmustard.lab.abstract import FockMeasurement, State
 from mrmustard.lab.states import DisplacedSqueezed, Coherent
+from mrmustard.physics import fock, gaussian, gbs, sampling
+from mrmustard.utils.cache import array_key, fock_cache
 from mrmustard import settings
 from mrmustard.math import Math
 
@@ -94,7 +97,12 @@ class PNRDetector(Parametrized, FockMeasurement):
         return self._efficiency_trainable or self._dark_counts_trainable
 
     def recompute_stochastic_channel(self, cutoffs: List[int] = None):
-        """recompute belief using the defined `stochastic channel`"""
+        """recompute belief using the defined `stochastic channel`
+
+        Args:
+            cutoffs (optional, List[int]): the number of input photon numbers of each measured
+                mode (``settings.PNR_INTERNAL_CUTOFF`` if ``None``)
+        """
         if cutoffs is None:
             cutoffs = [settings.PNR_INTERNAL_CUTOFF] * len(self._modes)
         self._internal_stochastic_channel = []
@@ -111,17 +119,45 @@ class PNRDetector(Parametrized, FockMeasurement):
                 if len(math.atleast_1d(self.dark_counts)) == 1
                 else self.dark_counts
             )
-            for c, qe, dc in zip(cutoffs, efficiency, dark_counts):
-                dark_prior = math.poisson(max_k=settings.PNR_INTERNAL_CUTOFF, rate=dc)
-                condprob = math.binomial_conditional_prob(
-                    success_prob=qe, dim_in=settings.PNR_INTERNAL_CUTOFF, dim_out=c
-                )
+            for c_in, c_out, qe, dc in zip(cutoffs, self._cutoffs, efficiency, dark_counts):
                 self._internal_stochastic_channel.append(
-                    math.convolve_probs_1d(
-                        condprob, [dark_prior, math.eye(settings.PNR_INTERNAL_CUTOFF)[0]]
+                    _cached_channel(
+                        ("PNRDetector", int(c_in), int(c_out)),
+                        [qe, dc],
+                        lambda qe=qe, dc=dc, c_in=c_in, c_out=c_out: fock.pnr_channel(
+                            qe, dc, c_in, c_out
+                        ),
+                        self.should_recompute_stochastic_channel(),
                     )
                 )
 
+    def pattern_probabilities(
+        self, state: State, patterns: np.ndarray, workers: Optional[int] = None
+    ) -> np.ndarray:
+        r"""Returns the probabilities of photon-number patterns of the modes of the detector on a
+        Gaussian state.
+
+        Unlike :meth:`primal`, which builds the Fock representation of the state up to
+        ``settings.PNR_INTERNAL_CUTOFF``, the probability of each pattern is computed from a loop
+        hafnian (see :func:`~.gbs.pnr_probabilities`), so that the patterns of many modes can be
+        computed. The efficiency is applied as a loss channel and the dark counts as Poissonian
+        noise. The probabilities are not differentiable.
+
+        Args:
+            state (State): the Gaussian state
+            patterns (array): the photon numbers of the modes of the detector, with shape
+                ``(..., len(modes))``
+            workers (optional, int): the number of threads computing the patterns
+
+        Returns:
+            array: the probabilities of the patterns, with shape ``(...)``
+        """
+        if self._stochastic_channel is not None:
+            raise ValueError("The probabilities of a custom stochastic channel need `primal`.")
+        cov, means = _detected_cov_and_means(state, self._modes, self.efficiency)
+        dark_counts = np.asarray(math.asnumpy(self.dark_counts))
+        return gbs.pnr_probabilities(cov, means, patterns, dark_counts, workers)
+
 
 # pylint: disable: no-member
 class ThresholdDetector(Parametrized, FockMeasurement):
@@ -186,25 +222,61 @@ class ThresholdDetector(Parametrized, FockMeasurement):
         return self._efficiency_trainable or self._dark_count_prob_trainable
 
     def recompute_stochastic_channel(self, cutoffs: List[int] = None):
-        """recompute belief using the defined `stochastic channel`"""
+        """recompute belief using the defined `stochastic channel`
+
+        Args:
+            cutoffs (optional, List[int]): the number of input photon numbers of each measured
+                mode (``settings.PNR_INTERNAL_CUTOFF`` if ``None``)
+        """
         if cutoffs is None:
             cutoffs = [settings.PNR_INTERNAL_CUTOFF] * len(self._modes)
         self._internal_stochastic_channel = []
         if self._stochastic_channel is not None:
             self._internal_stochastic_channel = self._stochastic_channel
         else:
-            for cut, qe, dc in zip(
+            for c_in, qe, dc in zip(
                 cutoffs,
                 math.atleast_1d(self.efficiency)[:],
                 math.atleast_1d(self.dark_count_prob)[:],
             ):
-                row1 = math.pow(1.0 - qe, math.arange(cut)[None, :]) - math.cast(
-                    dc, self.efficiency.dtype
+                self._internal_stochastic_channel.append(
+                    _cached_channel(
+                        ("ThresholdDetector", int(c_in)),
+                        [qe, dc],
+                        lambda qe=qe, dc=dc, c_in=c_in: fock.threshold_channel(qe, dc, c_in),
+                        self.should_recompute_stochastic_channel(),
+                    )
                 )
-                row2 = 1.0 - row1
-                # rest = math.zeros((cut - 2, cut), dtype=row1.dtype)
-                condprob = math.concat([row1, row2], axis=0)
-                self._internal_stochastic_channel.append(condprob)
+
+    def pattern_probabilities(
+        self, state: State, patterns: np.ndarray, workers: Optional[int] = None
+    ) -> np.ndarray:
+        r"""Returns the probabilities of click patterns of the modes of the detector on a Gaussian
+        state.
+
+        Unlike :meth:`primal`, which builds the Fock representation of the state up to
+        ``settings.PNR_INTERNAL_CUTOFF``, the probability of each pattern is computed from a loop
+        Torontonian (see :func:`~.gbs.threshold_probabilities`), which accounts for all the photon
+        numbers. The efficiency is applied as a loss channel and a dark count makes a mode click
+        with probability ``dark_count_prob`` independently of the photons, i.e. the probability
+        of no click is multiplied by ``1 - dark_count_prob`` (the stochastic channel of
+        :meth:`primal` subtracts ``dark_count_prob`` from it). The probabilities are not
+        differentiable.
+
+        Args:
+            state (State): the Gaussian state
+            patterns (array): the clicks (0 or 1) of the modes of the detector, with shape
+                ``(..., len(modes))``
+            workers (optional, int): the number of threads computing the patterns
+
+        Returns:
+            array: the probabilities of the patterns, with shape ``(...)``
+        """
+        if self._stochastic_channel is not None:
+            raise ValueError("The probabilities of a custom stochastic channel need `primal`.")
+        cov, means = _detected_cov_and_means(state, self._modes, self.efficiency)
+        dark_count_prob = np.asarray(math.asnumpy(self.dark_count_prob))
+        return gbs.threshold_probabilities(cov, means, patterns, dark_count_prob, workers)
 
 
 class Heterodyne(Coherent):
@@ -226,6 +298,43 @@ class Heterodyne(Coherent):
     ):
         super().__init__(x, y, modes=modes)
 
+    def sample(
+        self, state: State, shots: int, seed: sampling.Seed = None
+    ) -> Tuple[np.ndarray, Optional[Union[State, List[State]]]]:
+        r"""Draws the outcomes of the heterodyne measurement of the modes of ``self`` on ``state``
+        and returns them together with the post-measurement states of the other modes.
+
+        The outcomes :math:`\alpha = x + iy` are those of ``Heterodyne(x, y)``, so that the
+        post-measurement state of a shot is ``state << Heterodyne(x, y)``, normalized.
+
+        Args:
+            state (State): the (unbatched) state to measure
+            shots (int): the number of shots
+            seed (optional, int or Generator): the seed of the random number generator, or the
+                generator itself
+
+        Returns:
+            Tuple[array, State or List[State]]: the complex outcomes, of shape
+            ``(shots, len(self.modes))``, and the post-measurement states: a batch of ``shots``
+            Gaussian states as a single ``State`` if ``state`` is Gaussian, a list of ``shots``
+            states in Fock representation otherwise, or ``None`` if no mode is left
+        """
+        indices = [state.indices(m) for m in self.modes]
+        remaining = [m for m in state.modes if m not in self.modes]
+        if not state.is_gaussian:
+            tensor, is_dm = _fock_tensor(state)
+            outcomes, tensors = sampling.fock_heterodyne(tensor, is_dm, indices, shots, seed)
+            return outcomes, _fock_states(tensors, is_dm, remaining)
+        order = np.argsort(indices)  # general_dyne orders the measured modes by index
+        proj_means = sampling.gaussian_heterodyne(
+            state.cov, state.means, sorted(indices), shots, seed
+        )
+        proj_cov = settings.HBAR / 2 * np.eye(2 * len(indices))
+        n = len(indices)
+        alpha = np.zeros((shots, n), dtype=np.complex128)
+        alpha[:, order] = (proj_means[:, :n] + 1j * proj_means[:, n:]) / np.sqrt(2 * settings.HBAR)
+        return alpha, _gaussian_states(state, proj_cov, proj_means, sorted(indices), remaining)
+
 
 class Homodyne(DisplacedSqueezed):
     r"""Homodyne measurement on given modes.
@@ -256,3 +365,110 @@ class Homodyne(DisplacedSqueezed):
             y=y,
             modes=modes,
         )
+
+    def sample(
+        self, state: State, shots: int, seed: sampling.Seed = None
+    ) -> Tuple[np.ndarray, Optional[Union[State, List[State]]]]:
+        r"""Draws the outcomes of the homodyne measurement of the modes of ``self`` on ``state``
+        and returns them together with the post-measurement states of the other modes.
+
+        The outcomes are drawn from the exact distribution of the rotated quadratures (as if the
+        squeezing of ``self`` were infinite) and are in the units of ``result``, so that the
+        post-measurement state of a shot is ``state << Homodyne(quadrature_angle, result)``,
+        normalized.
+
+        Args:
+            state (State): the (unbatched) state to measure
+            shots (int): the number of shots
+            seed (optional, int or Generator): the seed of the random number generator, or the
+                generator itself
+
+        Returns:
+            Tuple[array, State or List[State]]: the outcomes, of shape ``(shots, len(self.modes))``,
+            and the post-measurement states: a batch of ``shots`` Gaussian states as a single
+            ``State`` if ``state`` is Gaussian, a list of ``shots`` states in Fock representation
+            otherwise, or ``None`` if no mode is left
+        """
+        indices = [state.indices(m) for m in self.modes]
+        remaining = [m for m in state.modes if m not in self.modes]
+        angles = np.broadcast_to(math.asnumpy(self.phi) / 2, (len(indices),))
+        if not state.is_gaussian:
+            tensor, is_dm = _fock_tensor(state)
+            quadratures, tensors = sampling.fock_homodyne(
+                tensor, is_dm, indices, angles, shots, seed
+            )
+            results = quadratures / np.sqrt(2 * settings.HBAR)
+            return results, _fock_states(tensors, is_dm, remaining)
+        quadratures = sampling.gaussian_homodyne(
+            state.cov, state.means, indices, angles, shots, seed
+        )
+        order = np.argsort(indices)  # general_dyne orders the measured modes by index
+        sorted_quadratures, sorted_angles = quadratures[:, order], angles[order]
+        proj_means = np.concatenate(
+            [sorted_quadratures * np.cos(sorted_angles), sorted_quadratures * np.sin(sorted_angles)],
+            axis=-1,
+        )
+        cov_indices = np.concatenate([order, order + len(order)])
+        proj_cov = np.asarray(math.asnumpy(self.cov))[np.ix_(cov_indices, cov_indices)]
+        results = quadratures / np.sqrt(2 * settings.HBAR)
+        return results, _gaussian_states(state, proj_cov, proj_means, sorted(indices), remaining)
+
+
+def _cached_channel(key: tuple, parameters: List, compute, trainable: bool):
+    r"""Returns the stochastic channel of a detector from the cache, computing it on a miss.
+
+    The channel is keyed on the values of its parameters, so that the modes (and the detectors)
+    with the same parameters share it. While a compiled function is being traced the parameters
+    have no concrete value to key the cache on, so the channel is computed in the traced graph.
+    """
+    if not math.executing_eagerly():
+        return compute()
+    return fock_cache.get_or_compute(key + array_key(*parameters), compute, trainable=trainable)
+
+
+def _detected_cov_and_means(state: State, modes: List[int], efficiency) -> Tuple[Matrix, Vector]:
+    r"""Returns the covariance matrix and the means vector of the given modes of a Gaussian state
+    after the loss channel of the detector efficiency."""
+    if not state.is_gaussian:
+        raise ValueError("The pattern probabilities are computed for Gaussian states.")
+    efficiency = math.atleast_1d(efficiency)
+    if len(efficiency) == 1:
+        efficiency = math.tile(efficiency, [len(modes)])
+    X, Y, d = gaussian.loss_XYd(efficiency, 0.0, settings.HBAR)
+    cov, means = gaussian.CPTP(state.cov, state.means, X, Y, d, state.modes, modes)
+    indices = list(state.indices(modes))
+    cov, _, _ = gaussian.partition_cov(cov, indices)
+    means, _ = gaussian.partition_means(means, indices)
+    return cov, means
+
+
+def _gaussian_states(
+    state: State, proj_cov, proj_means, indices: List[int], remaining: List[int]
+) -> Optional[State]:
+    r"""Returns the batch of the normalized post-measurement states of a Gaussian state projected
+    onto the Gaussian states with covariance matrix ``proj_cov`` and means vectors ``proj_means``
+    (one row per shot), or ``None`` if no mode is left."""
+    if len(remaining) == 0:
+        return None
+    _, cov, means = gaussian.general_dyne(
+        state.cov, state.means, proj_cov, proj_means, indices, settings.HBAR
+    )
+    cov = math.tile(math.expand_dims(cov, 0), [len(proj_means), 1, 1])
+    return State(cov=cov, means=means, modes=remaining)
+
+
+def _fock_tensor(state: State) -> Tuple[np.ndarray, bool]:
+    r"""Returns the ket of a state in Fock representation if it is available, its density matrix
+    otherwise, and whether it is the density matrix."""
+    ket = state.ket() if state.is_pure else None
+    return (state.dm(), True) if ket is None else (ket, False)
+
+
+def _fock_states(tensors: np.ndarray, is_dm: bool, remaining: List[int]) -> Optional[List[State]]:
+    r"""Returns the post-measurement states in Fock representation of each shot, or ``None`` if no
+    mode is left."""
+    if len(remaining) == 0:
+        return None
+    if is_dm:
+        return [State(dm=math.astensor(dm), modes=remaining) for dm in tensors]
+    return [State(ket=math.astensor(ket), modes=remaining) for ket in tensors]
@@ -0,0 +1,307 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+This module implements the :class:`.GaussianEngine`, a simulator of Gaussian circuits on hundreds
+or thousands of modes.
+
+The engine stores the covariance matrix and the means vector of the state in contiguous NumPy
+buffers (in ``xxpp`` ordering) and applies each op in place, on the rows and columns of its modes
+only: a gate on :math:`k` of the :math:`N` modes takes :math:`O(Nk^2)` work, and no matrix of the
+size of the state other than the covariance matrix is ever built. The two-mode gates
+(``BSgate``, ``MZgate``, ``S2gate``, ``CXgate`` and ``CZgate``) are applied as rotations of four
+rows and columns. Their symplectic matrices are computed in one vectorized call per kind of gate,
+and a Numba kernel (if Numba is available) applies runs of them without going back to Python.
+
+.. code-block::
+
+    >>> engine = GaussianEngine.from_state(SqueezedVacuum([0.5] * 500))
+    >>> engine.apply([BSgate(0.3)[m, m + 1] for m in range(499)] + [Attenuator([0.9] * 500)])
+    >>> state = engine.state
+
+The engine is not differentiable: the states and the ops are converted to NumPy.
+"""
+
+from __future__ import annotations
+
+import importlib
+from collections import defaultdict
+
+import numpy as np
+
+from mrmustard.lab.abstract import State, Transformation
+from mrmustard.lab.gates import BSgate, CXgate, CZgate, MZgate, S2gate
+from mrmustard.math import Math
+from mrmustard.physics import gaussian
+from mrmustard.types import Callable, Dict, List, Matrix, Optional, Sequence, Union, Vector
+
+if importlib.util.find_spec("numba"):
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+else:
+    NUMBA_AVAILABLE = False
+
+math = Math()
+
+__all__ = ["GaussianEngine"]
+
+
+def _linear_in(symplectic_fn: Callable) -> Callable:
+    r"""Returns a vectorized version of the symplectic matrix of a gate that is linear in its
+    parameter (e.g. :func:`gaussian.controlled_X`), built from its value at 0 and 1."""
+    S0, S1 = (np.asarray(math.asnumpy(symplectic_fn(g)), dtype=np.float64) for g in (0.0, 1.0))
+    return lambda g: S0[..., None] + (S1 - S0)[..., None] * g
+
+
+# the symplectic matrices of the two-mode gates for vectors of parameters, with shape (4, 4, G)
+_TWO_MODE_SYMPLECTICS: Dict[type, Callable] = {
+    BSgate: lambda ops: gaussian.beam_splitter_symplectic(
+        _parameter(ops, "theta"), _parameter(ops, "phi")
+    ),
+    MZgate: lambda ops: gaussian.mz_symplectic(
+        _parameter(ops, "phi_a"), _parameter(ops, "phi_b"), internal=ops[0]._internal
+    ),
+    S2gate: lambda ops: gaussian.two_mode_squeezing_symplectic(
+        _parameter(ops, "r"), _parameter(ops, "phi")
+    ),
+    CXgate: lambda ops: _linear_in(gaussian.controlled_X)(_parameter(ops, "s")),
+    CZgate: lambda ops: _linear_in(gaussian.controlled_Z)(_parameter(ops, "s")),
+}
+
+
+def _parameter(ops: Sequence[Transformation], name: str) -> np.ndarray:
+    r"""Returns the values of the parameter ``name`` of the given ops as a vector."""
+    return np.array([math.asnumpy(getattr(op, name)) for op in ops], dtype=np.float64)
+
+
+class GaussianEngine:
+    r"""A simulator of Gaussian circuits on many modes.
+
+    Args:
+        cov (Matrix): the covariance matrix of the initial state
+        means (Vector): the means vector of the initial state
+        modes (optional, List[int]): the modes of the state (``0, 1, ..., N-1`` by default)
+    """
+
+    def __init__(self, cov: Matrix, means: Vector, modes: Optional[List[int]] = None):
+        self.cov = np.array(math.asnumpy(cov), dtype=np.float64, order="C")
+        self.means = np.array(math.asnumpy(means), dtype=np.float64)
+        if self.cov.ndim != 2:
+            raise ValueError("The engine simulates a single state, not a batch of states.")
+        self.num_modes = self.cov.shape[-1] // 2
+        self.modes = list(range(self.num_modes)) if modes is None else list(modes)
+        self._index = {m: i for i, m in enumerate(self.modes)}
+
+    @classmethod
+    def from_state(cls, state: State) -> GaussianEngine:
+        r"""Returns an engine initialized with a Gaussian state."""
+        if not state.is_gaussian:
+            raise ValueError("The engine only simulates Gaussian states.")
+        return cls(state.cov, state.means, state.modes)
+
+    @property
+    def state(self) -> State:
+        r"""Returns the current state of the engine."""
+        return State(cov=self.cov.copy(), means=self.means.copy(), modes=self.modes)
+
+    def rows(self, modes: Sequence[int]) -> np.ndarray:
+        r"""Returns the rows of the given modes in the ``xxpp`` covariance matrix."""
+        indices = [self._index[m] for m in modes]
+        return np.array(indices + [i + self.num_modes for i in indices])
+
+    def apply(self, ops: Union[Transformation, Sequence[Transformation]]) -> GaussianEngine:
+        r"""Applies the given Gaussian ops (or circuits) to the state in place, in order.
+
+        Consecutive two-mode gates are applied in runs: the symplectic matrices of each run are
+        computed with one call per kind of gate and applied with :meth:`apply_two_mode_gates`.
+
+        Args:
+            ops (Transformation or Sequence[Transformation]): the ops
+
+        Returns:
+            GaussianEngine: the engine itself
+        """
+        run = []
+        for op in _flatten(ops):
+            if type(op) in _TWO_MODE_SYMPLECTICS:
+                run.append(op)
+                continue
+            self._apply_run(run)
+            run = []
+            if not op.is_gaussian:
+                raise ValueError(f"The engine only simulates Gaussian ops ({op} is not).")
+            self.apply_channel(*[_numpy_or_none(a) for a in op.XYd], op.modes)
+        self._apply_run(run)
+        return self
+
+    def _apply_run(self, ops: List[Transformation]):
+        r"""Applies a run of consecutive two-mode gates."""
+        if not ops:
+            return
+        groups = defaultdict(list)  # the gates of each kind (and MZgate convention)
+        for i, op in enumerate(ops):
+            groups[type(op), getattr(op, "_internal", None)].append(i)
+        symplectics = np.empty((len(ops), 4, 4))
+        for (kind, _), indices in groups.items():
+            matrices = _TWO_MODE_SYMPLECTICS[kind]([ops[i] for i in indices])
+            symplectics[indices] = np.moveaxis(np.asarray(math.asnumpy(matrices)), -1, 0)
+        rows = np.stack([self.rows(op.modes) for op in ops])
+        self.apply_two_mode_gates(symplectics, rows)
+
+    def apply_two_mode_gates(self, symplectics: np.ndarray, rows: np.ndarray):
+        r"""Applies a sequence of two-mode symplectic matrices in place.
+
+        Args:
+            symplectics (array): the ``4 x 4`` symplectic matrices, with shape ``(G, 4, 4)``
+            rows (array): the rows of the two modes of each gate (see :meth:`rows`), with shape
+                ``(G, 4)``
+        """
+        symplectics = np.ascontiguousarray(symplectics, dtype=np.float64)
+        rows = np.ascontiguousarray(rows, dtype=np.int64)
+        if NUMBA_AVAILABLE:
+            _two_mode_gates_numba(self.cov, self.means, symplectics, rows)
+        else:
+            for S, r in zip(symplectics, rows):
+                self._transform_rows(S, r)
+
+    def apply_channel(
+        self,
+        X: Optional[np.ndarray],
+        Y: Optional[np.ndarray],
+        d: Optional[np.ndarray],
+        modes: Sequence[int],
+    ):
+        r"""Applies the channel ``(X, Y, d)`` on the given modes in place.
+
+        As for :func:`gaussian.CPTP`, a single-mode channel is applied to each of the modes.
+
+        Args:
+            X (array): the ``X`` matrix of the channel (or ``None``)
+            Y (array): the ``Y`` matrix of the channel (or ``None``)
+            d (array): the ``d`` vector of the channel (or ``None``)
+            modes (Sequence[int]): the modes of the channel
+        """
+        k, rows = len(modes), self.rows(modes)
+        x, p = rows[:k], rows[k:]
+        if X is not None:
+            blocks = _mode_blocks(X, k)
+            if blocks is not None:
+                self._transform_modes(blocks, x, p)
+            else:
+                self._transform_rows(X, rows)
+        if Y is not None:
+            blocks = _mode_blocks(Y, k)
+            if blocks is not None:
+                for i, j in np.ndindex(2, 2):
+                    self.cov[(x, p)[i], (x, p)[j]] += blocks[i, j]
+            else:
+                self.cov[np.ix_(rows, rows)] += Y
+        if d is not None:
+            self.means[rows] += np.repeat(d, k) if d.shape[-1] < 2 * k else d
+
+    def _transform_modes(self, blocks: np.ndarray, x: np.ndarray, p: np.ndarray):
+        r"""Applies a ``2 x 2`` matrix to each of the modes with rows ``x`` and ``p``, first to the
+        rows of ``cov`` and then to its columns.
+
+        Args:
+            blocks (array): the matrices of the modes, with shape ``(2, 2, k)``
+            x (array): the rows of the positions of the modes
+            p (array): the rows of the momenta of the modes
+        """
+        (a, b), (c, e) = blocks
+        cov_x, cov_p = self.cov[x], self.cov[p]
+        self.cov[x] = a[:, None] * cov_x + b[:, None] * cov_p
+        self.cov[p] = c[:, None] * cov_x + e[:, None] * cov_p
+        cov_x, cov_p = self.cov[:, x], self.cov[:, p]
+        self.cov[:, x], self.cov[:, p] = a * cov_x + b * cov_p, c * cov_x + e * cov_p
+        self.means[x], self.means[p] = (
+            a * self.means[x] + b * self.means[p],
+            c * self.means[x] + e * self.means[p],
+        )
+
+    def _transform_rows(self, X: np.ndarray, rows: np.ndarray):
+        r"""Replaces ``cov`` by ``X cov X^T`` and ``means`` by ``X means`` on the given rows.
+
+        The rows of the result are ``X @ cov[rows]`` with the corner ``X @ cov[rows, rows] @ X^T``,
+        and its columns are its rows transposed.
+        """
+        new_rows = X @ self.cov[rows]
+        new_rows[:, rows] = new_rows[:, rows] @ X.T
+        self.cov[rows] = new_rows
+        self.cov[:, rows] = new_rows.T
+        self.means[rows] = X @ self.means[rows]
+
+
+def _flatten(ops) -> List[Transformation]:
+    r"""Returns the ops of (nested sequences of) ops and circuits."""
+    if hasattr(ops, "_ops"):  # Circuit and FusedGaussian
+        return _flatten(ops._ops)
+    if isinstance(ops, Transformation):
+        return [ops]
+    return [op for item in ops for op in _flatten(item)]
+
+
+def _mode_blocks(X: np.ndarray, k: int) -> Optional[np.ndarray]:
+    r"""Returns the ``2 x 2`` matrices of the modes of an ``xxpp`` matrix ``X`` on ``k`` modes
+    with shape ``(2, 2, k)``, or ``None`` if ``X`` couples different modes. ``X`` can also be a
+    single ``2 x 2`` matrix for all the modes."""
+    if X.shape[-1] == 2:
+        return np.repeat(X[:, :, None], k, axis=-1)
+    X = X.reshape(2, k, 2, k)
+    blocks = np.diagonal(X, axis1=1, axis2=3)
+    if np.any(X * (1 - np.eye(k))[None, :, None, :]):
+        return None
+    return blocks
+
+
+def _numpy_or_none(array) -> Optional[np.ndarray]:
+    return None if array is None else np.asarray(math.asnumpy(array), dtype=np.float64)
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _two_mode_gates_numba(cov, means, symplectics, rows):  # pragma: no cover
+        r"""Applies each ``4 x 4`` symplectic matrix to its rows and columns of ``cov`` and to its
+        entries of ``means``, as :meth:`GaussianEngine._transform_rows`."""
+        size = cov.shape[0]
+        new_rows = np.empty((4, size))
+        corner = np.empty((4, 4))
+        new_means = np.empty(4)
+        for g in range(symplectics.shape[0]):
+            S, r = symplectics[g], rows[g]
+            for a in range(4):
+                new_means[a] = 0.0
+                for b in range(4):
+                    new_means[a] += S[a, b] * means[r[b]]
+                for c in range(size):
+                    acc = 0.0
+                    for b in range(4):
+                        acc += S[a, b] * cov[r[b], c]
+                    new_rows[a, c] = acc
+            for a in range(4):
+                for b in range(4):
+                    acc = 0.0
+                    for e in range(4):
+                        acc += new_rows[a, r[e]] * S[b, e]
+                    corner[a, b] = acc
+            for a in range(4):
+                means[r[a]] = new_means[a]
+                for b in range(4):
+                    new_rows[a, r[b]] = corner[a, b]
+            for a in range(4):
+                for c in range(size):
+                    cov[r[a], c] = new_rows[a, c]
+                    cov[c, r[a]] = new_rows[a, c]
@@ -46,7 +46,7 @@ class Vacuum(State):
     def __init__(self, num_modes: int):
         cov = gaussian.vacuum_cov(num_modes, settings.HBAR)
         means = gaussian.vacuum_means(num_modes, settings.HBAR)
-        State.__init__(self, cov=cov, means=means)
+        State.__init__(self, cov=cov, means=means, _purity=1.0)
 
 
 class Coherent(Parametrized, State):
@@ -109,7 +109,7 @@ class Coherent(Parametrized, State):
         )
         means = gaussian.displacement(self.x, self.y, settings.HBAR)
         cov = gaussian.vacuum_cov(means.shape[-1] // 2, settings.HBAR)
-        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs)
+        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs, _purity=1.0)
 
     @property
     def means(self):
@@ -175,7 +175,7 @@ class SqueezedVacuum(Parametrized, State):
         )
         cov = gaussian.squeezed_vacuum_cov(self.r, self.phi, settings.HBAR)
         means = gaussian.vacuum_means(cov.shape[-1] // 2, settings.HBAR)
-        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs)
+        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs, _purity=1.0)
 
     @property
     def cov(self):
@@ -229,7 +229,7 @@ class TMSV(Parametrized, State):
         )
         cov = gaussian.two_mode_squeezed_vacuum_cov(self.r, self.phi, settings.HBAR)
         means = gaussian.vacuum_means(2, settings.HBAR)
-        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs)
+        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs, _purity=1.0)
 
     @property
     def cov(self):
@@ -367,7 +367,7 @@ class DisplacedSqueezed(Parametrized, State):
         )
         cov = gaussian.squeezed_vacuum_cov(self.r, self.phi, settings.HBAR)
         means = gaussian.displacement(self.x, self.y, settings.HBAR)
-        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs)
+        State.__init__(self, cov=cov, means=means, cutoffs=cutoffs, _purity=1.0)
 
     @property
     def cov(self):
@@ -44,10 +44,40 @@ This module contains functions for creating a logger that can be used in Mr Must
 The implementation in this module is based on the solution for logging used in
 the Flask web application framework:
 https://github.com/pallets/flask/blob/master/src/flask/logging.py
+
+It also contains the opt-in instrumentation of the hot paths of Mr Mustard. When
+``settings.PROFILE`` is ``True``, the functions decorated with :func:`instrumented` and the
+methods of the active ``math`` backend record their calls, wall times and output sizes. The
+:func:`profile` context manager enables it for a block of code and returns the recorded
+:class:`Profile`, which can be summarized in a table or exported as a Chrome trace:
+
+.. code-block::
+
+    from mrmustard.logger import profile
+
+    with profile() as prof:
+        opt.minimize(cost_fn, by_optimizing=[circuit], max_steps=100)
+    print(prof)  # calls, total and mean times and largest output of each hot path
+    prof.save_chrome_trace("trace.json")  # open in chrome://tracing or Perfetto
+
+Outside of :func:`profile`, the calls made while ``settings.PROFILE`` is ``True`` are recorded
+in the module-level :data:`profiler`, which only keeps the most recent ones.
 """
 
+import collections
+import contextlib
+import functools
+import json
 import logging
+import os
 import sys
+import threading
+import time
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from mrmustard import settings
 
 
 def logging_handler_defined(logger):
@@ -112,3 +142,151 @@ def create_logger(name, level=logging.INFO):
         logger.addHandler(default_handler)
 
     return logger
+
+
+class Event(NamedTuple):
+    r"""A call recorded by the instrumentation: its name, start time and duration (in ns), the
+    number of elements of its output and the thread that made it."""
+
+    name: str
+    start: int
+    duration: int
+    size: int
+    thread: int
+
+
+class Profile:
+    r"""The calls recorded by the instrumentation while the profile is active.
+
+    See :func:`profile`.
+
+    Args:
+        max_events (optional, int): the number of most recent calls to keep (all of them if
+            ``None``)
+    """
+
+    def __init__(self, max_events: Optional[int] = None):
+        self.events: Deque[Event] = collections.deque(maxlen=max_events)
+        self.start = time.perf_counter_ns()
+
+    def clear(self):
+        r"""Discards the recorded calls."""
+        self.events.clear()
+        self.start = time.perf_counter_ns()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        r"""Returns the number of calls, the total and mean wall time (in seconds) and the largest
+        output size of each instrumented function, by decreasing total time.
+
+        Nested calls are included in the times of their callers.
+        """
+        stats = {}
+        for event in self.events:
+            s = stats.setdefault(event.name, {"calls": 0, "total": 0.0, "max_size": 0})
+            s["calls"] += 1
+            s["total"] += event.duration * 1e-9
+            s["max_size"] = max(s["max_size"], event.size)
+        for s in stats.values():
+            s["mean"] = s["total"] / s["calls"]
+        return dict(sorted(stats.items(), key=lambda item: -item[1]["total"]))
+
+    def table(self) -> str:
+        r"""Returns the summary as a table."""
+        lines = [f"{'name':<36}{'calls':>8}{'total (ms)':>14}{'mean (ms)':>12}{'max size':>12}"]
+        for name, s in self.summary().items():
+            lines.append(
+                f"{name:<36}{s['calls']:>8}{s['total'] * 1e3:>14.3f}{s['mean'] * 1e3:>12.3f}"
+                f"{s['max_size']:>12}"
+            )
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.table()
+
+    def chrome_trace(self) -> dict:
+        r"""Returns the recorded calls in the Chrome trace event format, which can be opened with
+        ``chrome://tracing`` or Perfetto."""
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": e.name,
+                    "cat": "mrmustard",
+                    "ph": "X",
+                    "ts": (e.start - self.start) / 1e3,
+                    "dur": e.duration / 1e3,
+                    "pid": pid,
+                    "tid": e.thread,
+                    "args": {"size": e.size},
+                }
+                for e in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def save_chrome_trace(self, filename: str):
+        r"""Writes the recorded calls to ``filename`` in the Chrome trace event format."""
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+profiler = Profile(max_events=100_000)
+"""The profile that records the calls made while ``settings.PROFILE`` is ``True`` outside of
+:func:`profile`. It only keeps the last 100000 calls, so that it does not grow without bound
+during long runs."""
+
+_active_profiles: List[Profile] = []  # the profiles of the enclosing profile() contexts
+
+
+@contextlib.contextmanager
+def profile() -> Iterator[Profile]:
+    r"""Context manager that enables the instrumentation (``settings.PROFILE``) and returns the
+    :class:`Profile` of the calls made inside it.
+
+    Yields:
+        Profile: the recorded calls
+    """
+    prof = Profile()
+    previous = settings.PROFILE
+    _active_profiles.append(prof)
+    settings.PROFILE = True
+    try:
+        yield prof
+    finally:
+        settings.PROFILE = previous
+        _active_profiles.remove(prof)
+
+
+def _size(result) -> int:
+    r"""Returns the number of elements of the tensors in ``result``."""
+    if isinstance(result, (tuple, list)):
+        return sum(_size(r) for r in result)
+    shape = getattr(result, "shape", None)
+    if shape is None:
+        return 0
+    return int(np.prod([d or 0 for d in shape]))
+
+
+def instrumented(name: str) -> Callable[[Callable], Callable]:
+    r"""Decorator that records the calls of a function while ``settings.PROFILE`` is ``True``.
+
+    Args:
+        name (str): the name of the function in the recorded profiles
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not settings.PROFILE:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            result = fn(*args, **kwargs)
+            duration = time.perf_counter_ns() - start
+            event = Event(name, start, duration, _size(result), threading.get_ident())
+            for prof in _active_profiles or [profiler]:
+                prof.events.append(event)
+            return result
+
+        return wrapper
+
+    return decorator
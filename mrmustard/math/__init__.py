@@ -18,7 +18,8 @@ The ``math`` module contains low-level functions for performing mathematical ope
 It is recommended that users access the backends using the an instance of the :class:`Math` class rather than the backends themselves.
 
 The Math class is a wrapper that passes the calls to the currently active backend, which is determined by
-the ``BACKEND`` parameter in ``mrmustard.settings`` (the default is ``tensorflow``).
+the ``BACKEND`` parameter in ``mrmustard.settings`` (the default is ``tensorflow``). The ``numpy``
+backend is always available but it is not differentiable.
 
 The advantage of using the Math class is that the same code can run on different backends, allowing for a
 greater degree of flexibility and code reuse.
@@ -37,25 +38,59 @@ greater degree of flexibility and code reuse.
 
 
 import importlib
+from types import MethodType
 from mrmustard import settings
+from mrmustard.logger import instrumented
+from mrmustard.math.numpy import NumpyMath
 
+_BACKENDS = {"numpy": NumpyMath}
 if importlib.util.find_spec("tensorflow"):
     from mrmustard.math.tensorflow import TFMath
+
+    _BACKENDS["tensorflow"] = TFMath
 if importlib.util.find_spec("torch"):
     from mrmustard.math.torch import TorchMath
 
+    _BACKENDS["torch"] = TorchMath
+
 
 class Math:
     r"""
     This class is a switcher for performing math operations on the currently active backend.
+
+    The active backend is resolved once and re-bound only when ``settings.backend`` changes,
+    so that each ``math.xxx`` lookup costs a dictionary lookup rather than a backend dispatch.
+    While ``settings.PROFILE`` is ``True`` the bound methods record their calls (see
+    :func:`mrmustard.logger.profile`).
     """
-    # pylint: disable=no-else-return
+    _backend = None  # the active backend instance
+    _methods = {}  # bound methods of the active backend, filled on first access
+
     def __getattribute__(self, name):
-        if settings.backend == "tensorflow":
-            return object.__getattribute__(TFMath(), name)
-        elif settings.backend == "torch":
-            return object.__getattribute__(TorchMath(), name)
-
-        raise ValueError(
-            f"No `{settings.backend}` backend found. Ensure your backend is either ``'tensorflow'`` or ``'torch'``"
-        )
+        try:
+            return Math._methods[name]
+        except KeyError:
+            pass
+        if Math._backend is None:
+            raise ValueError(
+                f"No `{settings.backend}` backend found. Ensure your backend is ``'tensorflow'``, ``'torch'`` or ``'numpy'``"
+            )
+        attr = object.__getattribute__(Math._backend, name)
+        if isinstance(attr, MethodType):
+            if settings.PROFILE:
+                attr = instrumented(f"math.{name}")(attr)
+            Math._methods[name] = attr
+        return attr
+
+
+def _bind_backend(backend_name: str):
+    r"""Binds the given backend to :class:`Math` and clears the method cache.
+
+    Called by ``settings`` whenever the backend changes.
+    """
+    Math._methods = {}
+    Math._backend = _BACKENDS[backend_name]() if backend_name in _BACKENDS else None
+
+
+settings.on_backend_change(_bind_backend)
+settings.on_profile_change(lambda _: Math._methods.clear())
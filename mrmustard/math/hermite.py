@@ -0,0 +1,407 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+This module contains the backend-neutral recursion engine for the renormalized multidimensional
+Hermite polynomials and the corresponding gradient (vector-Jacobian product) kernel.
+
+The tensor :math:`G` of shape ``shape`` is defined by the generating function
+
+.. math::
+
+    C\exp\left(B^T x - \frac{1}{2}x^T A x\right) = \sum_n G_n \frac{x^n}{\sqrt{n!}}
+
+and it is filled with the recurrence relation
+
+.. math::
+
+    G_{n+1_i} = \frac{1}{\sqrt{n_i+1}}\left(B_i G_n - \sum_j A_{ij}\sqrt{n_j}\,G_{n-1_j}\right).
+
+The functions in this module work on NumPy arrays. The backends wrap them with their own
+automatic differentiation machinery (see e.g. :meth:`TFMath.hermite_renormalized`).
+If Numba is available the recursion is jit-compiled, otherwise a vectorized NumPy implementation
+which fills the tensor one shell of constant total photon number at a time is used.
+"""
+
+import importlib
+import numpy as np
+
+from mrmustard.types import Tuple, Sequence
+
+if importlib.util.find_spec("numba"):
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+else:
+    NUMBA_AVAILABLE = False
+
+
+def hermite_renormalized(
+    A: np.ndarray, B: np.ndarray, C: complex, shape: Sequence[int], out: np.ndarray = None
+):
+    r"""Returns the renormalized multidimensional Hermite polynomials up to the given shape.
+
+    Uses the Numba-compiled recursion if Numba is available, otherwise it falls back to
+    :func:`hermite_renormalized_numpy`.
+
+    Args:
+        A (array): the :math:`N\times N` matrix
+        B (array): the vector of length :math:`N`
+        C (complex): the scalar seed value ``G[0,...,0]``
+        shape (Sequence[int]): the shape of the output tensor (of length :math:`N`)
+        out (array): an optional zero-filled C-contiguous array of shape ``shape`` (e.g. a
+            ``numpy.memmap``) in which the result is written
+
+    Returns:
+        array: the renormalized multidimensional Hermite polynomials
+    """
+    A, B, C, shape = _validate(A, B, C, shape)
+    if NUMBA_AVAILABLE:
+        return hermite_renormalized_numba(A, B, C, shape, out)
+    if out is not None:
+        out[...] = hermite_renormalized_numpy(A, B, C, shape)
+        return out
+    return hermite_renormalized_numpy(A, B, C, shape)
+
+
+def hermite_renormalized_numpy(A: np.ndarray, B: np.ndarray, C: complex, shape: Sequence[int]):
+    r"""Vectorized NumPy implementation of the renormalized Hermite recursion.
+
+    All the entries with the same total index :math:`|n| = \sum_i n_i` (a shell) only depend on
+    the entries of the two previous shells, so the tensor is filled one shell at a time with
+    a fixed number of vectorized operations per shell.
+
+    Args:
+        A (array): the :math:`N\times N` matrix
+        B (array): the vector of length :math:`N`
+        C (complex): the scalar seed value ``G[0,...,0]``
+        shape (Sequence[int]): the shape of the output tensor (of length :math:`N`)
+
+    Returns:
+        array: the renormalized multidimensional Hermite polynomials
+    """
+    A, B, C, shape = _validate(A, B, C, shape)
+    return _fill_shells(A[None], B[None], np.array([C]), shape)[0]
+
+
+def hermite_renormalized_numba(
+    A: np.ndarray, B: np.ndarray, C: complex, shape: Sequence[int], out: np.ndarray = None
+):
+    r"""Numba-compiled implementation of the renormalized Hermite recursion.
+
+    Args:
+        A (array): the :math:`N\times N` matrix
+        B (array): the vector of length :math:`N`
+        C (complex): the scalar seed value ``G[0,...,0]``
+        shape (Sequence[int]): the shape of the output tensor (of length :math:`N`)
+        out (array): an optional zero-filled C-contiguous array of shape ``shape`` (e.g. a
+            ``numpy.memmap``) in which the result is written
+
+    Returns:
+        array: the renormalized multidimensional Hermite polynomials
+    """
+    if not NUMBA_AVAILABLE:
+        raise ImportError("Numba is required by hermite_renormalized_numba")
+    A, B, C, shape = _validate(A, B, C, shape)
+    if out is None:
+        out = np.zeros(shape, dtype=np.result_type(A, B, C))
+    G = out.reshape(-1).view(np.ndarray)  # a view, also when out is a memmap
+    G[0] = C
+    dims = np.array(shape, dtype=np.int64)
+    _fill_hermite(A.astype(G.dtype), B.astype(G.dtype), dims, np.zeros_like(dims), G)
+    return out
+
+
+def hermite_renormalized_batch(A: np.ndarray, B: np.ndarray, C: np.ndarray, shape: Sequence[int]):
+    r"""Returns the renormalized multidimensional Hermite polynomials for a batch of
+    ``(A, B, C)`` triples, all with the same output shape.
+
+    Args:
+        A (array): the batch of :math:`N\times N` matrices, with shape ``(K, N, N)``
+        B (array): the batch of vectors, with shape ``(K, N)``
+        C (array): the batch of seed values, with shape ``(K,)``
+        shape (Sequence[int]): the shape of each output tensor (of length :math:`N`)
+
+    Returns:
+        array: the renormalized multidimensional Hermite polynomials, with shape ``(K,) + shape``
+    """
+    A, B, C, shape = _validate_batch(A, B, C, shape)
+    if NUMBA_AVAILABLE:
+        dtype = np.result_type(A, B, C)
+        G = np.zeros((A.shape[0], int(np.prod(shape))), dtype=dtype)
+        G[:, 0] = C
+        dims = np.array(shape, dtype=np.int64)
+        _fill_hermite_batch(A.astype(dtype), B.astype(dtype), dims, np.zeros_like(dims), G)
+        return G.reshape((A.shape[0],) + shape)
+    return _fill_shells(A, B, C, shape)
+
+
+def hermite_renormalized_extend(
+    A: np.ndarray, B: np.ndarray, C: complex, G: np.ndarray, shape: Sequence[int]
+):
+    r"""Extends a tensor of renormalized Hermite polynomials to a larger shape.
+
+    ``G`` must be the output of :func:`hermite_renormalized` for the same ``A``, ``B`` and ``C``
+    and a shape that is not larger than ``shape`` along any axis. Its entries are copied into the
+    result and only the new entries are computed. Since every entry only depends on entries with
+    smaller indices, the result is identical to ``hermite_renormalized(A, B, C, shape)``.
+
+    Args:
+        A (array): the :math:`N\times N` matrix
+        B (array): the vector of length :math:`N`
+        C (complex): the scalar seed value ``G[0,...,0]``
+        G (array): the previously computed tensor
+        shape (Sequence[int]): the shape of the output tensor (of length :math:`N`)
+
+    Returns:
+        array: the renormalized multidimensional Hermite polynomials
+    """
+    A, B, C, shape = _validate(A, B, C, shape)
+    G = np.asarray(G)
+    if G.ndim != len(shape) or any(k > s for k, s in zip(G.shape, shape)):
+        raise ValueError(f"Cannot extend a tensor of shape {G.shape} to the shape {shape}")
+    if G.shape == shape:
+        return G
+    dtype = np.result_type(A, B, C, G)
+    extended = np.zeros(shape, dtype=dtype)
+    extended[tuple(slice(k) for k in G.shape)] = G
+    known = np.array(G.shape, dtype=np.int64)
+    if NUMBA_AVAILABLE:
+        _fill_hermite(
+            A.astype(dtype),
+            B.astype(dtype),
+            np.array(shape, dtype=np.int64),
+            known,
+            extended.reshape(-1),
+        )
+        return extended
+    return _fill_shells(A[None], B[None], np.array([C]), shape, known, extended[None])[0]
+
+
+def hermite_renormalized_vjp(
+    G: np.ndarray, dLdG: np.ndarray, A: np.ndarray, B: np.ndarray, C: complex
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    r"""Returns the vector-Jacobian product of the renormalized Hermite polynomials.
+
+    The gradients are computed directly from the tensor ``G`` using
+
+    .. math::
+
+        \frac{\partial G_n}{\partial C} = \frac{G_n}{C},\quad
+        \frac{\partial G_n}{\partial B_i} = \sqrt{n_i}\,G_{n-1_i},\quad
+        \frac{\partial G_n}{\partial A_{ij}} = -\frac{1}{2}\sqrt{n_i(n_j-\delta_{ij})}\,G_{n-1_i-1_j},
+
+    without ever allocating the ``shape + (N, N)`` Jacobian tensor.
+    The upstream gradient is contracted with the complex conjugate of the Jacobian, which is the
+    convention for complex gradients used by the backends.
+
+    Args:
+        G (array): the renormalized Hermite polynomials
+        dLdG (array): the upstream gradient (same shape as ``G``)
+        A (array): the :math:`N\times N` matrix
+        B (array): the vector of length :math:`N`
+        C (complex): the scalar seed value
+
+    Returns:
+        Tuple[array, array, array]: the gradients ``dL/dA``, ``dL/dB`` and ``dL/dC``
+    """
+    G = np.asarray(G)
+    dLdA, dLdB, dLdC = _vjp(
+        G[None],
+        np.asarray(dLdG)[None],
+        np.asarray(A)[None],
+        np.asarray(B)[None],
+        np.asarray(C).reshape(1),
+    )
+    return dLdA[0], dLdB[0], dLdC[0]
+
+
+def hermite_renormalized_batch_vjp(
+    G: np.ndarray, dLdG: np.ndarray, A: np.ndarray, B: np.ndarray, C: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    r"""Returns the vector-Jacobian product of :func:`hermite_renormalized_batch`.
+
+    Args:
+        G (array): the batch of renormalized Hermite polynomials, with shape ``(K,) + shape``
+        dLdG (array): the upstream gradient (same shape as ``G``)
+        A (array): the batch of matrices, with shape ``(K, N, N)``
+        B (array): the batch of vectors, with shape ``(K, N)``
+        C (array): the batch of seed values, with shape ``(K,)``
+
+    Returns:
+        Tuple[array, array, array]: the gradients ``dL/dA``, ``dL/dB`` and ``dL/dC``
+    """
+    return _vjp(np.asarray(G), np.asarray(dLdG), np.asarray(A), np.asarray(B), np.asarray(C))
+
+
+# ~~~~~~~~~~~~~~~~~
+# Helper functions
+# ~~~~~~~~~~~~~~~~~
+
+
+def _fill_shells(A, B, C, shape, known=None, G=None):
+    r"""Fills a batch of Hermite tensors one shell of constant total index at a time.
+
+    ``A``, ``B`` and ``C`` carry a leading batch axis of size ``K`` and the result has shape
+    ``(K,) + shape``. If ``known`` is given, ``G`` already contains the entries with indices below
+    ``known`` along every axis and only the remaining entries are filled.
+    """
+    N = len(shape)
+    K = A.shape[0]
+    if G is None:
+        G = np.zeros((K, int(np.prod(shape))), dtype=np.result_type(A, B, C))
+    G = G.reshape(K, -1)
+    G[:, 0] = C
+    if G.shape[1] == 1:
+        return G.reshape((K,) + shape)
+    strides = _strides(shape)
+    idx = np.indices(shape).reshape(N, -1)  # shape (N, size)
+    pivot = np.argmax(idx > 0, axis=0)  # first non-zero index of each multi-index
+    shells = np.sum(idx, axis=0)
+    if known is not None:
+        shells = np.where(np.all(idx < np.reshape(known, (N, 1)), axis=0), 0, shells)
+    order = np.argsort(shells, kind="stable")
+    boundaries = np.searchsorted(shells[order], np.arange(1, shells[order[-1]] + 2))
+    sqrt = np.sqrt(np.arange(max(shape) + 1))
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        rows = order[start:stop]
+        i = pivot[rows]
+        prev = rows - strides[i]
+        u = B[:, i] * G[:, prev]
+        for l in range(N):
+            nl = idx[l, rows] - (i == l)
+            mask = nl > 0
+            u[:, mask] -= sqrt[nl[mask]] * A[:, i[mask], l] * G[:, prev[mask] - strides[l]]
+        G[:, rows] = u / sqrt[idx[i, rows]]
+    return G.reshape((K,) + shape)
+
+
+def _vjp(G, dLdG, A, B, C):
+    r"""Batched vector-Jacobian product (the batch axis is the first axis of every argument)."""
+    K, N = G.shape[0], G.ndim - 1
+    dtype = np.result_type(G, dLdG, A, B, C)
+    axes = tuple(range(1, N + 1))
+    dLdC = np.sum(dLdG * np.conj(G / C.reshape((K,) + (1,) * N)), axis=axes)
+    dLdB = np.zeros((K, N), dtype=dtype)
+    dLdA = np.zeros((K, N, N), dtype=dtype)
+    for i in range(N):
+        Gi = _lower(G, i + 1)  # G[n - 1_i] * sqrt(n_i) on the entries with n_i > 0
+        dLdB[:, i] = np.sum(_upper(dLdG, i + 1) * np.conj(Gi), axis=axes)
+        dLdA[:, i, i] = -0.5 * np.sum(
+            _upper(dLdG, i + 1, skip=1) * np.conj(_lower(G, i + 1, skip=1)), axis=axes
+        )
+        for j in range(i + 1, N):
+            up = _upper(_upper(dLdG, i + 1), j + 1)
+            dLdA[:, i, j] = dLdA[:, j, i] = -0.5 * np.sum(
+                up * np.conj(_lower(Gi, j + 1)), axis=axes
+            )
+    return dLdA, dLdB, dLdC.astype(dtype)
+
+
+def _validate(A, B, C, shape):
+    r"""Converts the inputs to NumPy and checks that their dimensions are compatible."""
+    A = np.atleast_2d(np.asarray(A))
+    B = np.atleast_1d(np.asarray(B))
+    C = np.asarray(C).item() if np.ndim(C) == 0 else np.asarray(C).reshape(-1)[0]
+    shape = tuple(int(s) for s in np.atleast_1d(shape))
+    if A.shape != (len(shape), len(shape)) or B.shape != (len(shape),):
+        raise ValueError(
+            f"Incompatible dimensions: A has shape {A.shape}, B has shape {B.shape} and the output has shape {shape}"
+        )
+    if any(s < 1 for s in shape):
+        raise ValueError(f"All the dimensions of the shape must be positive (got {shape})")
+    return A, B, C, shape
+
+
+def _validate_batch(A, B, C, shape):
+    r"""Converts the batched inputs to NumPy and checks that their dimensions are compatible."""
+    A = np.asarray(A)
+    B = np.asarray(B)
+    C = np.asarray(C).reshape(-1)
+    shape = tuple(int(s) for s in np.atleast_1d(shape))
+    K, N = A.shape[0], len(shape)
+    if A.shape != (K, N, N) or B.shape != (K, N) or C.shape != (K,):
+        raise ValueError(
+            f"Incompatible dimensions: A has shape {A.shape}, B has shape {B.shape}, C has shape {C.shape} and the output has shape {shape}"
+        )
+    if any(s < 1 for s in shape):
+        raise ValueError(f"All the dimensions of the shape must be positive (got {shape})")
+    return A, B, C, shape
+
+
+def _strides(shape: Sequence[int]) -> np.ndarray:
+    r"""Returns the C-order strides (in number of elements) of an array of the given shape."""
+    return np.array([int(np.prod(shape[k + 1 :])) for k in range(len(shape))], dtype=np.int64)
+
+
+def _lower(G: np.ndarray, axis: int, skip: int = 0) -> np.ndarray:
+    r"""Returns ``sqrt(n_axis * (n_axis - 1)...) * G[n - (1 + skip) * 1_axis]`` for the entries
+    where it is defined, i.e. ``G`` shifted up along ``axis`` by ``1 + skip`` and rescaled.
+    """
+    size = G.shape[axis]
+    n = np.arange(1 + skip, size)
+    factor = np.sqrt(n * (n - skip)) if skip else np.sqrt(n)
+    sliced = G[(slice(None),) * axis + (slice(0, size - 1 - skip),)]
+    return sliced * factor.reshape((-1,) + (1,) * (G.ndim - axis - 1))
+
+
+def _upper(T: np.ndarray, axis: int, skip: int = 0) -> np.ndarray:
+    r"""Returns the entries of ``T`` with index ``n_axis > skip`` (the ones that have a lower neighbour)."""
+    return T[(slice(None),) * axis + (slice(1 + skip, None),)]
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _fill_hermite(A, B, shape, known, G):  # pragma: no cover
+        r"""Fills the flattened array ``G`` (seeded with ``G[0] = C``) in C order, skipping the
+        entries with indices below ``known`` along every axis, which are already filled."""
+        N = shape.shape[0]
+        strides = np.ones(N, dtype=np.int64)
+        for k in range(N - 2, -1, -1):
+            strides[k] = strides[k + 1] * shape[k + 1]
+        sqrt = np.sqrt(np.arange(np.max(shape) + 1))
+        idx = np.zeros(N, dtype=np.int64)
+        for flat in range(1, G.shape[0]):
+            k = N - 1
+            idx[k] += 1
+            while idx[k] == shape[k]:
+                idx[k] = 0
+                k -= 1
+                idx[k] += 1
+            is_known = True
+            for l in range(N):
+                if idx[l] >= known[l]:
+                    is_known = False
+                    break
+            if is_known:
+                continue
+            i = 0
+            while idx[i] == 0:
+                i += 1
+            prev = flat - strides[i]
+            u = B[i] * G[prev]
+            for l in range(N):
+                nl = idx[l] - 1 if l == i else idx[l]
+                if nl > 0:
+                    u -= sqrt[nl] * A[i, l] * G[prev - strides[l]]
+            G[flat] = u / sqrt[idx[i]]
+        return G
+
+    @njit(cache=True)
+    def _fill_hermite_batch(A, B, shape, known, G):  # pragma: no cover
+        r"""Fills each row of ``G`` with :func:`_fill_hermite`."""
+        for k in range(G.shape[0]):
+            _fill_hermite(A[k], B[k], shape, known, G[k])
+        return G
@@ -412,6 +412,42 @@ class MathInterface(ABC):
         """
         ...
 
+    @abstractmethod
+    def hermite_renormalized_batch(
+        self, A: Tensor, B: Tensor, C: Tensor, shape: Sequence[int]
+    ) -> Tensor:
+        r"""Returns the arrays of hermite renormalized polynomials of a batch of coefficients.
+
+        Args:
+            A (array): batch of matrix coefficients, with shape ``(K, N, N)``
+            B (array): batch of vector coefficients, with shape ``(K, N)``
+            C (array): batch of scalar coefficients, with shape ``(K,)``
+            shape (tuple): shape of each hermite polynomial
+
+        Returns:
+            array: renormalized hermite polynomials, with shape ``(K,) + shape``
+        """
+        ...
+
+    @abstractmethod
+    def hermite_renormalized_extend(
+        self, A: Tensor, B: Tensor, C: Tensor, G: Tensor, shape: Sequence[int]
+    ) -> Tensor:
+        r"""Extends the array of hermite renormalized polynomials ``G``, computed for the same
+        coefficients and a smaller shape, to the given shape. Only the new entries are computed.
+
+        Args:
+            A (array): matrix coefficients of the exponential polynomial
+            B (array): vector coefficients of the exponential polynomial
+            C (scalar): scalar coefficient of the exponential polynomial
+            G (array): the previously computed hermite renormalized polynomials
+            shape (tuple): shape of the final array
+
+        Returns:
+            array: renormalized hermite polynomials
+        """
+        ...
+
     @abstractmethod
     def imag(self, array: Tensor) -> Tensor:
         r"""Returns the imaginary part of array.
@@ -875,10 +911,44 @@ class MathInterface(ABC):
         r"""Returns the matrix square root."""
         ...
 
+    # pylint: disable=no-self-use
+    def compile_function(self, fn: Callable) -> Callable:
+        r"""Returns a version of ``fn`` compiled by the backend.
+
+        The compiled function is traced on its first call and the trace is reused by the following
+        calls. Backends that cannot compile functions return ``fn`` unchanged.
+
+        Args:
+            fn (callable): the function to compile
+
+        Returns:
+            callable: the compiled function
+        """
+        return fn
+
+    # pylint: disable=no-self-use
+    def executing_eagerly(self) -> bool:
+        r"""Returns ``False`` while a function is being traced by :meth:`compile_function`, when
+        the tensors have no concrete value, and ``True`` otherwise."""
+        return True
+
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # Methods that build on the basic ops and don't need to be overridden in the backend implementation
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    def allclose(self, array1: Tensor, array2: Tensor, atol: float = 1e-8) -> bool:
+        r"""Returns whether two arrays are element-wise equal within the tolerance ``atol``.
+
+        Args:
+            array1 (array): the first array
+            array2 (array): the second array
+            atol (float): the absolute tolerance
+
+        Returns:
+            bool: whether the arrays are close
+        """
+        return bool(np.allclose(self.asnumpy(array1), self.asnumpy(array2), atol=atol))
+
     def block(self, blocks: List[List[Tensor]], axes=(-2, -1)) -> Tensor:
         r"""Returns a matrix made from the given blocks.
 
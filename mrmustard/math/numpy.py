@@ -0,0 +1,461 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module contains the NumPy implementation of the :class:`Math` interface.
+
+The NumPy backend has no automatic differentiation: it is meant for simulations that do not need
+gradients, where it avoids the per-call overhead of the TensorFlow and Torch backends. Trainable
+parameters are stored as plain arrays and the optimizer cannot be used.
+"""
+
+import numpy as np
+from scipy import linalg, signal
+from scipy.special import loggamma, xlogy
+
+from mrmustard.math.autocast import Autocast
+from mrmustard.math import hermite
+from mrmustard.types import (
+    List,
+    Tensor,
+    Sequence,
+    Tuple,
+    Optional,
+    Dict,
+    Trainable,
+    Callable,
+    Union,
+)
+from .math_interface import MathInterface
+
+
+# pylint: disable=too-many-public-methods,no-self-use,arguments-differ
+class NumpyMath(MathInterface):
+    r"""NumPy implemantion of the :class:`Math` interface."""
+
+    float64 = np.float64
+    float32 = np.float32
+    complex64 = np.complex64
+    complex128 = np.complex128
+
+    def __getattr__(self, name):
+        # the backend implements the interface explicitly: no fallback to the numpy namespace
+        raise AttributeError(f"The numpy backend does not implement `{name}`.")
+
+    # ~~~~~~~~~
+    # Basic ops
+    # ~~~~~~~~~
+
+    def abs(self, array: np.ndarray) -> np.ndarray:
+        return np.abs(array)
+
+    def any(self, array: np.ndarray) -> np.ndarray:
+        return np.any(array)
+
+    def arange(self, start: int, limit: int = None, delta: int = 1, dtype=np.float64) -> np.ndarray:
+        return np.arange(start, limit, delta, dtype=dtype)
+
+    def asnumpy(self, tensor: np.ndarray) -> Tensor:
+        return np.array(tensor)
+
+    def assign(self, tensor: np.ndarray, value: np.ndarray) -> np.ndarray:
+        tensor[...] = value
+        return tensor
+
+    def astensor(self, array: Union[np.ndarray, List], dtype=None) -> np.ndarray:
+        return np.asarray(array, dtype=dtype)
+
+    def atleast_1d(self, array: np.ndarray, dtype=None) -> np.ndarray:
+        return self.cast(np.reshape(array, [-1]), dtype)
+
+    def cast(self, array: np.ndarray, dtype=None) -> np.ndarray:
+        if dtype is None:
+            return array
+        return np.asarray(array).astype(dtype, copy=False)
+
+    def clip(self, array, a_min, a_max) -> np.ndarray:
+        return np.clip(array, a_min, a_max)
+
+    def concat(self, values: Sequence[np.ndarray], axis: int) -> np.ndarray:
+        return np.concatenate(values, axis)
+
+    def conj(self, array: np.ndarray) -> np.ndarray:
+        return np.conj(array)
+
+    def constraint_func(
+        self, bounds: Tuple[Optional[float], Optional[float]]
+    ) -> Optional[Callable]:
+        bounds = (
+            -np.inf if bounds[0] is None else bounds[0],
+            np.inf if bounds[1] is None else bounds[1],
+        )
+        if bounds != (-np.inf, np.inf):
+            constraint: Optional[Callable] = lambda x: np.clip(x, bounds[0], bounds[1])
+        else:
+            constraint = None
+        return constraint
+
+    @Autocast()
+    def convolution(
+        self,
+        array: np.ndarray,
+        filters: np.ndarray,
+        strides: Optional[List[int]] = None,
+        padding="VALID",
+        data_format="NWC",
+        dilations: Optional[List[int]] = None,
+    ) -> np.ndarray:
+        r"""Cross-correlation of ``array`` (shape ``(batch, *spatial, in_channels)``) with
+        ``filters`` (shape ``(*spatial, in_channels, out_channels)``), as in
+        ``tf.nn.convolution``. Only unit strides and dilations are supported.
+        """
+        if any(s != 1 for s in strides or []) or any(d != 1 for d in dilations or []):
+            raise NotImplementedError("The NumPy convolution only supports unit strides/dilations")
+        if not data_format.startswith("N") or not data_format.endswith("C"):
+            raise NotImplementedError("The NumPy convolution only supports channels-last layouts")
+        mode = "valid" if padding.upper() == "VALID" else "same"
+        out = [
+            [
+                sum(
+                    signal.correlate(array[n, ..., i], filters[..., i, o], mode=mode)
+                    for i in range(filters.shape[-2])
+                )
+                for o in range(filters.shape[-1])
+            ]
+            for n in range(array.shape[0])
+        ]
+        return np.moveaxis(np.array(out), 1, -1)
+
+    def cos(self, array: np.ndarray) -> np.ndarray:
+        return np.cos(array)
+
+    def cosh(self, array: np.ndarray) -> np.ndarray:
+        return np.cosh(array)
+
+    def det(self, matrix: np.ndarray) -> np.ndarray:
+        return np.linalg.det(matrix)
+
+    def diag(self, array: np.ndarray, k: int = 0) -> np.ndarray:
+        array = np.asarray(array)
+        if array.ndim == 1:
+            return np.diag(array, k=k)
+        # batched, as ``tf.linalg.diag``
+        size = array.shape[-1] + abs(k)
+        out = np.zeros(array.shape[:-1] + (size, size), dtype=array.dtype)
+        rows = np.arange(array.shape[-1]) + max(-k, 0)
+        out[..., rows, rows + k] = array
+        return out
+
+    def diag_part(self, array: np.ndarray) -> np.ndarray:
+        return np.diagonal(array, axis1=-2, axis2=-1)
+
+    def einsum(self, string: str, *tensors) -> np.ndarray:
+        return np.einsum(string, *tensors)
+
+    def exp(self, array: np.ndarray) -> np.ndarray:
+        return np.exp(array)
+
+    def expand_dims(self, array: np.ndarray, axis: int) -> np.ndarray:
+        return np.expand_dims(array, axis)
+
+    def expm(self, matrix: np.ndarray) -> np.ndarray:
+        return linalg.expm(matrix)
+
+    def eye(self, size: int, dtype=np.float64) -> np.ndarray:
+        return np.eye(size, dtype=dtype)
+
+    def from_backend(self, value) -> bool:
+        return isinstance(value, np.ndarray)
+
+    def gather(self, array: np.ndarray, indices: np.ndarray, axis: int = None) -> np.ndarray:
+        return np.take(array, indices, axis=axis or 0)
+
+    def hash_tensor(self, tensor: np.ndarray) -> int:
+        if not isinstance(tensor, np.ndarray):
+            raise TypeError("Cannot hash tensor")
+        return id(tensor)
+
+    def imag(self, array: np.ndarray) -> np.ndarray:
+        return np.imag(array)
+
+    def inv(self, tensor: np.ndarray) -> np.ndarray:
+        return np.linalg.inv(tensor)
+
+    def is_trainable(self, tensor: np.ndarray) -> bool:
+        return False
+
+    def lgamma(self, x: np.ndarray) -> np.ndarray:
+        return np.real(loggamma(x))
+
+    def log(self, x: np.ndarray) -> np.ndarray:
+        return np.log(x)
+
+    @Autocast()
+    def matmul(
+        self,
+        a: np.ndarray,
+        b: np.ndarray,
+        transpose_a=False,
+        transpose_b=False,
+        adjoint_a=False,
+        adjoint_b=False,
+    ) -> np.ndarray:
+        a = self._transpose_last(a, transpose_a, adjoint_a)
+        b = self._transpose_last(b, transpose_b, adjoint_b)
+        return np.matmul(a, b)
+
+    @Autocast()
+    def matvec(
+        self, a: np.ndarray, b: np.ndarray, transpose_a=False, adjoint_a=False
+    ) -> np.ndarray:
+        a = self._transpose_last(a, transpose_a, adjoint_a)
+        return np.matmul(a, np.asarray(b)[..., None])[..., 0]
+
+    @staticmethod
+    def _transpose_last(a: np.ndarray, transpose: bool, adjoint: bool) -> np.ndarray:
+        if transpose or adjoint:
+            a = np.swapaxes(a, -1, -2)
+        return np.conj(a) if adjoint else a
+
+    @Autocast()
+    def maximum(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.maximum(a, b)
+
+    @Autocast()
+    def minimum(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.minimum(a, b)
+
+    def new_variable(
+        self, value, bounds: Tuple[Optional[float], Optional[float]], name: str, dtype=np.float64
+    ):
+        return np.array(value, dtype=dtype)
+
+    def new_constant(self, value, name: str, dtype=np.float64):
+        return np.array(value, dtype=dtype)
+
+    def norm(self, array: np.ndarray) -> np.ndarray:
+        """Note that the norm preserves the type of array."""
+        return np.asarray(np.linalg.norm(array), dtype=np.asarray(array).dtype)
+
+    def ones(self, shape: Sequence[int], dtype=np.float64) -> np.ndarray:
+        return np.ones(shape, dtype=dtype)
+
+    def ones_like(self, array: np.ndarray) -> np.ndarray:
+        return np.ones_like(array)
+
+    @Autocast()
+    def outer(self, array1: np.ndarray, array2: np.ndarray) -> np.ndarray:
+        return np.tensordot(array1, array2, [[], []])
+
+    def pad(
+        self,
+        array: np.ndarray,
+        paddings: Sequence[Tuple[int, int]],
+        mode="CONSTANT",
+        constant_values=0,
+    ) -> np.ndarray:
+        if mode.upper() == "CONSTANT":
+            return np.pad(array, paddings, mode="constant", constant_values=constant_values)
+        return np.pad(array, paddings, mode=mode.lower())
+
+    @staticmethod
+    def pinv(matrix: np.ndarray) -> np.ndarray:
+        return np.linalg.pinv(matrix)
+
+    @Autocast()
+    def pow(self, x: np.ndarray, y: float) -> np.ndarray:
+        return np.power(x, y)
+
+    def real(self, array: np.ndarray) -> np.ndarray:
+        return np.real(array)
+
+    def reshape(self, array: np.ndarray, shape: Sequence[int]) -> np.ndarray:
+        return np.reshape(array, shape)
+
+    def sin(self, array: np.ndarray) -> np.ndarray:
+        return np.sin(array)
+
+    def sinh(self, array: np.ndarray) -> np.ndarray:
+        return np.sinh(array)
+
+    def sqrt(self, x: np.ndarray, dtype=None) -> np.ndarray:
+        return np.sqrt(self.cast(x, dtype))
+
+    def sum(self, array: np.ndarray, axes: Sequence[int] = None):
+        return np.sum(array, axis=None if axes is None else tuple(np.atleast_1d(axes)))
+
+    @Autocast()
+    def tensordot(self, a: np.ndarray, b: np.ndarray, axes: List[int]) -> np.ndarray:
+        return np.tensordot(a, b, axes)
+
+    def tile(self, array: np.ndarray, repeats: Sequence[int]) -> np.ndarray:
+        return np.tile(array, repeats)
+
+    def trace(self, array: np.ndarray, dtype=None) -> np.ndarray:
+        return self.cast(np.trace(array, axis1=-2, axis2=-1), dtype)
+
+    def transpose(self, a: np.ndarray, perm: Sequence[int] = None) -> np.ndarray:
+        if a is None:
+            return None  # TODO: remove and address None inputs where tranpose is used
+        return np.transpose(a, perm)
+
+    @Autocast()
+    def update_tensor(self, tensor: np.ndarray, indices: np.ndarray, values: np.ndarray):
+        tensor = np.array(tensor)
+        tensor[self._scatter_index(indices)] = values
+        return tensor
+
+    @Autocast()
+    def update_add_tensor(self, tensor: np.ndarray, indices: np.ndarray, values: np.ndarray):
+        tensor = np.array(tensor)
+        np.add.at(tensor, self._scatter_index(indices), values)
+        return tensor
+
+    @staticmethod
+    def _scatter_index(indices: np.ndarray) -> tuple:
+        r"""The NumPy index of the ``scatter_nd`` indices, whose last axis indexes the leading
+        dimensions of the tensor."""
+        indices = np.asarray(indices)
+        return tuple(np.moveaxis(indices, -1, 0))
+
+    def unique_tensors(self, lst: List[Tensor]) -> List[Tensor]:
+        hash_dict = {}
+        for tensor in lst:
+            try:
+                if (hash := self.hash_tensor(tensor)) not in hash_dict:
+                    hash_dict[hash] = tensor
+            except TypeError:
+                continue
+        return list(hash_dict.values())
+
+    def zeros(self, shape: Sequence[int], dtype=np.float64) -> np.ndarray:
+        return np.zeros(shape, dtype=dtype)
+
+    def zeros_like(self, array: np.ndarray) -> np.ndarray:
+        return np.zeros_like(array)
+
+    # ~~~~~~~~~~~~~~~~~
+    # Special functions
+    # ~~~~~~~~~~~~~~~~~
+
+    @staticmethod
+    def DefaultEuclideanOptimizer():
+        r"""The NumPy backend has no Euclidean optimizer, as it cannot compute gradients."""
+        raise NotImplementedError(
+            "The numpy backend is not differentiable: use the tensorflow or torch backend to optimize."
+        )
+
+    def value_and_gradients(
+        self, cost_fn: Callable, parameters: Dict[str, List[Trainable]]
+    ) -> Tuple[np.ndarray, Dict[str, List[np.ndarray]]]:
+        r"""The NumPy backend cannot compute gradients."""
+        raise NotImplementedError(
+            "The numpy backend is not differentiable: use the tensorflow or torch backend to optimize."
+        )
+
+    def hermite_renormalized(
+        self, A: np.ndarray, B: np.ndarray, C: np.ndarray, shape: Tuple[int]
+    ) -> np.ndarray:
+        r"""Renormalized multidimensional Hermite polynomial given by the "exponential" Taylor
+        series of :math:`C exp(Bx - Ax^2/2)` at zero, where the series has :math:`sqrt(n!)` at the
+        denominator rather than :math:`n!`. Note the minus sign in front of ``A``.
+
+        Args:
+            A: The A matrix.
+            B: The B vector.
+            C: The C scalar.
+            shape: The shape of the final tensor.
+
+        Returns:
+            The renormalized Hermite polynomial of given shape.
+        """
+        return hermite.hermite_renormalized(A, B, C, shape)
+
+    def hermite_renormalized_batch(
+        self, A: np.ndarray, B: np.ndarray, C: np.ndarray, shape: Tuple[int]
+    ) -> np.ndarray:
+        r"""Renormalized multidimensional Hermite polynomials of a batch of ``A``, ``B`` and ``C``
+        (see :meth:`hermite_renormalized`).
+
+        Args:
+            A: The batch of A matrices, with shape ``(K, N, N)``.
+            B: The batch of B vectors, with shape ``(K, N)``.
+            C: The batch of C scalars, with shape ``(K,)``.
+            shape: The shape of each polynomial tensor.
+
+        Returns:
+            The renormalized Hermite polynomials, with shape ``(K,) + shape``.
+        """
+        return hermite.hermite_renormalized_batch(A, B, C, shape)
+
+    def hermite_renormalized_extend(
+        self, A: np.ndarray, B: np.ndarray, C: np.ndarray, G: np.ndarray, shape: Tuple[int]
+    ) -> np.ndarray:
+        r"""Extends the renormalized multidimensional Hermite polynomials ``G`` to the given shape
+        (see :meth:`hermite_renormalized`).
+
+        Args:
+            A: The A matrix.
+            B: The B vector.
+            C: The C scalar.
+            G: The previously computed polynomials.
+            shape: The shape of the final tensor.
+
+        Returns:
+            The renormalized Hermite polynomial of given shape.
+        """
+        return hermite.hermite_renormalized_extend(A, B, C, G, shape)
+
+    @staticmethod
+    def eigvals(tensor: np.ndarray) -> Tensor:
+        """Returns the eigenvalues of a matrix."""
+        return np.linalg.eigvals(tensor)
+
+    @staticmethod
+    def eigvalsh(tensor: np.ndarray) -> Tensor:
+        """Returns the eigenvalues of a Real Symmetric or Hermitian matrix."""
+        return np.linalg.eigvalsh(tensor)
+
+    @staticmethod
+    def svd(tensor: np.ndarray) -> Tensor:
+        """Returns the Singular Value Decomposition of a matrix, in the order of ``tf.linalg.svd``."""
+        u, s, vh = np.linalg.svd(tensor, full_matrices=False)
+        return s, u, np.conj(np.swapaxes(vh, -1, -2))
+
+    @staticmethod
+    def xlogy(x: np.ndarray, y: np.ndarray) -> Tensor:
+        """Returns 0 if ``x == 0,`` and ``x * log(y)`` otherwise, elementwise."""
+        return xlogy(x, y)
+
+    @staticmethod
+    def eigh(tensor: np.ndarray) -> Tensor:
+        """Returns the eigenvalues and eigenvectors of a matrix."""
+        return np.linalg.eigh(tensor)
+
+    @staticmethod
+    def cholesky(tensor: np.ndarray) -> Tensor:
+        """Returns the lower-triangular Cholesky factor of a positive definite matrix."""
+        return np.linalg.cholesky(tensor)
+
+    def sqrtm(self, tensor: np.ndarray, rtol=1e-05, atol=1e-08) -> Tensor:
+        """Returns the matrix square root of a square matrix, such that ``sqrt(A) @ sqrt(A) = A``."""
+
+        # The sqrtm function has issues with matrices that are close to zero, hence we branch
+        if np.allclose(tensor, 0, rtol=rtol, atol=atol):
+            return self.zeros_like(tensor)
+        return linalg.sqrtm(tensor)
+
+    @staticmethod
+    def boolean_mask(tensor: np.ndarray, mask: np.ndarray) -> Tensor:
+        """Returns a tensor based on the truth value of the boolean mask."""
+        return np.asarray(tensor)[np.asarray(mask, dtype=bool)]
@@ -16,9 +16,8 @@
 
 import numpy as np
 import tensorflow as tf
-from thewalrus import hermite_multidimensional, grad_hermite_multidimensional
-
 from mrmustard.math.autocast import Autocast
+from mrmustard.math import hermite
 from mrmustard.types import (
     List,
     Tensor,
@@ -318,14 +317,22 @@ class TFMath(MathInterface):
         gradients = tape.gradient(loss, list(parameters.values()))
         return loss, dict(zip(parameters.keys(), gradients))
 
-    @tf.custom_gradient
+    def compile_function(self, fn: Callable) -> Callable:
+        return tf.function(fn)
+
+    def executing_eagerly(self) -> bool:
+        return tf.executing_eagerly()
+
     def hermite_renormalized(
         self, A: tf.Tensor, B: tf.Tensor, C: tf.Tensor, shape: Tuple[int]
-    ) -> tf.Tensor:  # TODO this is not ready
+    ) -> tf.Tensor:
         r"""Renormalized multidimensional Hermite polynomial given by the "exponential" Taylor
-        series of :math:`exp(C + Bx - Ax^2)` at zero, where the series has :math:`sqrt(n!)` at the
+        series of :math:`C exp(Bx - Ax^2/2)` at zero, where the series has :math:`sqrt(n!)` at the
         denominator rather than :math:`n!`. Note the minus sign in front of ``A``.
 
+        The tensor and its gradient are computed by the recursion engine in
+        :mod:`mrmustard.math.hermite`.
+
         Args:
             A: The A matrix.
             B: The B vector.
@@ -335,21 +342,46 @@ class TFMath(MathInterface):
         Returns:
             The renormalized Hermite polynomial of given shape.
         """
-        poly = tf.numpy_function(
-            hermite_multidimensional, [A, shape, B, C, True, True, True], A.dtype
-        )
+        poly = _hermite_renormalized(A, B, C, _shape_tensor(shape))
+        return tf.ensure_shape(poly, shape)
 
-        def grad(dLdpoly):
-            dpoly_dC, dpoly_dA, dpoly_dB = tf.numpy_function(
-                grad_hermite_multidimensional, [poly, A, B, C], [poly.dtype] * 3
-            )
-            ax = tuple(range(dLdpoly.ndim))
-            dLdA = self.sum(dLdpoly[..., None, None] * self.conj(dpoly_dA), axes=ax)
-            dLdB = self.sum(dLdpoly[..., None] * self.conj(dpoly_dB), axes=ax)
-            dLdC = self.sum(dLdpoly * self.conj(dpoly_dC), axes=ax)
-            return dLdA, dLdB, dLdC
+    def hermite_renormalized_batch(
+        self, A: tf.Tensor, B: tf.Tensor, C: tf.Tensor, shape: Tuple[int]
+    ) -> tf.Tensor:
+        r"""Renormalized multidimensional Hermite polynomials of a batch of ``A``, ``B`` and ``C``
+        (see :meth:`hermite_renormalized`), computed in a single call to the recursion engine.
+
+        Args:
+            A: The batch of A matrices, with shape ``(K, N, N)``.
+            B: The batch of B vectors, with shape ``(K, N)``.
+            C: The batch of C scalars, with shape ``(K,)``.
+            shape: The shape of each polynomial tensor.
 
-        return poly, grad
+        Returns:
+            The renormalized Hermite polynomials, with shape ``(K,) + shape``.
+        """
+        poly = _hermite_renormalized_batch(A, B, C, _shape_tensor(shape))
+        return tf.ensure_shape(poly, [A.shape[0]] + list(shape))
+
+    def hermite_renormalized_extend(
+        self, A: tf.Tensor, B: tf.Tensor, C: tf.Tensor, G: tf.Tensor, shape: Tuple[int]
+    ) -> tf.Tensor:
+        r"""Extends the renormalized multidimensional Hermite polynomials ``G`` (the output of
+        :meth:`hermite_renormalized` for a smaller shape) to the given shape, computing only the
+        new entries. The result and its gradient are those of :meth:`hermite_renormalized`.
+
+        Args:
+            A: The A matrix.
+            B: The B vector.
+            C: The C scalar.
+            G: The previously computed polynomials (not differentiated).
+            shape: The shape of the final tensor.
+
+        Returns:
+            The renormalized Hermite polynomial of given shape.
+        """
+        poly = _hermite_renormalized_extend(A, B, C, G, _shape_tensor(shape))
+        return tf.ensure_shape(poly, shape)
 
     @staticmethod
     def eigvals(tensor: tf.Tensor) -> Tensor:
@@ -376,6 +408,11 @@ class TFMath(MathInterface):
         """Returns the eigenvalues and eigenvectors of a matrix."""
         return tf.linalg.eigh(tensor)
 
+    @staticmethod
+    def cholesky(tensor: tf.Tensor) -> Tensor:
+        """Returns the lower-triangular Cholesky factor of a positive definite matrix."""
+        return tf.linalg.cholesky(tensor)
+
     def sqrtm(self, tensor: tf.Tensor, rtol=1e-05, atol=1e-08) -> Tensor:
         """Returns the matrix square root of a square matrix, such that ``sqrt(A) @ sqrt(A) = A``."""
 
@@ -429,3 +466,56 @@ class TFMath(MathInterface):
             return dL_dtensor, dL_dvalue
 
         return _tensor, grad
+
+
+# The Hermite polynomials are differentiated with respect to ``A``, ``B`` and ``C`` only. The shape
+# is passed as a tensor so that the same functions can be traced by ``tf.function``, where
+# ``tf.custom_gradient`` does not accept keyword arguments, and the static shape of the result
+# (unknown to ``tf.numpy_function``) is restored by the methods of ``TFMath``.
+
+
+def _shape_tensor(shape: Sequence[int]) -> tf.Tensor:
+    return tf.convert_to_tensor([int(s) for s in shape], dtype=tf.int64)
+
+
+@tf.custom_gradient
+def _hermite_renormalized(A: tf.Tensor, B: tf.Tensor, C: tf.Tensor, shape: tf.Tensor) -> tf.Tensor:
+    poly = tf.numpy_function(hermite.hermite_renormalized, [A, B, C, shape], A.dtype)
+
+    def grad(dLdpoly):
+        dLdA, dLdB, dLdC = tf.numpy_function(
+            hermite.hermite_renormalized_vjp, [poly, dLdpoly, A, B, C], [poly.dtype] * 3
+        )
+        return dLdA, dLdB, dLdC, None
+
+    return poly, grad
+
+
+@tf.custom_gradient
+def _hermite_renormalized_batch(
+    A: tf.Tensor, B: tf.Tensor, C: tf.Tensor, shape: tf.Tensor
+) -> tf.Tensor:
+    poly = tf.numpy_function(hermite.hermite_renormalized_batch, [A, B, C, shape], A.dtype)
+
+    def grad(dLdpoly):
+        dLdA, dLdB, dLdC = tf.numpy_function(
+            hermite.hermite_renormalized_batch_vjp, [poly, dLdpoly, A, B, C], [poly.dtype] * 3
+        )
+        return dLdA, dLdB, dLdC, None
+
+    return poly, grad
+
+
+@tf.custom_gradient
+def _hermite_renormalized_extend(
+    A: tf.Tensor, B: tf.Tensor, C: tf.Tensor, G: tf.Tensor, shape: tf.Tensor
+) -> tf.Tensor:
+    poly = tf.numpy_function(hermite.hermite_renormalized_extend, [A, B, C, G, shape], A.dtype)
+
+    def grad(dLdpoly):
+        dLdA, dLdB, dLdC = tf.numpy_function(
+            hermite.hermite_renormalized_vjp, [poly, dLdpoly, A, B, C], [poly.dtype] * 3
+        )
+        return dLdA, dLdB, dLdC, None, None
+
+    return poly, grad
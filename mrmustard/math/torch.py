@@ -29,6 +29,7 @@ from mrmustard.types import (
     Union,
 )
 from mrmustard.math.autocast import Autocast
+from mrmustard.math import hermite
 from .math_interface import MathInterface
 
 # pylint: disable=too-many-public-methods,no-self-use
@@ -297,19 +298,22 @@ class TorchMath(MathInterface):
         return torch.tensor(value, dtype=dtype)
 
     def asnumpy(self, tensor: torch.Tensor) -> Tensor:
-        return tensor.numpy()
+        return tensor.detach().numpy()
 
     def hash_tensor(self, tensor: torch.Tensor) -> str:
         return hash(tensor)
 
     def hermite_renormalized(
         self, A: torch.Tensor, B: torch.Tensor, C: torch.Tensor, shape: Tuple[int]
-    ) -> torch.Tensor:  # TODO this is not ready
+    ) -> torch.Tensor:
         r"""Renormalized multidimensional Hermite polynomial.
 
-        This is given by the "exponential" Taylor series of :math:`exp(Ax^2 + Bx + C)` at zero,
+        This is given by the "exponential" Taylor series of :math:`C exp(Bx - Ax^2/2)` at zero,
         where the series has :math:`sqrt(n!)` at the denominator rather than `n!`.
 
+        The tensor and its gradient are computed by the recursion engine in
+        :mod:`mrmustard.math.hermite`.
+
         Args:
             A: The A matrix.
             B: The B vector.
@@ -319,7 +323,43 @@ class TorchMath(MathInterface):
         Returns:
             The renormalized Hermite polynomial of given shape.
         """
-        raise NotImplementedError
+        return HermiteRenormalized.apply(A, B, C, tuple(shape))
+
+    def hermite_renormalized_batch(
+        self, A: torch.Tensor, B: torch.Tensor, C: torch.Tensor, shape: Tuple[int]
+    ) -> torch.Tensor:
+        r"""Renormalized multidimensional Hermite polynomials of a batch of ``A``, ``B`` and ``C``
+        (see :meth:`hermite_renormalized`), computed in a single call to the recursion engine.
+
+        Args:
+            A: The batch of A matrices, with shape ``(K, N, N)``.
+            B: The batch of B vectors, with shape ``(K, N)``.
+            C: The batch of C scalars, with shape ``(K,)``.
+            shape: The shape of each polynomial tensor.
+
+        Returns:
+            The renormalized Hermite polynomials, with shape ``(K,) + shape``.
+        """
+        return HermiteRenormalizedBatch.apply(A, B, C, tuple(shape))
+
+    def hermite_renormalized_extend(
+        self, A: torch.Tensor, B: torch.Tensor, C: torch.Tensor, G: torch.Tensor, shape: Tuple[int]
+    ) -> torch.Tensor:
+        r"""Extends the renormalized multidimensional Hermite polynomials ``G`` (the output of
+        :meth:`hermite_renormalized` for a smaller shape) to the given shape, computing only the
+        new entries.
+
+        Args:
+            A: The A matrix.
+            B: The B vector.
+            C: The C scalar.
+            G: The previously computed polynomials (not differentiated).
+            shape: The shape of the final tensor.
+
+        Returns:
+            The renormalized Hermite polynomial of given shape.
+        """
+        return HermiteRenormalizedExtend.apply(A, B, C, G, tuple(shape))
 
     def DefaultEuclideanOptimizer(self, params) -> torch.optim.Optimizer:
         r"""Default optimizer for the Euclidean parameters."""
@@ -360,6 +400,14 @@ class TorchMath(MathInterface):
         """Returns the eigenvalues of a Real Symmetric or Hermitian matrix."""
         return torch.linalg.eigvalsh(tensor)
 
+    def eigh(self, tensor: torch.Tensor) -> Tensor:
+        """Returns the eigenvalues and eigenvectors of a matrix."""
+        return torch.linalg.eigh(tensor)
+
+    def cholesky(self, tensor: torch.Tensor) -> Tensor:
+        """Returns the lower-triangular Cholesky factor of a positive definite matrix."""
+        return torch.linalg.cholesky(tensor)
+
     def svd(self, tensor: torch.Tensor) -> Tensor:
         """Returns the Singular Value Decomposition of a matrix."""
         return torch.linalg.svd(tensor)
@@ -374,3 +422,73 @@ class TorchMath(MathInterface):
     def boolean_mask(self, tensor: torch.Tensor, mask: torch.Tensor) -> Tensor:
         """Returns a new 1-D tensor which indexes the `input` tensor according to the boolean mask `mask`."""
         return torch.masked_select(tensor, mask)
+
+
+# pylint: disable=abstract-method,arguments-differ
+class HermiteRenormalized(torch.autograd.Function):
+    r"""Differentiable wrapper of :func:`mrmustard.math.hermite.hermite_renormalized`."""
+
+    @staticmethod
+    def forward(ctx, A, B, C, shape):
+        return _hermite_forward(hermite.hermite_renormalized, ctx, A, B, C, shape)
+
+    @staticmethod
+    def backward(ctx, dLdpoly):
+        return _hermite_backward(hermite.hermite_renormalized_vjp, ctx, dLdpoly)
+
+
+# pylint: disable=abstract-method,arguments-differ
+class HermiteRenormalizedBatch(torch.autograd.Function):
+    r"""Differentiable wrapper of :func:`mrmustard.math.hermite.hermite_renormalized_batch`."""
+
+    @staticmethod
+    def forward(ctx, A, B, C, shape):
+        return _hermite_forward(hermite.hermite_renormalized_batch, ctx, A, B, C, shape)
+
+    @staticmethod
+    def backward(ctx, dLdpoly):
+        return _hermite_backward(hermite.hermite_renormalized_batch_vjp, ctx, dLdpoly)
+
+
+# pylint: disable=abstract-method,arguments-differ
+class HermiteRenormalizedExtend(torch.autograd.Function):
+    r"""Differentiable wrapper of :func:`mrmustard.math.hermite.hermite_renormalized_extend`."""
+
+    @staticmethod
+    def forward(ctx, A, B, C, G, shape):
+        G = G.detach().numpy()
+
+        def engine(A, B, C, shape):
+            return hermite.hermite_renormalized_extend(A, B, C, G, shape)
+
+        return _hermite_forward(engine, ctx, A, B, C, shape)
+
+    @staticmethod
+    def backward(ctx, dLdpoly):
+        return _hermite_backward(hermite.hermite_renormalized_vjp, ctx, dLdpoly) + (None,)
+
+
+def _hermite_forward(engine, ctx, A, B, C, shape):
+    r"""Runs the NumPy recursion ``engine`` and saves what is needed by the backward pass."""
+    poly = engine(A.detach().numpy(), B.detach().numpy(), C.detach().numpy(), shape)
+    poly = torch.from_numpy(poly)
+    ctx.save_for_backward(A, B, C, poly)
+    return poly
+
+
+def _hermite_backward(vjp, ctx, dLdpoly):
+    r"""Computes the gradients of the saved inputs with the NumPy ``vjp`` kernel."""
+    A, B, C, poly = ctx.saved_tensors
+    dLdA, dLdB, dLdC = vjp(
+        poly.numpy(),
+        dLdpoly.detach().numpy(),
+        A.detach().numpy(),
+        B.detach().numpy(),
+        C.detach().numpy(),
+    )
+    return (
+        torch.from_numpy(dLdA).to(A.dtype),
+        torch.from_numpy(dLdB).to(B.dtype),
+        torch.from_numpy(dLdC).to(C.dtype),
+        None,
+    )
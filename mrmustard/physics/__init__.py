@@ -21,6 +21,7 @@ optimization routine.
 """
 
 from mrmustard.physics import fock, gaussian
+from mrmustard.physics.sampling import sample
 from mrmustard import settings
 
 # pylint: disable=protected-access
@@ -104,7 +105,7 @@ def von_neumann_entropy(A) -> float:
         float: the Von Neumann entropy of the state
     """
     if A.is_gaussian:
-        return gaussian.von_neumann_entropy(A.cov, settings.HBAR)
+        return gaussian.entropy_from_eigenvals(A.symplectic_eigenvalues)
     return fock.von_neumann_entropy(A.fock, a_dm=A.is_mixed)
 
 
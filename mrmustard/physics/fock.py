@@ -20,9 +20,11 @@ This module contains functions for performing calculations on Fock states.
 
 import numpy as np
 
-from mrmustard.types import List, Tuple, Tensor, Scalar, Matrix, Sequence, Vector
+from mrmustard.types import List, Tuple, Tensor, Scalar, Matrix, Sequence, Vector, Optional
 from mrmustard import settings
-from mrmustard.math import Math
+from mrmustard.logger import instrumented
+from mrmustard.math import Math, hermite
+from mrmustard.utils import memory
 
 math = Math()
 
@@ -67,7 +69,10 @@ def autocutoffs(
     autocutoffs = settings.AUTOCUTOFF_MIN_CUTOFF + math.cast(
         number_means + number_stdev * settings.AUTOCUTOFF_STDEV_FACTOR, "int32"
     )
-    return [int(n) for n in math.clip(autocutoffs, min_cutoff, max_cutoff)]
+    autocutoffs = math.asnumpy(math.clip(autocutoffs, min_cutoff, max_cutoff))
+    if autocutoffs.ndim > 1:  # batch of states: the cutoffs must fit all of them
+        autocutoffs = np.max(autocutoffs, axis=0)
+    return [int(n) for n in autocutoffs]
 
 
 def fock_representation(
@@ -77,6 +82,7 @@ def fock_representation(
     return_dm: bool = None,
     return_unitary: bool = None,
     choi_r: float = None,
+    known: Optional[Tensor] = None,
 ) -> Tensor:
     r"""Returns the Fock representation of a state or Choi state.
 
@@ -85,6 +91,18 @@ def fock_representation(
     * If the transformation is unitary it returns the unitary transformation matrix.
     * If the transformation is not unitary it returns the Choi matrix.
 
+    If ``cov`` and ``means`` carry a leading batch axis (shapes ``(K, 2N, 2N)`` and ``(K, 2N)``)
+    the result carries the same batch axis and it is computed in a single call to the
+    recursion engine.
+
+    If ``known`` is given, it must be the (unbatched) Fock representation of the same state or
+    transformation for a shape that is not larger than ``shape`` along any axis. Its entries are
+    reused and only the new ones are computed.
+
+    If the tensor exceeds ``settings.FOCK_MAX_BYTES`` a :class:`~.FockMemoryError` is raised before
+    computing it, or it is computed in a ``numpy.memmap`` if ``settings.FOCK_OUT_OF_CORE`` is
+    ``True`` (see :mod:`mrmustard.utils.memory`).
+
     Args:
         cov: the Wigner covariance matrix
         means: the Wigner means vector
@@ -92,6 +110,7 @@ def fock_representation(
         return_dm: whether the state vector is mixed or not
         return_unitary: whether the transformation is unitary or not
         choi_r: the TMSV squeezing magnitude
+        known: a previously computed Fock representation with a smaller shape
 
     Returns:
         Tensor: the fock representation
@@ -102,24 +121,56 @@ def fock_representation(
         raise ValueError("Must specify either mixed or unitary.")
     if return_unitary is not None and choi_r is None:
         raise ValueError("Must specify the choi_r value.")
+    batch_shape = list(cov.shape[:1]) if len(cov.shape) == 3 else []
+    in_memory = memory.fits(batch_shape + list(shape), name="Fock representation")
     if return_dm is not None:  # i.e. it's a state
         A, B, C = ABC(cov, means, full=return_dm)
     elif return_unitary is not None and choi_r is not None:  # i.e. it's a transformation
         A, B, C = ABC(cov, means, full=not return_unitary, choi_r=choi_r)
+    if not in_memory:
+        return _fock_representation_out_of_core(math.conj(-A), math.conj(B), math.conj(C), shape)
+    if len(cov.shape) == 3:
+        if known is not None:
+            raise ValueError("Cannot reuse a previously computed tensor for a batch of states.")
+        return math.hermite_renormalized_batch(
+            math.conj(-A), math.conj(B), math.conj(C), shape=shape
+        )
+    if known is not None:
+        return math.hermite_renormalized_extend(
+            math.conj(-A), math.conj(B), math.conj(C), known, shape=shape
+        )
     return math.hermite_renormalized(
         math.conj(-A), math.conj(B), math.conj(C), shape=shape
     )  # NOTE: remove conj when TW is updated
 
 
+def _fock_representation_out_of_core(A, B, C, shape: Sequence[int]) -> np.ndarray:
+    r"""Computes the renormalized Hermite polynomials (optionally of a batch) out of core."""
+    A, B, C = math.asnumpy(A), math.asnumpy(B), math.asnumpy(C)
+    shape = tuple(int(s) for s in shape)
+    if A.ndim == 3:
+        out = memory.allocate((A.shape[0],) + shape, A.dtype, "Fock representation")
+        for k in range(A.shape[0]):
+            hermite.hermite_renormalized(A[k], B[k], C[k], shape, out=out[k])
+        return out
+    out = memory.allocate(shape, A.dtype, "Fock representation")
+    return hermite.hermite_renormalized(A, B, C, shape, out=out)
+
+
 def ket_to_dm(ket: Tensor) -> Tensor:
     r"""Maps a ket to a density matrix.
 
+    If the density matrix exceeds ``settings.FOCK_MAX_BYTES`` it is built out of core (or a
+    :class:`~.FockMemoryError` is raised, see :mod:`mrmustard.utils.memory`).
+
     Args:
         ket: the ket
 
     Returns:
         Tensor: the density matrix
     """
+    if not memory.fits(list(ket.shape) * 2, ket.dtype, "density matrix"):
+        return memory.chunked_outer(math.asnumpy(ket))
     return math.outer(ket, math.conj(ket))
 
 
@@ -144,6 +195,8 @@ def dm_to_probs(dm: Tensor) -> Tensor:
     Returns:
         Tensor: the probabilities vector
     """
+    if memory.is_out_of_core(dm):
+        return np.real(memory.chunked_diagonal(dm))
     return math.all_diagonals(dm, real=True)
 
 
@@ -158,7 +211,10 @@ def U_to_choi(U: Tensor) -> Tensor:
     """
     cutoffs = U.shape[: len(U.shape) // 2]
     N = len(cutoffs)
-    outer = math.outer(U, math.conj(U))
+    if memory.fits(list(U.shape) * 2, U.dtype, "Choi tensor"):
+        outer = math.outer(U, math.conj(U))
+    else:
+        outer = memory.chunked_outer(math.asnumpy(U))
     return math.transpose(
         outer,
         list(range(0, N))
@@ -169,38 +225,44 @@ def U_to_choi(U: Tensor) -> Tensor:
 
 
 def ABC(cov, means, full: bool, choi_r: float = None) -> Tuple[Matrix, Vector, Scalar]:
-    r"""Returns the full-size ``A`` matrix, ``B`` vector and ``C`` scalar.
+    r"""Returns the full-size or the half-size ``A`` matrix, ``B`` vector and ``C`` scalar.
+
+    The half-size ``A``, ``B`` and ``C`` (i.e. those of the ket of a pure state) are computed
+    directly from the ``N x N`` blocks of the Husimi covariance matrix, without building and
+    inverting the full ``2N x 2N`` one.
 
     Args:
-        cov: the Wigner covariance matrix
-        means: the Wigner means vector
+        cov: the Wigner covariance matrix (optionally with a leading batch axis)
+        means: the Wigner means vector (optionally with a leading batch axis)
         full: whether to return the full-size ``A``, ``B`` and ``C`` or the half-size ``A``, ``B``
             and ``C``
         choi_r: the TMSV squeezing magnitude if not None we consider ABC of a Choi state
 
     Returns:
-        Tuple[Matrix, Vector, Scalar]: full-size ``A`` matrix, ``B`` vector and ``C`` scalar
+        Tuple[Matrix, Vector, Scalar]: ``A`` matrix, ``B`` vector and ``C`` scalar
     """
     is_state = choi_r is None
     N = cov.shape[-1] // 2
     R = math.rotmat(N)
-    sigma = math.matmul(math.matmul(R, cov / settings.HBAR), math.dagger(R))
     beta = math.matvec(R, means / math.sqrt(settings.HBAR, dtype=means.dtype))
-    Q = sigma + 0.5 * math.eye(2 * N, dtype=sigma.dtype)  # Husimi covariance matrix
-    Qinv = math.inv(Q)
-    A = math.matmul(math.Xmat(N), math.eye(2 * N, dtype=Qinv.dtype) - Qinv)
-    denom = math.sqrt(math.det(Q)) if is_state else math.sqrt(math.det(Q / np.cosh(choi_r)))
     if full:
-        B = math.matvec(math.transpose(Qinv), math.conj(beta))
-        exponent = -0.5 * math.sum(math.conj(beta)[:, None] * Qinv * beta[None, :])
+        sigma = math.matmul(math.matmul(R, cov / settings.HBAR), math.dagger(R))
+        Q = sigma + 0.5 * math.eye(2 * N, dtype=sigma.dtype)  # Husimi covariance matrix
+        Qinv = math.inv(Q)
+        A = math.matmul(math.Xmat(N), math.eye(2 * N, dtype=Qinv.dtype) - Qinv)
+        denom = math.sqrt(math.det(Q)) if is_state else math.sqrt(math.det(Q / np.cosh(choi_r)))
+        B = math.matvec(Qinv, math.conj(beta), transpose_a=True)
+        exponent = -0.5 * math.sum(
+            math.conj(beta)[..., :, None] * Qinv * beta[..., None, :], axes=[-2, -1]
+        )
         C = math.exp(exponent) / denom
     else:
-        A = A[
-            :N, :N
-        ]  # TODO: find a way to compute the half-size A without computing the full-size A first
-        B = beta[N:] - math.matvec(A, beta[:N])
-        exponent = -0.5 * math.sum(beta[:N] * B)
-        C = math.exp(exponent) / math.sqrt(denom)
+        A, sqrt_denom = _half_size_A(cov, N)
+        if not is_state:
+            sqrt_denom = sqrt_denom / np.cosh(choi_r) ** (N / 2)
+        B = beta[..., N:] - math.matvec(A, beta[..., :N])
+        exponent = -0.5 * math.sum(beta[..., :N] * B, axes=[-1])
+        C = math.exp(exponent) / sqrt_denom
     if choi_r is not None:
         ones = math.ones(
             N // 2, dtype=A.dtype
@@ -215,39 +277,103 @@ def ABC(cov, means, full: bool, choi_r: float = None) -> Tuple[Matrix, Vector, S
     return A, B, C
 
 
-def fidelity(state_a, state_b, a_ket: bool, b_ket: bool) -> Scalar:
-    r"""Computes the fidelity between two states in Fock representation."""
-    if a_ket and b_ket:
-        min_cutoffs = (slice(min(a, b)) for a, b in zip(state_a.shape, state_b.shape))
-        state_a = state_a[min_cutoffs]
-        state_b = state_b[min_cutoffs]
-        return math.abs(math.sum(math.conj(state_a) * state_b)) ** 2
-
-    if a_ket:
-        min_cutoffs = (
-            slice(min(a, b))
-            for a, b in zip(state_a.shape, state_b.shape[: len(state_b.shape) // 2])
-        )
-        state_a = state_a[min_cutoffs]
-        state_b = state_b[min_cutoffs * 2]
-        a = math.reshape(state_a, -1)
-        return math.real(
-            math.sum(math.conj(a) * math.matvec(math.reshape(state_b, (len(a), len(a))), a))
-        )
+def _half_size_A(cov, N: int) -> Tuple[Matrix, Scalar]:
+    r"""Returns the half-size ``A`` matrix of a pure Gaussian state and ``det(Q)^(1/4)``.
+
+    For a pure state the inverse Husimi covariance matrix has the block form
+    :math:`Q^{-1} = [[1, -A^*], [-A, 1]]`, so that :math:`A = Q_{21}Q_{11}^{-1}` and
+    :math:`\det(Q) = \det(Q_{11})`. Only the ``N x N`` blocks :math:`Q_{11}` and :math:`Q_{21}`
+    are computed and only :math:`Q_{11}` is inverted.
+
+    Args:
+        cov: the Wigner covariance matrix (optionally with a leading batch axis)
+        N (int): the number of modes
+
+    Returns:
+        Tuple[Matrix, Scalar]: the half-size ``A`` matrix and the fourth root of ``det(Q)``
+    """
+    R_top = math.rotmat(N)[:N]  # quadratures -> a
+    R_bottom = np.conj(R_top)  # quadratures -> a^*
+    cov_R = math.matmul(cov / settings.HBAR, math.dagger(R_top))
+    Q11 = math.matmul(R_top, cov_R) + 0.5 * math.eye(N, dtype=cov_R.dtype)
+    Q21 = math.matmul(R_bottom, cov_R)
+    A = math.matmul(Q21, math.inv(Q11))
+    return A, math.sqrt(math.sqrt(math.det(Q11)))
 
-    if b_ket:
-        min_cutoffs = (
-            slice(min(a, b))
-            for a, b in zip(state_a.shape[: len(state_a.shape) // 2], state_b.shape)
-        )
-        state_a = state_a[min_cutoffs * 2]
-        state_b = state_b[min_cutoffs]
-        b = math.reshape(state_b, -1)
-        return math.real(
-            math.sum(math.conj(b) * math.matvec(math.reshape(state_a, (len(b), len(b))), b))
-        )
 
-    raise NotImplementedError("Fidelity between mixed states is not implemented yet.")
+def fidelity(state_a, state_b, a_ket: bool, b_ket: bool, batched: bool = False) -> Scalar:
+    r"""Computes the fidelity between two states in Fock representation.
+
+    The fidelity is :math:`F(\rho,\sigma) = (\mathrm{tr}\sqrt{\sqrt{\rho}\sigma\sqrt{\rho}})^2`,
+    i.e. :math:`|\langle\psi|\phi\rangle|^2` between two kets. The tensors are truncated to their
+    common cutoffs. Between two density matrices it is computed from an eigendecomposition (see
+    :func:`_mixed_fidelity`), which is differentiable.
+
+    Args:
+        state_a (Tensor): the ket or the density matrix of the first state
+        state_b (Tensor): the ket or the density matrix of the second state
+        a_ket (bool): whether ``state_a`` is a ket
+        b_ket (bool): whether ``state_b`` is a ket
+        batched (bool): whether both tensors have a leading batch axis (of the same size), in
+            which case the fidelity of each pair of states is returned
+
+    Returns:
+        Scalar: the fidelity (or the vector of the fidelities of a batch)
+    """
+    batch = 1 if batched else 0
+    num_modes = len(state_a.shape) - batch if a_ket else (len(state_a.shape) - batch) // 2
+    cutoffs = [min(a, b) for a, b in zip(state_a.shape[batch:][:num_modes], state_b.shape[batch:])]
+    a = _flatten_state(state_a, cutoffs, a_ket, batch)
+    b = _flatten_state(state_b, cutoffs, b_ket, batch)
+    if a_ket and b_ket:
+        return math.abs(math.sum(math.conj(a) * b, axes=[-1])) ** 2
+    if a_ket or b_ket:
+        ket, dm = (a, b) if a_ket else (b, a)
+        return math.real(math.sum(math.conj(ket) * math.matvec(dm, ket), axes=[-1]))
+    return _mixed_fidelity(a, b)
+
+
+def _flatten_state(tensor: Tensor, cutoffs: Sequence[int], is_ket: bool, batch: int) -> Tensor:
+    r"""Returns a ket truncated to ``cutoffs`` as a vector, or a density matrix as a matrix
+    (after the first ``batch`` axes)."""
+    copies = 1 if is_ket else 2
+    tensor = tensor[tuple([slice(None)] * batch + [slice(c) for c in cutoffs] * copies)]
+    size = int(np.prod(cutoffs))
+    return math.reshape(tensor, list(tensor.shape[:batch]) + [size] * copies)
+
+
+def _mixed_fidelity(rho: Matrix, sigma: Matrix) -> Scalar:
+    r"""Returns the fidelity between two density matrices (with optional leading batch axes).
+
+    If :math:`\rho = LL^\dagger`, the nonzero eigenvalues :math:`\mu_i` of
+    :math:`\sqrt{\rho}\sigma\sqrt{\rho}` are those of :math:`L^\dagger\sigma L`, so that
+    :math:`F = (\sum_i\sqrt{\mu_i})^2`. The factor :math:`L = V\sqrt{\Lambda}` comes from the
+    eigendecomposition of the density matrix of larger purity (i.e. of smaller effective rank) and,
+    when the values are concrete, only the eigenvectors with significant eigenvalues are kept: if
+    it has rank :math:`r` the second eigendecomposition is of an :math:`r\times r` matrix (a single
+    number for a pure state).
+    """
+    if math.executing_eagerly():
+        purities = [np.sum(np.abs(math.asnumpy(dm)) ** 2, axis=(-2, -1)) for dm in (rho, sigma)]
+        swap = purities[1] > purities[0]  # for each pair of a batch
+        if np.all(swap):
+            rho, sigma = sigma, rho
+        elif np.any(swap):
+            mask = math.cast(math.astensor(swap[..., None, None]), rho.dtype)
+            rho, sigma = mask * sigma + (1 - mask) * rho, mask * rho + (1 - mask) * sigma
+    eigvals, eigvecs = math.eigh(rho)
+    eigvals = math.real(eigvals)
+    if math.executing_eagerly():
+        values = math.asnumpy(eigvals)
+        significant = values > 1e-12 * np.max(values, axis=-1, keepdims=True)
+        rank = max(int(np.max(np.sum(significant, axis=-1))), 1)
+        eigvals, eigvecs = eigvals[..., -rank:], eigvecs[..., -rank:]
+    # the eigenvalues are clipped away from 0, where the gradient of the square root diverges
+    floor = math.astensor(1e-30, dtype=eigvals.dtype)
+    L = eigvecs * math.cast(math.sqrt(math.maximum(eigvals, floor)), eigvecs.dtype)[..., None, :]
+    sigma = math.cast(sigma, L.dtype)
+    mu = math.real(math.eigvalsh(math.einsum("...ji,...jk,...kl->...il", math.conj(L), sigma, L)))
+    return math.sum(math.sqrt(math.maximum(mu, floor)), axes=[-1]) ** 2
 
 
 def number_means(tensor, is_dm: bool):
@@ -288,6 +414,7 @@ def purity(dm: Tensor) -> Scalar:
     return math.abs(math.sum(math.transpose(dm) * dm))  # tr(rho^2)
 
 
+@instrumented("fock.CPTP")
 def CPTP(transformation, fock_state, transformation_is_unitary: bool, state_is_dm: bool) -> Tensor:
     r"""Computes the CPTP (note: CP, really) channel given by a transformation (unitary matrix or choi operator) on a state.
 
@@ -303,6 +430,19 @@ def CPTP(transformation, fock_state, transformation_is_unitary: bool, state_is_d
         Tensor: the transformed state
     """
     num_modes = len(fock_state.shape) // 2 if state_is_dm else len(fock_state.shape)
+    # the largest tensor is the output, except for a Choi operator on a ket (C applied to the ket)
+    largest = list(fock_state.shape)
+    if not (transformation_is_unitary or state_is_dm):
+        largest = [
+            s for i, s in enumerate(transformation.shape) if not num_modes <= i < 2 * num_modes
+        ]
+    if not memory.fits(largest, fock_state.dtype, "output of the channel"):
+        return _CPTP_out_of_core(
+            math.asnumpy(transformation),
+            math.asnumpy(fock_state),
+            transformation_is_unitary,
+            state_is_dm,
+        )
     N0 = list(range(0, num_modes))
     N1 = list(range(num_modes, 2 * num_modes))
     N2 = list(range(2 * num_modes, 3 * num_modes))
@@ -313,7 +453,7 @@ def CPTP(transformation, fock_state, transformation_is_unitary: bool, state_is_d
         if not state_is_dm:
             return Us
         # is state is dm, the input indices of dm are still at the end of Us
-        return math.tensordot(Us, math.dagger(U), axes=(N1, N0))
+        return math.tensordot(Us, math.conj(U), axes=(N1, N1))
 
     C = transformation  # choi operator
     if state_is_dm:
@@ -325,6 +465,35 @@ def CPTP(transformation, fock_state, transformation_is_unitary: bool, state_is_d
     )  # N2 is the last set of indices now
 
 
+def _CPTP_out_of_core(
+    transformation: np.ndarray,
+    fock_state: np.ndarray,
+    transformation_is_unitary: bool,
+    state_is_dm: bool,
+) -> np.ndarray:
+    r"""Same as :func:`CPTP` with chunked contractions of NumPy arrays, for outputs that exceed the
+    memory budget."""
+    num_modes = len(fock_state.shape) // 2 if state_is_dm else len(fock_state.shape)
+    N0 = list(range(0, num_modes))
+    N1 = list(range(num_modes, 2 * num_modes))
+    N2 = list(range(2 * num_modes, 3 * num_modes))
+    N3 = list(range(3 * num_modes, 4 * num_modes))
+    if transformation_is_unitary:
+        U = transformation
+        Us = memory.chunked_tensordot(U, fock_state, axes=(N1, N0))
+        if not state_is_dm:
+            return Us
+        return memory.chunked_tensordot(Us, np.conj(U), axes=(N1, N1))
+
+    C = transformation  # choi operator
+    if state_is_dm:
+        return memory.chunked_tensordot(C, fock_state, axes=(N1 + N3, N0 + N1))
+
+    Cs = memory.chunked_tensordot(C, fock_state, axes=(N1, N0))
+    return memory.chunked_tensordot(Cs, np.conj(fock_state), axes=(N2, N0))
+
+
+@instrumented("fock.contract_states")
 def contract_states(
     stateA, stateB, a_is_mixed: bool, b_is_mixed: bool, modes: List[int], normalize: bool
 ):
@@ -413,13 +582,159 @@ def trace(dm, keep: List[int]):
         dm: the density matrix
         keep: the modes to keep
     """
+    if memory.is_out_of_core(dm):
+        return memory.chunked_trace(dm, keep)
     N = len(dm.shape) // 2
     trace = [m for m in range(N) if m not in keep]
     # put at the end all of the indices to trace over
-    dm = math.transpose(
-        dm, [i for pair in [(k, k + N) for k in keep] + [(t, t + N) for t in trace] for i in pair]
-    )
-    d = int(np.prod(dm.shape[-len(trace) :]))
+    dm = math.transpose(dm, list(keep) + [k + N for k in keep] + trace + [t + N for t in trace])
+    d = int(np.prod([dm.shape[2 * len(keep) + i] for i in range(len(trace))]))
     # make it square on those indices
-    dm = math.reshape(dm, dm.shape[: 2 * len(keep)] + (d, d))
+    dm = math.reshape(dm, tuple(dm.shape[: 2 * len(keep)]) + (d, d))
     return math.trace(dm)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~ stochastic channels ~~~~~~~~~~~~~
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class PNRChannel:
+    r"""The stochastic channel :math:`P(m|n)` of a photon-number-resolving detector with efficiency
+    :math:`\eta` and Poissonian dark counts, stored as its factors.
+
+    The channel is the binomial loss matrix :math:`\binom{n}{m}\eta^m(1-\eta)^{n-m}`, which is
+    lower triangular, followed by the convolution with the dark count distribution, of which only
+    the band of dark counts with a non-negligible probability is kept. The channel is applied in
+    this factored form: the photon numbers of the state are contracted with the rows of the
+    binomial matrix that they can reach, and the dark counts are added one band diagonal at a
+    time, so that no dense ``cutoff_out x cutoff_in`` matrix is formed.
+
+    Args:
+        binomial (Matrix): the binomial loss matrix, of shape ``(cutoff_out, cutoff_in)``
+        dark_counts (Vector): the probabilities of the first dark counts (the band)
+    """
+
+    def __init__(self, binomial: Matrix, dark_counts: Vector):
+        self.binomial = binomial
+        self.dark_counts = dark_counts
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        r"""The numbers of outcomes and of input photon numbers."""
+        return tuple(self.binomial.shape)
+
+    @property
+    def nbytes(self) -> int:
+        r"""The memory used by the channel."""
+        return math.asnumpy(self.binomial).nbytes + math.asnumpy(self.dark_counts).nbytes
+
+    @property
+    def matrix(self) -> Matrix:
+        r"""The dense matrix of the channel, of shape ``(cutoff_out, cutoff_in)`` (it is computed
+        at every call and it is not used to apply the channel)."""
+        identity = math.eye(self.shape[1], dtype=self.binomial.dtype)
+        return math.transpose(self.contract(identity, 0), [1, 0])
+
+    def contract(self, probs: Tensor, axis: int) -> Tensor:
+        r"""Applies the channel to the axis ``axis`` of ``probs``, which holds the input photon
+        numbers, and returns the tensor with the outcome axis at the end.
+
+        Args:
+            probs (Tensor): the tensor with an axis of at most ``cutoff_in`` photon numbers
+            axis (int): the axis of the photon numbers
+
+        Returns:
+            Tensor: the tensor with the ``cutoff_out`` outcomes on its last axis
+        """
+        cutoff_out, cutoff_in = self.shape[0], probs.shape[axis]
+        # at most cutoff_in - 1 photons are left after the loss
+        rows = min(cutoff_out, cutoff_in)
+        detected = math.tensordot(probs, self.binomial[:rows, :cutoff_in], [[axis], [1]])
+        dark_counts = math.cast(self.dark_counts, detected.dtype)
+        paddings = [(0, 0)] * (len(detected.shape) - 1)
+        output = 0
+        for j in range(min(dark_counts.shape[0], cutoff_out)):
+            shifted = detected[..., : cutoff_out - j]  # j dark counts
+            padding = (j, cutoff_out - j - shifted.shape[-1])
+            output += dark_counts[j] * math.pad(shifted, paddings + [padding])
+        return output
+
+
+class ThresholdChannel:
+    r"""The stochastic channel of a threshold detector, built from the probabilities
+    :math:`P(\text{no click}|n)` (the probability of a click is their complement).
+
+    Args:
+        no_click (Vector): the probabilities of no click, of shape ``(cutoff_in,)``
+    """
+
+    def __init__(self, no_click: Vector):
+        self.no_click = no_click
+        self.matrix = math.concat([no_click[None, :], 1.0 - no_click[None, :]], axis=0)
+        r"""The dense matrix of the channel, of shape ``(2, cutoff_in)``."""
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        r"""The numbers of outcomes and of input photon numbers."""
+        return (2, self.no_click.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        r"""The memory used by the channel."""
+        return 3 * math.asnumpy(self.no_click).nbytes
+
+    def contract(self, probs: Tensor, axis: int) -> Tensor:
+        r"""Applies the channel to the axis ``axis`` of ``probs``, which holds the input photon
+        numbers, and returns the tensor with the two outcomes (no click, click) at the end.
+
+        Args:
+            probs (Tensor): the tensor with an axis of at most ``cutoff_in`` photon numbers
+            axis (int): the axis of the photon numbers
+
+        Returns:
+            Tensor: the tensor with the two outcomes on its last axis
+        """
+        return math.tensordot(probs, self.matrix[:, : probs.shape[axis]], [[axis], [1]])
+
+
+def pnr_channel(efficiency: Scalar, dark_counts: Scalar, cutoff_in: int, cutoff_out: int):
+    r"""Returns the stochastic channel of a photon-number-resolving detector.
+
+    If the dark counts have a concrete value, the band of the dark count distribution only
+    contains the numbers of dark counts with a probability above ``1e-20``.
+
+    Args:
+        efficiency (Scalar): the quantum efficiency
+        dark_counts (Scalar): the expected number of dark counts
+        cutoff_in (int): the number of input photon numbers
+        cutoff_out (int): the number of outcomes
+
+    Returns:
+        PNRChannel: the channel
+    """
+    binomial = math.binomial_conditional_prob(
+        success_prob=efficiency, dim_in=cutoff_in, dim_out=cutoff_out
+    )
+    dark = math.poisson(max_k=cutoff_out, rate=dark_counts)
+    if math.executing_eagerly():
+        band = int(np.max(np.flatnonzero(math.asnumpy(dark) > 1e-20), initial=0)) + 1
+        dark = dark[:band]
+    return PNRChannel(binomial, dark)
+
+
+def threshold_channel(efficiency: Scalar, dark_count_prob: Scalar, cutoff_in: int):
+    r"""Returns the stochastic channel of a threshold detector.
+
+    Args:
+        efficiency (Scalar): the quantum efficiency
+        dark_count_prob (Scalar): the dark count probability
+        cutoff_in (int): the number of input photon numbers
+
+    Returns:
+        ThresholdChannel: the channel
+    """
+    no_click = math.pow(1.0 - efficiency, math.arange(cutoff_in)) - math.cast(
+        dark_count_prob, efficiency.dtype
+    )
+    return ThresholdChannel(no_click)
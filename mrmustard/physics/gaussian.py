@@ -16,12 +16,15 @@
 This module contains functions for performing calculations on Gaussian states.
 """
 
+from functools import lru_cache
 from typing import Tuple, Union, Sequence, Any
+import numpy as np
 from numpy import pi
 from thewalrus.quantum import is_pure_cov
-from mrmustard.types import Matrix, Vector, Scalar
+from mrmustard.types import Matrix, Vector, Scalar, Tensor
 from mrmustard.utils.xptensor import XPMatrix, XPVector
 from mrmustard import settings
+from mrmustard.logger import instrumented
 from mrmustard.math import Math
 
 math = Math()
@@ -399,6 +402,7 @@ def controlled_X(g: Scalar):
 # ~~~~~~~~~~~~~
 
 
+@instrumented("gaussian.CPTP")
 def CPTP(
     cov: Matrix,
     means: Vector,
@@ -415,6 +419,14 @@ def CPTP(
     If the channel is single-mode, ``modes`` can contain ``M`` modes to apply the channel to,
     otherwise it must contain as many modes as the number of modes in the channel.
 
+    Only the rows and columns of the modes of the channel are updated, with ``O(N M)`` work for
+    channels that act on each mode separately (single-mode channels and e.g. ``Attenuator``,
+    ``Amplifier``, ``Sgate`` or ``Rgate``) and ``O(N M^2)`` work otherwise.
+
+    The state (and the channel) can carry a leading batch axis, i.e. ``cov`` of shape
+    ``(K, 2N, 2N)`` and ``means`` of shape ``(K, 2N)``, in which case the channel is applied to
+    all the states of the batch at once.
+
     Args:
         cov (Matrix): covariance matrix
         means (Vector): means vector
@@ -433,20 +445,126 @@ def CPTP(
             f"The channel should act on a subset of the state modes ({transf_modes} is not a subset of {state_modes})"
         )
     # if single-mode channel, apply to all modes indicated in `modes`
-    if X is not None and X.shape[-1] == 2:
-        X = math.single_mode_to_multimode_mat(X, len(transf_modes))
-    if Y is not None and Y.shape[-1] == 2:
-        Y = math.single_mode_to_multimode_mat(Y, len(transf_modes))
-    if d is not None and d.shape[-1] == 2:
-        d = math.single_mode_to_multimode_vec(d, len(transf_modes))
+    batched = len(cov.shape) == 3 or any(a is not None and len(a.shape) > 2 for a in (X, Y))
+    if len(transf_modes) > 1:
+        if X is not None and X.shape[-1] == 2 and batched:
+            X = math.single_mode_to_multimode_mat(X, len(transf_modes))
+        if Y is not None and Y.shape[-1] == 2:
+            Y = math.single_mode_to_multimode_mat(Y, len(transf_modes))
+        if d is not None and d.shape[-1] == 2:
+            d = math.single_mode_to_multimode_vec(d, len(transf_modes))
     indices = [
         state_modes.index(i) for i in transf_modes
     ]  # TODO: do this when calling the method instead of here?
-    cov = math.left_matmul_at_modes(X, cov, indices)
-    cov = math.right_matmul_at_modes(cov, math.transpose(X), indices)
-    cov = math.add_at_modes(cov, Y, indices)
-    means = math.matvec_at_modes(X, means, indices)
-    means = math.add_at_modes(means, d, indices)
+    if batched:
+        return _batched_CPTP(cov, means, X, Y, d, indices)
+    return _CPTP_at_modes(cov, means, X, Y, d, indices)
+
+
+def _CPTP_at_modes(
+    cov: Matrix, means: Vector, X: Matrix, Y: Matrix, d: Vector, indices: Sequence[int]
+) -> Tuple[Matrix, Vector]:
+    r"""Unbatched version of :func:`CPTP` that only updates the rows and columns of the channel.
+
+    ``X cov X^T`` differs from ``cov`` only on the rows and columns of the ``M`` modes of the
+    channel. The rows are ``X @ cov[rows]`` with the corner ``X @ cov[rows, rows] @ X^T`` and,
+    since the result is symmetric, the columns are the rows transposed. If the channel acts on
+    most of the modes, transposing the whole matrix once is cheaper than updating the columns.
+    On many modes, the products with ``X`` are computed with the ``2 x 2`` matrix of each mode if
+    ``X`` acts on each mode separately (see :func:`_per_mode_blocks`).
+    """
+    N, M = cov.shape[-1] // 2, len(indices)
+    rows, block, corner_block, column_block = _CPTP_indices(N, tuple(indices))
+    if X is not None:
+        blocks = _per_mode_blocks(X, M) if M >= 16 else None  # only pays off on many modes
+        if blocks is None and X.shape[-1] < 2 * M:
+            X = math.single_mode_to_multimode_mat(X, M)
+        apply_X = lambda r: _matmul_per_mode(blocks, r) if blocks is not None else math.matmul(X, r)
+        means_rows = math.gather(means, rows, axis=0)
+        means_rows = math.reshape(apply_X(math.expand_dims(means_rows, -1)), [-1])
+        means = math.update_tensor(means, rows[:, None], means_rows)
+        cov_rows = apply_X(math.gather(cov, rows, axis=0))
+        if 4 * M < N:
+            corner = math.transpose(apply_X(math.transpose(math.gather(cov_rows, rows, axis=1))))
+            cov_rows = math.update_tensor(cov_rows, corner_block, math.reshape(corner, [-1]))
+            cov = math.update_tensor(cov, rows[:, None], cov_rows)
+            columns = math.reshape(math.transpose(cov_rows), [-1])
+            cov = math.update_tensor(cov, column_block, columns)
+        else:
+            cov = math.transpose(math.update_tensor(cov, rows[:, None], cov_rows))
+            cov = math.update_tensor(cov, rows[:, None], apply_X(math.gather(cov, rows, axis=0)))
+    if Y is not None:
+        cov = math.update_add_tensor(cov, block, math.reshape(Y, [-1]))
+    if d is not None:
+        means = math.update_add_tensor(means, rows[:, None], d)
+    return cov, means
+
+
+def _matmul_per_mode(blocks: Tensor, rows: Matrix) -> Matrix:
+    r"""Returns ``X @ rows`` for the ``X`` with the ``2 x 2`` matrices ``blocks`` on each of its
+    ``M`` modes (see :func:`_per_mode_blocks`) and ``rows`` of shape ``(2M, K)``."""
+    M = blocks.shape[0]
+    rows = math.transpose(math.reshape(rows, (2, M, -1)), (1, 0, 2))
+    rows = math.transpose(math.matmul(blocks, rows), (1, 0, 2))
+    return math.reshape(rows, (2 * M, -1))
+
+
+def _per_mode_blocks(X: Matrix, num_modes: int) -> Union[Matrix, None]:
+    r"""Returns the ``2 x 2`` matrices of ``X`` on each mode, with shape ``(num_modes, 2, 2)``, if
+    ``X`` acts on each mode separately (i.e. if it is a single-mode matrix or if its four
+    ``num_modes x num_modes`` blocks are diagonal) and ``None`` otherwise.
+
+    The blocks of a multimode ``X`` are only inspected when it has a concrete value.
+    """
+    if X.shape[-1] == 2:
+        return math.tile(math.expand_dims(X, axis=0), (num_modes, 1, 1))
+    if not math.executing_eagerly():
+        return None
+    off_diagonal = 1 - np.eye(num_modes)[None, :, None, :]
+    if np.any(np.reshape(math.asnumpy(X), (2, num_modes, 2, num_modes)) * off_diagonal):
+        return None
+    X = math.transpose(math.reshape(X, (2, num_modes, 2, num_modes)), (0, 2, 1, 3))
+    return math.transpose(math.diag_part(X), (2, 0, 1))
+
+
+@lru_cache(maxsize=256)
+def _CPTP_indices(num_modes: int, indices: Tuple[int, ...]) -> Tuple[np.ndarray, ...]:
+    r"""Returns the rows of the given modes in a ``2N x 2N`` covariance matrix, and the ``(row,
+    column)`` indices of their diagonal block, of the corner of those rows and of those columns."""
+    rows = np.array(list(indices) + [i + num_modes for i in indices])
+    pairs = lambda a, b: np.stack(np.meshgrid(a, b, indexing="ij"), axis=-1).reshape(-1, 2)
+    return (
+        rows,
+        pairs(rows, rows),
+        pairs(np.arange(len(rows)), rows),
+        pairs(np.arange(2 * num_modes), rows),
+    )
+
+
+def _batched_CPTP(
+    cov: Matrix, means: Vector, X: Matrix, Y: Matrix, d: Vector, indices: Sequence[int]
+) -> Tuple[Matrix, Vector]:
+    r"""Batched version of :func:`CPTP`.
+
+    The channel is embedded in the full phase space with the ``2N x 2M`` selection matrix ``E``
+    (``X -> E X E^T + 1 - E E^T``, ``Y -> E Y E^T``, ``d -> E d``) and applied with broadcasting
+    matrix products, so that any of the arguments can carry a leading batch axis.
+    """
+    N = cov.shape[-1] // 2
+    rows = list(indices) + [i + N for i in indices]
+    E = np.zeros((2 * N, len(rows)))
+    E[rows, list(range(len(rows)))] = 1.0
+    E = math.astensor(E, dtype=cov.dtype)
+    if X is not None:
+        X = math.matmul(math.matmul(E, X), E, transpose_b=True) + (
+            math.eye(2 * N, dtype=cov.dtype) - math.matmul(E, E, transpose_b=True)
+        )
+        cov = math.matmul(math.matmul(X, cov), X, transpose_b=True)
+        means = math.matvec(X, means)
+    if Y is not None:
+        cov = cov + math.matmul(math.matmul(E, Y), E, transpose_b=True)
+    if d is not None:
+        means = means + math.matvec(E, d)
     return cov, means
 
 
@@ -470,7 +588,8 @@ def loss_XYd(
         Tuple[Matrix, Matrix, None]: the ``X``, ``Y`` matrices and the ``d`` vector for the noisy
         loss channel
     """
-    if math.any(transmissivity < 0) or math.any(transmissivity > 1):
+    # traced values cannot be branched on (they are checked whenever the channel runs eagerly)
+    if math.executing_eagerly() and (math.any(transmissivity < 0) or math.any(transmissivity > 1)):
         raise ValueError("transmissivity must be between 0 and 1")
     x = math.sqrt(transmissivity)
     X = math.diag(math.concat([x, x], axis=0))
@@ -493,7 +612,7 @@ def amp_XYd(gain: Union[Scalar, Vector], nbar: Union[Scalar, Vector], hbar: floa
         Tuple[Matrix, Vector]: the ``X``, ``Y`` matrices and the ``d`` vector for the noisy
         amplifier channel.
     """
-    if math.any(gain < 1):
+    if math.executing_eagerly() and math.any(gain < 1):
         raise ValueError("Gain must be larger than 1")
     x = math.sqrt(gain)
     X = math.diag(math.concat([x, x], axis=0))
@@ -566,6 +685,9 @@ def general_dyne(
 ) -> Tuple[Scalar, Matrix, Vector]:
     r"""Returns the results of a general dyne measurement.
 
+    The state being measured and the state being projected onto can carry a leading batch axis,
+    in which case the probabilities, covariance matrices and means vectors are batched as well.
+
     Args:
         cov (Matrix): covariance matrix of the state being measured
         means (Vector): means vector of the state being measured
@@ -584,9 +706,9 @@ def general_dyne(
     proj_cov = math.cast(proj_cov, B.dtype)
     proj_means = math.cast(proj_means, b.dtype)
     inv = math.inv(B + proj_cov)
-    new_cov = A - math.matmul(math.matmul(AB, inv), math.transpose(AB))
+    new_cov = A - math.matmul(math.matmul(AB, inv), AB, transpose_b=True)
     new_means = a + math.matvec(math.matmul(AB, inv), proj_means - b)
-    prob = math.exp(-math.sum(math.matvec(inv, proj_means - b) * (proj_means - b))) / (
+    prob = math.exp(-math.sum(math.matvec(inv, proj_means - b) * (proj_means - b), axes=[-1])) / (
         pi ** nB * (hbar ** -nB) * math.sqrt(math.det(B + proj_cov))
     )  # TODO: check this (hbar part especially)
     return prob, new_cov, new_means
@@ -599,8 +721,8 @@ def number_means(cov: Matrix, means: Vector, hbar: float) -> Vector:
     r"""Returns the photon number means vector given a Wigner covariance matrix and a means vector.
 
     Args:
-        cov: the Wigner covariance matrix
-        means: the Wigner means vector
+        cov: the Wigner covariance matrix (optionally with a leading batch axis)
+        means: the Wigner means vector (optionally with a leading batch axis)
         hbar: the value of the Planck constant
 
     Returns:
@@ -608,10 +730,10 @@ def number_means(cov: Matrix, means: Vector, hbar: float) -> Vector:
     """
     N = means.shape[-1] // 2
     return (
-        means[:N] ** 2
-        + means[N:] ** 2
-        + math.diag_part(cov[:N, :N])
-        + math.diag_part(cov[N:, N:])
+        means[..., :N] ** 2
+        + means[..., N:] ** 2
+        + math.diag_part(cov[..., :N, :N])
+        + math.diag_part(cov[..., N:, N:])
         - hbar
     ) / (2 * hbar)
 
@@ -628,13 +750,18 @@ def number_cov(cov: Matrix, means: Vector, hbar: float) -> Matrix:
         Matrix: the photon number covariance matrix
     """
     N = means.shape[-1] // 2
-    mCm = cov * means[:, None] * means[None, :]
-    dd = math.diag(math.diag_part(mCm[:N, :N] + mCm[N:, N:] + mCm[:N, N:] + mCm[N:, :N])) / (
-        2 * hbar ** 2
-    )
+    mCm = cov * means[..., :, None] * means[..., None, :]
+    dd = math.diag(
+        math.diag_part(mCm[..., :N, :N] + mCm[..., N:, N:] + mCm[..., :N, N:] + mCm[..., N:, :N])
+    ) / (2 * hbar ** 2)
     CC = (cov ** 2 + mCm) / (2 * hbar ** 2)
     return (
-        CC[:N, :N] + CC[N:, N:] + CC[:N, N:] + CC[N:, :N] + dd - 0.25 * math.eye(N, dtype=CC.dtype)
+        CC[..., :N, :N]
+        + CC[..., N:, N:]
+        + CC[..., :N, N:]
+        + CC[..., N:, :N]
+        + dd
+        - 0.25 * math.eye(N, dtype=CC.dtype)
     )
 
 
@@ -654,12 +781,12 @@ def trace(cov: Matrix, means: Vector, Bmodes: Sequence[int]) -> Tuple[Matrix, Ve
     Returns:
         Tuple[Matrix, Vector]: the covariance matrix and the means vector after discarding the specified modes
     """
-    N = len(cov) // 2
+    N = cov.shape[-1] // 2
     Aindices = math.astensor(
         [i for i in range(N) if i not in Bmodes] + [i + N for i in range(N) if i not in Bmodes]
     )
-    A_cov_block = math.gather(math.gather(cov, Aindices, axis=0), Aindices, axis=1)
-    A_means_vec = math.gather(means, Aindices)
+    A_cov_block = math.gather(math.gather(cov, Aindices, axis=-2), Aindices, axis=-1)
+    A_means_vec = math.gather(means, Aindices, axis=-1)
     return A_cov_block, A_means_vec
 
 
@@ -679,9 +806,9 @@ def partition_cov(cov: Matrix, Amodes: Sequence[int]) -> Tuple[Matrix, Matrix, M
         "int32",
     )
     Aindices = math.cast(Amodes + [i + N for i in Amodes], "int32")
-    A_block = math.gather(math.gather(cov, Aindices, axis=1), Aindices, axis=0)
-    B_block = math.gather(math.gather(cov, Bindices, axis=1), Bindices, axis=0)
-    AB_block = math.gather(math.gather(cov, Bindices, axis=1), Aindices, axis=0)
+    A_block = math.gather(math.gather(cov, Aindices, axis=-1), Aindices, axis=-2)
+    B_block = math.gather(math.gather(cov, Bindices, axis=-1), Bindices, axis=-2)
+    AB_block = math.gather(math.gather(cov, Bindices, axis=-1), Aindices, axis=-2)
     return A_block, B_block, AB_block
 
 
@@ -695,43 +822,109 @@ def partition_means(means: Vector, Amodes: Sequence[int]) -> Tuple[Vector, Vecto
     Returns:
         Tuple[Vector, Vector]: the means of ``A`` and the means of ``B``
     """
-    N = len(means) // 2
+    N = means.shape[-1] // 2
     Bindices = math.cast(
         [i for i in range(N) if i not in Amodes] + [i + N for i in range(N) if i not in Amodes],
         "int32",
     )
     Aindices = math.cast(Amodes + [i + N for i in Amodes], "int32")
-    return math.gather(means, Aindices), math.gather(means, Bindices)
+    return math.gather(means, Aindices, axis=-1), math.gather(means, Bindices, axis=-1)
 
 
 def purity(cov: Matrix, hbar: float) -> Scalar:
     r"""Returns the purity of the state with the given covariance matrix.
 
     Args:
-        cov (Matrix): the covariance matrix
+        cov (Matrix): the covariance matrix (optionally with a leading batch axis)
 
     Returns:
-        float: the purity
+        float: the purity (one per state if ``cov`` is batched)
     """
     return 1 / math.sqrt(math.det((2 / hbar) * cov))
 
 
-def symplectic_eigenvals(cov: Matrix, hbar: float) -> Any:
+def symplectic_eigenvals(cov: Matrix, hbar: float) -> Vector:
     r"""Returns the sympletic eigenspectrum of a covariance matrix.
 
     For a pure state, we expect the sympletic eigenvalues to be 1.
 
     Args:
-        cov (Matrix): the covariance matrix
+        cov (Matrix): the covariance matrix (optionally with leading batch axes)
         hbar (float): the value of the Planck constant
 
     Returns:
-        List[float]: the sympletic eigenvalues
+        Vector: the sympletic eigenvalues in increasing order
     """
-    J = math.J(cov.shape[-1] // 2)  # create a sympletic form
-    M = math.matmul(1j * J, cov * (2 / hbar))
-    vals = math.eigvals(M)  # compute the eigenspectrum
-    return math.abs(vals[::2])  # return the even eigenvalues  # TODO: sort?
+    N = cov.shape[-1] // 2
+    vals = math.real(math.eigvalsh(_williamson_form(cov, hbar)[0]))
+    return 1 / vals[..., : N - 1 : -1]  # the positive eigenvalues are the inverses
+
+
+def williamson(cov: Matrix, hbar: float) -> Tuple[Vector, Matrix]:
+    r"""Returns the Williamson decomposition of a covariance matrix: its symplectic eigenvalues
+    :math:`\nu_k` and a symplectic matrix :math:`S` such that
+    ``cov = hbar/2 * S @ diag([nu, nu]) @ S.T``, as in :func:`gaussian_cov`.
+
+    With the Cholesky factorization ``2/hbar * cov = L @ L.T``, the eigenvalues of the Hermitian
+    matrix ``iW = i L^{-1} @ J @ L^{-T}`` are :math:`\pm 1/\nu_k`. The real and imaginary parts
+    :math:`a_k` and :math:`b_k` of the eigenvectors of the positive eigenvalues give the orthogonal
+    matrix ``O = sqrt(2) [b, a]`` that takes ``W`` to its normal form, and
+    ``S = L @ O @ diag([nu, nu])^(-1/2)``. The eigenvalues of a Hermitian matrix have well-defined
+    gradients even when they are degenerate, so the entropies and purities derived from them can
+    be optimized.
+
+    Args:
+        cov (Matrix): the covariance matrix (optionally with leading batch axes)
+        hbar (float): the value of the Planck constant
+
+    Returns:
+        Tuple[Vector, Matrix]: the symplectic eigenvalues in increasing order and the symplectic
+        matrix
+    """
+    N = cov.shape[-1] // 2
+    iW, L = _williamson_form(cov, hbar)
+    vals, vecs = math.eigh(iW)
+    eigenvalues = 1 / math.real(vals[..., : N - 1 : -1])
+    vecs = vecs[..., : N - 1 : -1]
+    O = np.sqrt(2) * math.concat([math.imag(vecs), math.real(vecs)], axis=-1)
+    scale = math.concat([eigenvalues, eigenvalues], axis=-1) ** -0.5
+    return eigenvalues, math.matmul(L, O) * math.expand_dims(scale, -2)
+
+
+def _williamson_form(cov: Matrix, hbar: float) -> Tuple[Matrix, Matrix]:
+    r"""Returns the Hermitian matrix ``iW`` of :func:`williamson` and the Cholesky factor ``L``."""
+    L = math.cholesky((2 / hbar) * math.cast(cov, "float64"))
+    L_inv = math.inv(L)
+    J = math.astensor(math.J(cov.shape[-1] // 2), dtype=L.dtype)
+    W = math.matmul(math.matmul(L_inv, J), L_inv, transpose_b=True)
+    return 1j * math.cast(W, "complex128"), L
+
+
+def purity_from_eigenvals(eigenvalues: Vector) -> Scalar:
+    r"""Returns the purity of a Gaussian state from its symplectic eigenvalues.
+
+    Args:
+        eigenvalues (Vector): the symplectic eigenvalues (optionally with leading batch axes)
+
+    Returns:
+        Scalar: the purity (one per state if batched)
+    """
+    return math.exp(-math.sum(math.log(eigenvalues), axes=[-1]))
+
+
+def entropy_from_eigenvals(eigenvalues: Vector) -> Scalar:
+    r"""Returns the Von Neumann entropy of a Gaussian state from its symplectic eigenvalues.
+
+    Reference: (https://arxiv.org/pdf/1110.3234.pdf), Equations 46-47.
+
+    Args:
+        eigenvalues (Vector): the symplectic eigenvalues (optionally with leading batch axes)
+
+    Returns:
+        Scalar: the Von Neumann entropy (one per state if batched)
+    """
+    g = lambda x: math.xlogy((x + 1) / 2, (x + 1) / 2) - math.xlogy((x - 1) / 2, (x - 1) / 2 + 1e-9)
+    return math.sum(g(eigenvalues), axes=[-1])
 
 
 def von_neumann_entropy(cov: Matrix, hbar: float) -> float:
@@ -742,15 +935,12 @@ def von_neumann_entropy(cov: Matrix, hbar: float) -> float:
     Reference: (https://arxiv.org/pdf/1110.3234.pdf), Equations 46-47.
 
     Args:
-        cov (Matrix): the covariance matrix
+        cov (Matrix): the covariance matrix (optionally with leading batch axes)
 
     Returns:
-        float: the Von Neumann entropy
+        float: the Von Neumann entropy (one per state if batched)
     """
-    symp_vals = symplectic_eigenvals(cov, hbar)
-    g = lambda x: math.xlogy((x + 1) / 2, (x + 1) / 2) - math.xlogy((x - 1) / 2, (x - 1) / 2 + 1e-9)
-    entropy = math.sum(g(symp_vals))
-    return entropy
+    return entropy_from_eigenvals(symplectic_eigenvals(cov, hbar))
 
 
 def fidelity(mu1: Vector, cov1: Matrix, mu2: Vector, cov2: Matrix, hbar=2.0) -> float:
@@ -759,6 +949,8 @@ def fidelity(mu1: Vector, cov1: Matrix, mu2: Vector, cov2: Matrix, hbar=2.0) ->
     Reference: `arXiv:2102.05748 <https://arxiv.org/pdf/2102.05748.pdf>`_, equations 95-99.
     Note that we compute the square of equation 98.
 
+    Either state can carry a leading batch axis, in which case one fidelity per state is returned.
+
     Args:
         mu1 (Vector): the means vector of state 1
         mu2 (Vector): the means vector of state 2
@@ -775,8 +967,8 @@ def fidelity(mu1: Vector, cov1: Matrix, mu2: Vector, cov2: Matrix, hbar=2.0) ->
     mu1 = math.cast(mu1, "complex128")
     mu2 = math.cast(mu2, "complex128")
     deltar = (mu2 - mu1) / math.sqrt(hbar, dtype=mu1.dtype)  # convert to units where hbar = 1
-    J = math.J(cov1.shape[0] // 2)
-    I = math.eye(cov1.shape[0])
+    J = math.J(cov1.shape[-1] // 2)
+    I = math.eye(cov1.shape[-1])
     J = math.cast(J, "complex128")
     I = math.cast(I, "complex128")
 
@@ -795,7 +987,7 @@ def fidelity(mu1: Vector, cov1: Matrix, mu2: Vector, cov2: Matrix, hbar=2.0) ->
     f0 = (f0_top / f0_bot) ** (1 / 2)  # square of equation 98
 
     dot = math.sum(
-        math.transpose(deltar) * math.matvec(cov12_inv, deltar)
+        deltar * math.matvec(cov12_inv, deltar), axes=[-1]
     )  # computing (mu2-mu1)/sqrt(hbar).T @ cov12_inv @ (mu2-mu1)/sqrt(hbar)
 
     _fidelity = f0 * math.exp((-1 / 2) * dot)  # square of equation 95
@@ -857,7 +1049,7 @@ def join_covs(covs: Sequence[Matrix]) -> Tuple[Matrix, Vector]:
     Returns:
         Matrix: the joined covariance matrix
     """
-    modes = list(range(len(covs[0]) // 2))
+    modes = list(range(covs[0].shape[-1] // 2))
     cov = XPMatrix.from_xxpp(covs[0], modes=(modes, modes), like_1=True)
     for _, c in enumerate(covs[1:]):
         modes = list(range(cov.num_modes, cov.num_modes + c.shape[-1] // 2))
@@ -874,10 +1066,10 @@ def join_means(means: Sequence[Vector]) -> Vector:
     Returns:
         Vector: the joined means vector
     """
-    mean = XPVector.from_xxpp(means[0], modes=list(range(len(means[0]) // 2)))
+    mean = XPVector.from_xxpp(means[0], modes=list(range(means[0].shape[-1] // 2)))
     for _, m in enumerate(means[1:]):
         mean = mean + XPVector.from_xxpp(
-            m, modes=list(range(mean.num_modes, mean.num_modes + len(m) // 2))
+            m, modes=list(range(mean.num_modes, mean.num_modes + m.shape[-1] // 2))
         )
     return mean.to_xxpp()
 
@@ -0,0 +1,202 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+This module contains the functions that compute the probabilities of detection patterns of
+Gaussian states, without their Fock representation.
+
+The probability of the photon-number pattern :math:`n` of a Gaussian state with the (full-size)
+``A``, ``B`` and ``C`` of :func:`~.fock.ABC` is
+
+.. math::
+
+    p(n) = \frac{C\,\mathrm{lhaf}(\tilde{A}_{n})}{n_1!\cdots n_N!},
+
+where :math:`\tilde{A}_{n}` is ``A`` with the rows and columns of each mode repeated
+:math:`n_k` times (in both halves) and with the repeated entries of ``B`` on its diagonal (the
+loop hafnian of thewalrus takes the repetitions directly, at a cost that grows as
+:math:`\prod_k(n_k+1)`). For a
+pure state the half-size ``A`` and ``B`` give the amplitude, whose loop hafnian is of a matrix of
+half the size. The probability of the threshold pattern :math:`s` is
+
+.. math::
+
+    p(s) = C\,\mathrm{ltor}(O_{s}, B_{s}),
+
+with :math:`O = XA = 1 - Q^{-1}` and the rows and columns of the modes that click
+(`Bulmer et al., "Threshold detection statistics of bosonic states"
+<https://arxiv.org/abs/2202.04600>`_). The cost of a pattern grows exponentially with its total
+number of photons (or clicks) but not with the cutoff of the modes, so that the patterns of many
+modes can be computed while their Fock representation cannot.
+
+The patterns of a batch are computed once each, optionally on a pool of threads.
+"""
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+from scipy.special import factorial
+from thewalrus import loop_hafnian, ltor
+
+from mrmustard import settings
+from mrmustard.math import Math
+from mrmustard.physics import fock, gaussian
+from mrmustard.types import Matrix, Vector
+
+math = Math()
+
+__all__ = ["pnr_probabilities", "threshold_probabilities"]
+
+
+def pnr_probabilities(
+    cov: Matrix,
+    means: Vector,
+    patterns: Sequence[Sequence[int]],
+    dark_counts: Optional[Vector] = None,
+    workers: Optional[int] = None,
+) -> np.ndarray:
+    r"""Returns the probabilities of photon-number patterns of a Gaussian state.
+
+    Args:
+        cov (Matrix): the covariance matrix of the state
+        means (Vector): the means vector of the state
+        patterns (array): the photon numbers of the modes, with shape ``(..., N)``
+        dark_counts (optional, Vector): the expected (Poissonian) dark counts of each mode
+        workers (optional, int): the number of threads (the patterns are computed in the calling
+            thread if ``None``)
+
+    Returns:
+        array: the probabilities of the patterns, with shape ``(...)``
+    """
+    cov, means = np.asarray(math.asnumpy(cov)), np.asarray(math.asnumpy(means))
+    if np.isclose(math.asnumpy(gaussian.purity(cov, settings.HBAR)), 1.0):
+        probability = _pure_pnr_probability(*fock.ABC(cov, means, full=False))
+    else:
+        probability = _pnr_probability(*fock.ABC(cov, means, full=True))
+    noise = None
+    if dark_counts is not None and np.any(dark_counts):
+        dark_counts = np.broadcast_to(dark_counts, cov.shape[-1] // 2)
+        noise = lambda n, k: np.prod(
+            np.exp(-dark_counts) * dark_counts ** (n - k) / factorial(n - k)
+        )
+    return _probabilities(probability, patterns, cov.shape[-1] // 2, noise, workers)
+
+
+def threshold_probabilities(
+    cov: Matrix,
+    means: Vector,
+    patterns: Sequence[Sequence[int]],
+    dark_count_prob: Optional[Vector] = None,
+    workers: Optional[int] = None,
+) -> np.ndarray:
+    r"""Returns the probabilities of threshold (click) patterns of a Gaussian state.
+
+    Args:
+        cov (Matrix): the covariance matrix of the state
+        means (Vector): the means vector of the state
+        patterns (array): the clicks (0 or 1) of the modes, with shape ``(..., N)``
+        dark_count_prob (optional, Vector): the dark count probability of each mode
+        workers (optional, int): the number of threads (the patterns are computed in the calling
+            thread if ``None``)
+
+    Returns:
+        array: the probabilities of the patterns, with shape ``(...)``
+    """
+    if np.any(np.asarray(patterns) > 1):
+        raise ValueError("The patterns of threshold detectors can only contain 0 and 1.")
+    cov, means = np.asarray(math.asnumpy(cov)), np.asarray(math.asnumpy(means))
+    A, B, C = (np.asarray(math.asnumpy(x)) for x in fock.ABC(cov, means, full=True))
+    num_modes = cov.shape[-1] // 2
+    O = np.roll(A, num_modes, axis=0)  # X @ A
+
+    def probability(pattern):
+        rows = np.flatnonzero(np.concatenate([pattern, pattern]))
+        if len(rows) == 0:
+            return np.real(C)
+        return np.real(C * ltor(O[np.ix_(rows, rows)], B[rows]))
+
+    noise = None
+    if dark_count_prob is not None and np.any(dark_count_prob):
+        p = np.broadcast_to(dark_count_prob, num_modes)
+        # a mode clicks if it detects photons or a dark count, and stays dark otherwise
+        noise = lambda s, k: np.prod(np.where(s == 0, 1 - p, np.where(k == 0, p, 1.0)))
+    return _probabilities(probability, patterns, num_modes, noise, workers)
+
+
+def _pnr_probability(A: Matrix, B: Vector, C: complex) -> Callable:
+    r"""Returns the function that computes the probability of a pattern from the full-size
+    ``A``, ``B`` and ``C`` of a mixed state."""
+    A, B, C = (np.asarray(math.asnumpy(x)) for x in (A, B, C))
+
+    def probability(pattern):
+        reps = np.concatenate([pattern, pattern]).tolist()
+        return np.real(C * loop_hafnian(A, D=B, reps=reps)) / np.prod(factorial(pattern))
+
+    return probability
+
+
+def _pure_pnr_probability(A: Matrix, B: Vector, C: complex) -> Callable:
+    r"""Returns the function that computes the probability of a pattern from the half-size
+    ``A``, ``B`` and ``C`` of a pure state, i.e. the squared modulus of its amplitude."""
+    A, B, C = (np.asarray(math.asnumpy(x)) for x in (A, B, C))
+
+    def probability(pattern):
+        amplitude = C * loop_hafnian(A, D=B, reps=pattern.tolist())
+        return np.abs(amplitude) ** 2 / np.prod(factorial(pattern))
+
+    return probability
+
+
+def _probabilities(
+    probability: Callable,
+    patterns: Sequence[Sequence[int]],
+    num_modes: int,
+    noise: Optional[Callable],
+    workers: Optional[int],
+) -> np.ndarray:
+    r"""Computes ``probability`` of each distinct pattern (on ``workers`` threads) and returns the
+    probabilities of ``patterns``.
+
+    If ``noise(n, k)`` (the probability of detecting ``n`` when ``k`` photons or clicks arrive) is
+    given, the probability of ``n`` is the sum over the patterns ``k <= n`` of
+    ``noise(n, k) * probability(k)``.
+    """
+    patterns = np.asarray(patterns, dtype=np.int64)
+    if patterns.shape[-1] != num_modes:
+        raise ValueError(f"The patterns should have {num_modes} modes, not {patterns.shape[-1]}.")
+    flat = patterns.reshape(-1, num_modes)
+    if noise is None:
+        needed = flat
+    else:
+        sub_patterns = [list(itertools.product(*(range(n + 1) for n in p))) for p in flat]
+        needed = np.array([k for subs in sub_patterns for k in subs]).reshape(-1, num_modes)
+    unique, inverse = np.unique(needed, axis=0, return_inverse=True)
+    if workers is None or workers <= 1:
+        values = np.array([probability(k) for k in unique])
+    else:
+        # the kernels of thewalrus are parallel Numba functions, whose threading layer hangs at
+        # exit if it is started from a pool thread: start it from the calling thread
+        loop_hafnian(np.zeros((2, 2), dtype=np.complex128))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            values = np.array(list(pool.map(probability, unique)))
+    values = values[inverse.reshape(-1)]
+    if noise is not None:
+        splits = np.cumsum([len(subs) for subs in sub_patterns])[:-1]
+        values = [
+            sum(noise(n, np.array(k)) * v for k, v in zip(subs, sub_values))
+            for n, subs, sub_values in zip(flat, sub_patterns, np.split(values, splits))
+        ]
+    return np.reshape(values, patterns.shape[:-1])
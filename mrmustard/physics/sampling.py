@@ -0,0 +1,517 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+This module contains the functions that draw photon-number samples from quantum states.
+
+Gaussian states are sampled one mode at a time with the chain rule of probability, following
+the algorithm of Quesada et al., `"Quadratic speed-up for simulating Gaussian boson sampling"
+<https://arxiv.org/abs/2010.15595>`_. A mixed state is first written as a pure state with a
+random displacement (from its Williamson decomposition) and all the modes are heterodyned. Then
+the heterodyne outcome of each mode is replaced, in turn, by a photon number drawn from
+
+.. math::
+
+    p(n_k|n_1,\dots,n_{k-1},\alpha_{k+1},\dots,\alpha_M),
+
+which is the distribution of the last mode of the pure state of the first :math:`k` modes
+conditioned on the heterodyne outcomes of the others. Its amplitudes are a Hermite tensor of
+shape :math:`(n_1+1,\dots,n_{k-1}+1,\text{cutoff})`, so that neither the memory nor the work
+grow as :math:`\text{cutoff}^M`. The shots with the same photon numbers so far share a single
+batched call to the Hermite recursion.
+
+The module also draws the outcomes of homodyne and heterodyne measurements. For Gaussian states
+they are drawn from the exact Gaussian distribution of the outcomes (the post-measurement states
+then follow from :func:`~.gaussian.general_dyne`). For states in Fock representation the modes
+are measured one at a time: each outcome is drawn from the quadrature (or Husimi) distribution of
+the conditional state of the shot, discretized on a grid, and the state is then projected onto
+the eigenstate of the outcome.
+"""
+
+from typing import Callable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from thewalrus.decompositions import williamson
+
+from mrmustard import settings
+from mrmustard.math import Math, hermite
+from mrmustard.physics import fock
+
+math = Math()
+
+__all__ = [
+    "sample",
+    "sample_gaussian",
+    "sample_fock",
+    "gaussian_homodyne",
+    "gaussian_heterodyne",
+    "fock_homodyne",
+    "fock_heterodyne",
+]
+
+Seed = Union[None, int, np.random.Generator]
+
+
+def sample(
+    state,
+    shots: int,
+    modes: Optional[Sequence[int]] = None,
+    seed: Seed = None,
+    cutoffs: Optional[Sequence[int]] = None,
+) -> np.ndarray:
+    r"""Returns photon-number samples of the given modes of a state.
+
+    Gaussian states are sampled one mode at a time with :func:`sample_gaussian`, states in Fock
+    representation from their Fock probabilities with :func:`sample_fock`.
+
+    Args:
+        state (State): the state to sample
+        shots (int): the number of samples
+        modes (optional, Sequence[int]): the modes to sample (all the modes if ``None``)
+        seed (optional, int or Generator): the seed of the random number generator, or the
+            generator itself
+        cutoffs (optional, Sequence[int]): the maximum cutoffs of the sampled modes of a
+            Gaussian state (see :func:`sample_gaussian`)
+
+    Returns:
+        array: the photon numbers, of shape ``(shots, len(modes))``
+    """
+    modes = state.modes if modes is None else list(modes)
+    indices = [state.indices(mode) for mode in modes]
+    rng = np.random.default_rng(seed)
+    if state.is_gaussian:
+        return sample_gaussian(state.cov, state.means, shots, cutoffs, indices, rng)
+    ket = state.ket() if state.is_pure else None
+    if ket is not None:
+        probs = math.asnumpy(fock.ket_to_probs(ket))
+    else:
+        probs = math.asnumpy(fock.dm_to_probs(state.dm()))
+    probs = np.sum(probs, axis=tuple(i for i in range(state.num_modes) if i not in indices))
+    return sample_fock(np.transpose(probs, np.argsort(np.argsort(indices))), shots, rng)
+
+
+def sample_fock(probs, shots: int, seed: Seed = None) -> np.ndarray:
+    r"""Returns samples of a joint probability distribution of photon numbers.
+
+    Args:
+        probs (array): the probabilities, with one axis per mode
+        shots (int): the number of samples
+        seed (optional, int or Generator): the seed of the random number generator, or the
+            generator itself
+
+    Returns:
+        array: the photon numbers, of shape ``(shots, probs.ndim)``
+    """
+    probs = np.clip(np.real(math.asnumpy(probs)), 0, None)
+    flat = np.random.default_rng(seed).choice(
+        probs.size, size=shots, p=(probs / probs.sum()).ravel()
+    )
+    return np.stack(np.unravel_index(flat, probs.shape), axis=-1)
+
+
+def sample_gaussian(
+    cov,
+    means,
+    shots: int,
+    cutoffs: Optional[Sequence[int]] = None,
+    modes: Optional[Sequence[int]] = None,
+    seed: Seed = None,
+    tol: float = 1e-9,
+) -> np.ndarray:
+    r"""Returns photon-number samples of a Gaussian state, drawn one mode at a time (see the
+    module docstring).
+
+    The cutoff of each conditional distribution is chosen adaptively: it is doubled until the
+    probabilities of the two largest photon numbers are below ``tol`` (relative to the total),
+    or until it reaches the maximum cutoff of the mode.
+
+    Args:
+        cov (Matrix): the covariance matrix
+        means (Vector): the means vector
+        shots (int): the number of samples
+        cutoffs (optional, Sequence[int]): the maximum cutoff of each sampled mode
+            (``settings.AUTOCUTOFF_MAX_CUTOFF`` if ``None``)
+        modes (optional, Sequence[int]): the indices of the modes to sample, in order (all the
+            modes if ``None``)
+        seed (optional, int or Generator): the seed of the random number generator, or the
+            generator itself
+        tol (float): the relative probability below which the tail of a conditional
+            distribution is discarded
+
+    Returns:
+        array: the photon numbers, of shape ``(shots, len(modes))``
+    """
+    rng = np.random.default_rng(seed)
+    cov, means = np.real(math.asnumpy(cov)), np.real(math.asnumpy(means))
+    num_modes = cov.shape[-1] // 2
+    modes = list(range(num_modes)) if modes is None else list(modes)
+    if cutoffs is None:
+        cutoffs = [settings.AUTOCUTOFF_MAX_CUTOFF] * len(modes)
+    indices = modes + [m + num_modes for m in modes]
+    cov, means = cov[np.ix_(indices, indices)], means[indices]
+    M = len(modes)
+
+    # a pure state with a random displacement, and the heterodyne outcomes of all the modes
+    pure_cov, noise = _purify(cov, settings.HBAR)
+    displacements = means + _multivariate_normal(rng, noise, shots)
+    outcomes = displacements + _multivariate_normal(
+        rng, pure_cov + settings.HBAR / 2 * np.eye(2 * M), shots
+    )
+    alpha_het = (outcomes[:, :M] + 1j * outcomes[:, M:]) / np.sqrt(2 * settings.HBAR)
+
+    # the Bargmann function of the pure state is exp(b.z - z.a.z/2) (up to normalization)
+    A, B, _ = fock.ABC(math.astensor(pure_cov), math.astensor(displacements), full=False)
+    a = np.conj(-math.asnumpy(A))  # NOTE: the same convention as fock.fock_representation
+    b = np.conj(math.asnumpy(B))
+
+    samples = np.zeros((shots, M), dtype=np.int64)
+    for k, max_cutoff in enumerate(cutoffs):
+        # projecting the modes after k onto the coherent states of their heterodyne outcomes
+        Bk = b[:, : k + 1] - np.conj(alpha_het[:, k + 1 :]) @ a[: k + 1, k + 1 :].T
+        prefixes, group = np.unique(samples[:, :k], axis=0, return_inverse=True)
+        for g, prefix in enumerate(prefixes):
+            shots_idx = np.flatnonzero(group.reshape(-1) == g)
+            probs = _conditional_probs(
+                a[: k + 1, : k + 1], Bk[shots_idx], tuple(prefix), max_cutoff, tol
+            )
+            cdf = np.cumsum(probs, axis=-1)
+            u = rng.random(len(shots_idx))[:, None] * cdf[:, -1:]
+            samples[shots_idx, k] = np.minimum(np.sum(cdf < u, axis=-1), probs.shape[-1] - 1)
+    return samples
+
+
+def _purify(cov: np.ndarray, hbar: float) -> Tuple[np.ndarray, np.ndarray]:
+    r"""Splits the covariance matrix of a mixed state into that of a pure state and the
+    covariance matrix of a classical Gaussian noise, using the Williamson decomposition
+    :math:`V = S D S^T`: the pure state has covariance matrix :math:`\hbar SS^T/2`."""
+    D, S = williamson(cov)
+    noise = S @ (D - hbar / 2 * np.eye(len(D))) @ S.T
+    return hbar / 2 * S @ S.T, (noise + noise.T) / 2
+
+
+def _multivariate_normal(rng: np.random.Generator, cov: np.ndarray, shots: int) -> np.ndarray:
+    r"""Returns ``shots`` samples of a centered normal distribution with a positive semidefinite
+    covariance matrix."""
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    factor = eigvecs * np.sqrt(np.clip(eigvals, 0, None))
+    return rng.standard_normal((shots, len(cov))) @ factor.T
+
+
+def _conditional_probs(
+    A: np.ndarray, B: np.ndarray, prefix: Tuple[int, ...], max_cutoff: int, tol: float
+) -> np.ndarray:
+    r"""Returns the (unnormalized) probabilities of the photon numbers of the last mode of the
+    pure states with Bargmann function :math:`\exp(B\cdot z - z\cdot A\cdot z/2)` (one per row of
+    ``B``), given the photon numbers ``prefix`` in the previous modes."""
+    cutoff = min(4, max_cutoff)
+    while True:
+        shape = [n + 1 for n in prefix] + [cutoff]
+        K = len(B)
+        G = hermite.hermite_renormalized_batch(
+            np.broadcast_to(A, (K,) + A.shape), B, np.ones(K, dtype=B.dtype), shape
+        )
+        probs = np.abs(G[(slice(None),) + prefix]) ** 2
+        tail = np.max(probs[:, -2:], axis=-1)
+        if cutoff >= max_cutoff or np.all(tail <= tol * np.sum(probs, axis=-1)):
+            return probs
+        cutoff = min(2 * cutoff, max_cutoff)
+
+
+def gaussian_homodyne(
+    cov, means, modes: Sequence[int], angles, shots: int, seed: Seed = None
+) -> np.ndarray:
+    r"""Returns samples of the rotated quadratures :math:`x\cos\theta + p\sin\theta` of some modes
+    of a Gaussian state.
+
+    Args:
+        cov (Matrix): the covariance matrix
+        means (Vector): the means vector
+        modes (Sequence[int]): the indices of the measured modes
+        angles (array): the quadrature angle of each measured mode
+        shots (int): the number of samples
+        seed (optional, int or Generator): the seed of the random number generator, or the
+            generator itself
+
+    Returns:
+        array: the quadrature values, of shape ``(shots, len(modes))``
+    """
+    cov, means = np.real(math.asnumpy(cov)), np.real(math.asnumpy(means))
+    num_modes = cov.shape[-1] // 2
+    angles = np.broadcast_to(np.asarray(angles, dtype=np.float64), (len(modes),))
+    U = np.zeros((len(modes), 2 * num_modes))
+    U[np.arange(len(modes)), list(modes)] = np.cos(angles)
+    U[np.arange(len(modes)), [m + num_modes for m in modes]] = np.sin(angles)
+    rng = np.random.default_rng(seed)
+    return U @ means + _multivariate_normal(rng, U @ cov @ U.T, shots)
+
+
+def gaussian_heterodyne(cov, means, modes: Sequence[int], shots: int, seed: Seed = None):
+    r"""Returns samples of the heterodyne outcomes of some modes of a Gaussian state, i.e. of the
+    means vectors of the coherent states onto which the modes are projected. Their distribution
+    is normal, with the means and the covariance matrix of the measured modes plus that of the
+    vacuum.
+
+    Args:
+        cov (Matrix): the covariance matrix
+        means (Vector): the means vector
+        modes (Sequence[int]): the indices of the measured modes
+        shots (int): the number of samples
+        seed (optional, int or Generator): the seed of the random number generator, or the
+            generator itself
+
+    Returns:
+        array: the means vectors of the outcomes (in ``xxpp`` ordering), of shape
+        ``(shots, 2 * len(modes))``
+    """
+    cov, means = np.real(math.asnumpy(cov)), np.real(math.asnumpy(means))
+    num_modes = cov.shape[-1] // 2
+    indices = list(modes) + [m + num_modes for m in modes]
+    cov = cov[np.ix_(indices, indices)] + settings.HBAR / 2 * np.eye(len(indices))
+    rng = np.random.default_rng(seed)
+    return means[indices] + _multivariate_normal(rng, cov, shots)
+
+
+def fock_homodyne(
+    tensor, is_dm: bool, modes: Sequence[int], angles, shots: int, seed: Seed = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    r"""Returns samples of the rotated quadratures :math:`x\cos\theta + p\sin\theta` of some modes
+    of a state in Fock representation, together with the conditional states of the other modes.
+
+    The modes are measured in the given order. The outcome of each mode is drawn from the
+    quadrature distribution of the conditional state of each shot, evaluated on a grid that
+    covers the wavefunctions of all the Fock states below the cutoff, and is interpolated
+    linearly between the points of the grid.
+
+    Args:
+        tensor (array): the ket or the density matrix
+        is_dm (bool): whether ``tensor`` is a density matrix
+        modes (Sequence[int]): the indices of the measured modes
+        angles (array): the quadrature angle of each measured mode
+        shots (int): the number of samples
+        seed (optional, int or Generator): the seed of the random number generator, or the
+            generator itself
+
+    Returns:
+        Tuple[array, array]: the quadrature values, of shape ``(shots, len(modes))``, and the
+        normalized conditional kets or density matrices, with a leading axis of size ``shots``
+    """
+    rng = np.random.default_rng(seed)
+    angles = np.broadcast_to(np.asarray(angles, dtype=np.float64), (len(modes),))
+    tensor = np.asarray(math.asnumpy(tensor), dtype=np.complex128)[None]
+    remaining = list(range(tensor.ndim - 1) if not is_dm else range((tensor.ndim - 1) // 2))
+    outcomes = np.zeros((shots, len(modes)))
+    for k, (mode, angle) in enumerate(zip(modes, angles)):
+        index = remaining.index(mode)
+        cutoff = tensor.shape[1 + index]
+        grid = _quadrature_grid(cutoff)
+        # <x_theta|n> = exp(-i n theta) psi_n(x)
+        bras = _quadrature_wavefunctions(grid, cutoff) * np.exp(-1j * angle * np.arange(cutoff))
+        T = _mode_first(tensor, is_dm, index)  # a single state before the first projection
+        outcomes[:, k] = _sample_densities(rng, bras, T, is_dm, grid, shots)
+        bras = _quadrature_wavefunctions(outcomes[:, k], cutoff) * np.exp(
+            -1j * angle * np.arange(cutoff)
+        )
+        tensor = _project(tensor, is_dm, index, bras)
+        remaining.remove(mode)
+    return outcomes, tensor
+
+
+def fock_heterodyne(
+    tensor, is_dm: bool, modes: Sequence[int], shots: int, seed: Seed = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    r"""Returns samples of the heterodyne outcomes :math:`\alpha` of some modes of a state in Fock
+    representation, together with the conditional states of the other modes.
+
+    The modes are measured in the given order. The real part of the outcome of each mode is
+    drawn from the marginal of the Husimi function of the conditional state of each shot, which is
+    its :math:`x` quadrature distribution convolved with that of the vacuum, and the imaginary
+    part from the Husimi function :math:`\langle\alpha|\rho|\alpha\rangle/\pi` restricted to the
+    sampled real part.
+
+    Args:
+        tensor (array): the ket or the density matrix
+        is_dm (bool): whether ``tensor`` is a density matrix
+        modes (Sequence[int]): the indices of the measured modes
+        shots (int): the number of samples
+        seed (optional, int or Generator): the seed of the random number generator, or the
+            generator itself
+
+    Returns:
+        Tuple[array, array]: the complex outcomes :math:`\alpha`, of shape
+        ``(shots, len(modes))``, and the normalized conditional kets or density matrices, with a
+        leading axis of size ``shots``
+    """
+    rng = np.random.default_rng(seed)
+    hbar = settings.HBAR
+    tensor = np.asarray(math.asnumpy(tensor), dtype=np.complex128)[None]
+    remaining = list(range(tensor.ndim - 1) if not is_dm else range((tensor.ndim - 1) // 2))
+    outcomes = np.zeros((shots, len(modes)), dtype=np.complex128)
+    for k, mode in enumerate(modes):
+        index = remaining.index(mode)
+        cutoff = tensor.shape[1 + index]
+        grid = _quadrature_grid(cutoff, margin=np.sqrt(hbar / 2))
+        bras = _quadrature_wavefunctions(grid, cutoff)
+        T = _mode_first(tensor, is_dm, index)  # a single state before the first projection
+        kernel = np.exp(-((grid[:, None] - grid[None, :]) ** 2) / hbar)  # the vacuum, var hbar/2
+        x = _sample_densities(rng, bras, T, is_dm, grid, shots, kernel)
+
+        def coherent_bras(rows, x=x, grid=grid, cutoff=cutoff):
+            # <alpha|n> on the line of the sampled real parts, of shape (rows, len(grid), cutoff)
+            return _coherent_bras((x[rows, None] + 1j * grid[None, :]) / np.sqrt(2 * hbar), cutoff)
+
+        y = _sample_densities(rng, coherent_bras, T, is_dm, grid, shots)
+        outcomes[:, k] = (x + 1j * y) / np.sqrt(2 * hbar)
+        tensor = _project(tensor, is_dm, index, _coherent_bras(outcomes[:, k], cutoff))
+        remaining.remove(mode)
+    return outcomes, tensor
+
+
+def _quadrature_grid(cutoff: int, margin: float = 0.0, points: int = 401) -> np.ndarray:
+    r"""Returns a grid of quadrature values that covers the wavefunctions of the Fock states below
+    the cutoff (they decay beyond the classical turning point :math:`\sqrt{\hbar(2n+1)}`)."""
+    width = np.sqrt(settings.HBAR) * (np.sqrt(2 * cutoff + 1) + 6) + 6 * margin
+    return np.linspace(-width, width, points)
+
+
+def _quadrature_wavefunctions(x: np.ndarray, cutoff: int) -> np.ndarray:
+    r"""Returns the wavefunctions :math:`\psi_n(x) = \langle x|n\rangle` of the Fock states below
+    the cutoff, of shape ``x.shape + (cutoff,)``, computed with the stable recursion
+    :math:`\psi_n = \sqrt{2/n}\,(x/\sqrt{\hbar})\,\psi_{n-1} - \sqrt{(n-1)/n}\,\psi_{n-2}`."""
+    hbar = settings.HBAR
+    psi = np.zeros(np.shape(x) + (cutoff,))
+    psi[..., 0] = np.exp(-(x**2) / (2 * hbar)) / (np.pi * hbar) ** 0.25
+    if cutoff > 1:
+        psi[..., 1] = np.sqrt(2 / hbar) * x * psi[..., 0]
+    for n in range(2, cutoff):
+        psi[..., n] = (
+            np.sqrt(2 / n) * x / np.sqrt(hbar) * psi[..., n - 1]
+            - np.sqrt((n - 1) / n) * psi[..., n - 2]
+        )
+    return psi
+
+
+def _coherent_bras(alpha: np.ndarray, cutoff: int) -> np.ndarray:
+    r"""Returns the amplitudes :math:`\langle\alpha|n\rangle = e^{-|\alpha|^2/2}\bar\alpha^n/\sqrt{n!}`
+    of the coherent states :math:`|\alpha\rangle`, of shape ``alpha.shape + (cutoff,)``."""
+    bras = np.zeros(np.shape(alpha) + (cutoff,), dtype=np.complex128)
+    bras[..., 0] = np.exp(-np.abs(alpha) ** 2 / 2)
+    for n in range(1, cutoff):
+        bras[..., n] = bras[..., n - 1] * np.conj(alpha) / np.sqrt(n)
+    return bras
+
+
+def _sample_densities(
+    rng: np.random.Generator,
+    bras: Union[np.ndarray, Callable[[slice], np.ndarray]],
+    T: np.ndarray,
+    is_dm: bool,
+    grid: np.ndarray,
+    shots: int,
+    kernel: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    r"""Returns one sample per shot of the (unnormalized) densities :math:`\langle b|\rho|b\rangle`
+    of the reduced states of a mode on a grid of bras, optionally convolved with ``kernel``.
+
+    A density shared by all the shots is computed once. Otherwise the shots are processed in
+    chunks, so that the intermediate arrays hold about ``2**20`` entries whatever the number of
+    shots.
+
+    Args:
+        rng (Generator): the random number generator
+        bras (array or Callable): the bras of the grid, of shape ``(len(grid), cutoff)``, or a
+            function returning those of a slice of shots, of shape
+            ``(shots, len(grid), cutoff)``
+        T (array): the kets or density matrices with the measured mode first (see
+            :func:`_mode_first`), a single one shared by all the shots or one per shot
+        is_dm (bool): whether ``T`` holds density matrices
+        grid (array): the points of the grid
+        shots (int): the number of samples
+        kernel (optional, array): the matrix the densities are multiplied with
+
+    Returns:
+        array: the samples, of shape ``(shots,)``
+    """
+    if len(T) == 1 and not callable(bras):
+        return _sample_grid(rng, _densities(bras, T, is_dm, kernel), grid, shots)
+    samples = np.empty(shots)
+    chunk = max(1, 2**20 // (len(grid) * max(T.shape[1], T.shape[-1])))
+    for start in range(0, shots, chunk):
+        rows = slice(start, min(start + chunk, shots))
+        b = bras(rows) if callable(bras) else bras
+        densities = _densities(b, T if len(T) == 1 else T[rows], is_dm, kernel)
+        samples[rows] = _sample_grid(rng, densities, grid, rows.stop - rows.start)
+    return samples
+
+
+def _densities(
+    bras: np.ndarray, T: np.ndarray, is_dm: bool, kernel: Optional[np.ndarray]
+) -> np.ndarray:
+    r"""Returns the densities :math:`\langle b|\rho|b\rangle` of a batch of kets or density
+    matrices with the measured mode first (one row per state or per row of ``bras``)."""
+    if is_dm:
+        rho = np.einsum("bmnrr->bmn", T)
+        densities = np.real(np.sum((bras @ rho) * bras.conj(), axis=-1))
+    else:
+        densities = np.sum(np.abs(bras @ T) ** 2, axis=-1)
+    return densities if kernel is None else densities @ kernel
+
+
+def _sample_grid(
+    rng: np.random.Generator, densities: np.ndarray, grid: np.ndarray, shots: int
+) -> np.ndarray:
+    r"""Returns one sample per shot of the (unnormalized) probability densities in the rows of
+    ``densities`` (one per shot, or a single one shared by all the shots), by inverting their
+    cumulative distribution, which is piecewise linear on the grid."""
+    densities = np.clip(densities, 0, None)
+    cells = (densities[:, 1:] + densities[:, :-1]) / 2 * np.diff(grid)
+    cdf = np.concatenate([np.zeros((len(cells), 1)), np.cumsum(cells, axis=-1)], axis=-1)
+    rows = np.arange(shots) if len(cdf) > 1 else np.zeros(shots, dtype=np.int64)
+    u = rng.random(shots) * cdf[rows, -1]
+    if len(cdf) > 1:
+        idx = np.sum(cdf[:, 1:] < u[:, None], axis=-1)
+    else:  # the number of entries of the shared cdf below each u
+        idx = np.searchsorted(cdf[0, 1:], u)
+    idx = np.clip(idx, 0, len(grid) - 2)
+    fraction = (u - cdf[rows, idx]) / np.where(cells[rows, idx] > 0, cells[rows, idx], 1.0)
+    return grid[idx] + np.clip(fraction, 0, 1) * (grid[idx + 1] - grid[idx])
+
+
+def _project(tensor: np.ndarray, is_dm: bool, index: int, bras: np.ndarray) -> np.ndarray:
+    r"""Projects a mode of a batch of kets or density matrices onto the states whose bras have
+    the amplitudes ``bras`` (one row per shot) and returns the normalized states of the other
+    modes. A batch of size one is broadcast to all the shots."""
+    shape = np.delete(tensor.shape[1:], [index, index + tensor.ndim // 2] if is_dm else [index])
+    T = _mode_first(tensor, is_dm, index)
+    batch = "s" if len(T) > 1 else ""
+    T = T if len(T) > 1 else T[0]
+    if is_dm:
+        T = np.einsum(f"sm,{batch}mnrt,sn->srt", bras, T, bras.conj())
+        T = T / np.einsum("srr->s", T)[:, None, None]
+    else:
+        T = np.einsum(f"sm,{batch}mr->sr", bras, T)
+        T = T / np.linalg.norm(T, axis=-1, keepdims=True)
+    return T.reshape((len(bras),) + tuple(shape))
+
+
+def _mode_first(tensor: np.ndarray, is_dm: bool, index: int) -> np.ndarray:
+    r"""Moves the axes of a mode of a batch of kets (or density matrices) after the batch axis
+    and flattens the others, returning an array of shape ``(batch, cutoff, rest)`` (or
+    ``(batch, cutoff, cutoff, rest, rest)``)."""
+    B, cutoff = tensor.shape[0], tensor.shape[1 + index]
+    if is_dm:
+        N = (tensor.ndim - 1) // 2
+        T = np.moveaxis(tensor, [1 + index, 1 + N + index], [1, 2])
+        rest = int(np.prod(T.shape[3 : 3 + N - 1], dtype=np.int64))
+        return T.reshape(B, cutoff, cutoff, rest, rest)
+    return np.moveaxis(tensor, 1 + index, 1).reshape(B, cutoff, -1)
@@ -0,0 +1,202 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+This module contains the functions that compute the discretized Wigner function of states in Fock
+representation.
+
+Writing :math:`\alpha = (q + ip)/\sqrt{2\hbar}` for the points of the grid, the Wigner function
+
+.. math::
+
+    W(\alpha) = \frac{e^{-2|\alpha|^2}}{\pi\hbar}\,\mathrm{Re}\sum_{L\geq 0}(2\alpha)^L
+    \sum_n (2 - \delta_{L0})\,\rho_{n,n+L}\,(-1)^n\sqrt{\frac{n!}{(n+L)!}}\,L_n^{(L)}(4|\alpha|^2)
+
+is evaluated with a Horner scheme over the diagonals :math:`L` of the density matrix and a
+Clenshaw recursion for the sums of the generalized Laguerre polynomials :math:`L_n^{(L)}`, so that
+the work on the grid is vectorized and no intermediate Wigner function of :math:`|m\rangle\langle n|`
+is stored. The density matrices can have leading batch axes.
+
+If Numba is available, ``method="numba"`` evaluates the same recursion point by point in a
+compiled kernel, which needs no temporary arrays of the size of the grid.
+"""
+
+import importlib
+import numpy as np
+from scipy.integrate import trapezoid
+
+from mrmustard import settings
+from mrmustard.math import Math
+from mrmustard.physics import fock
+from mrmustard.types import Optional, Tuple
+
+if importlib.util.find_spec("numba"):
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+else:
+    NUMBA_AVAILABLE = False
+
+math = Math()
+
+__all__ = ["wigner", "wigner_marginal", "quadrature_marginals"]
+
+
+def wigner(
+    rho,
+    xvec: np.ndarray,
+    pvec: np.ndarray,
+    hbar: Optional[float] = None,
+    method: str = "clenshaw",
+) -> np.ndarray:
+    r"""Returns the Wigner function of a single-mode density matrix on a grid of phase space.
+
+    Args:
+        rho (array): the density matrix, of shape ``(..., cutoff, cutoff)``. The leading axes are
+            batch axes.
+        xvec (array): the discretized :math:`x` quadrature values
+        pvec (array): the discretized :math:`p` quadrature values
+        hbar (optional, float): the value of :math:`\hbar` (``settings.HBAR`` if ``None``)
+        method (str): ``"clenshaw"`` for the vectorized recursion or ``"numba"`` for the
+            compiled kernel
+
+    Returns:
+        array: the Wigner function, of shape ``(..., len(pvec), len(xvec))``
+    """
+    hbar = settings.HBAR if hbar is None else hbar
+    rho = np.asarray(math.asnumpy(rho), dtype=np.complex128)
+    Q, P = np.meshgrid(np.asarray(xvec, dtype=np.float64), np.asarray(pvec, dtype=np.float64))
+    A2 = (Q + 1j * P) * np.sqrt(2 / hbar)  # twice the complex amplitude alpha
+    rho = rho * (2 - np.eye(rho.shape[-1]))  # the terms with L > 0 appear with their conjugates
+    if method == "numba":
+        if not NUMBA_AVAILABLE:
+            raise ImportError("Numba is required by the 'numba' method")
+        batch = rho.shape[:-2]
+        rhos = rho.reshape((-1,) + rho.shape[-2:])
+        W = np.empty((rhos.shape[0], A2.size))
+        L, k = np.indices((rho.shape[-1], rho.shape[-1] + 1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            a = np.nan_to_num(np.sqrt((k - 1) * (L + k - 1) / ((L + k) * k)))
+            b = np.nan_to_num(1 / np.sqrt((L + k) * k))
+        for r, w in zip(rhos, W):
+            _wigner_numba(np.ascontiguousarray(r), A2.reshape(-1), a, b, w)
+        W = W.reshape(batch + A2.shape)
+    elif method == "clenshaw":
+        W = _wigner_clenshaw(rho, A2)
+    else:
+        raise ValueError(f"Unknown method {method}: it must be 'clenshaw' or 'numba'.")
+    return W / (np.pi * hbar)
+
+
+def _wigner_clenshaw(rho: np.ndarray, A2: np.ndarray) -> np.ndarray:
+    r"""The vectorized recursion of :func:`wigner` without the :math:`1/(\pi\hbar)` factor."""
+    cutoff = rho.shape[-1]
+    B = np.abs(A2) ** 2
+    W = rho[..., 0, cutoff - 1, None, None] * np.ones_like(A2)
+    for L in range(cutoff - 2, -1, -1):
+        diagonal = np.diagonal(rho, L, axis1=-2, axis2=-1)
+        W = _laguerre_sum(L, B, diagonal) + W * A2 / np.sqrt(L + 1)
+    return np.real(W) * np.exp(-B / 2)
+
+
+def _laguerre_sum(L: int, x: np.ndarray, c: np.ndarray) -> np.ndarray:
+    r"""Clenshaw recursion for :math:`\sum_n c_n (-1)^n\sqrt{n!/(n+L)!}L_n^{(L)}(x)`, where the
+    coefficients ``c`` have shape ``(..., n)`` and ``x`` is the grid."""
+    c = c[..., None, None]
+    if c.shape[-3] == 1:
+        return c[..., 0, :, :] * np.ones_like(x)
+    y0, y1 = c[..., -2, :, :], c[..., -1, :, :]
+    k = c.shape[-3]
+    for i in range(3, c.shape[-3] + 1):
+        k -= 1
+        y0, y1 = (
+            c[..., -i, :, :] - y1 * np.sqrt((k - 1) * (L + k - 1) / ((L + k) * k)),
+            y0 - y1 * ((L + 2 * k - 1) - x) / np.sqrt((L + k) * k),
+        )
+    return y0 - y1 * ((L + 1) - x) / np.sqrt(L + 1)
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _wigner_numba(rho, A2, a, b, W):  # pragma: no cover
+        r"""Evaluates the recursion of :func:`_wigner_clenshaw` at each point of ``A2`` and writes
+        the result (without the :math:`1/(\pi\hbar)` factor) in ``W``. The coefficients of the
+        recursion are tabulated in ``a[L, k]`` and ``b[L, k]``."""
+        cutoff = rho.shape[0]
+        for p in range(A2.shape[0]):
+            a2 = A2[p]
+            x = a2.real**2 + a2.imag**2
+            w = rho[0, cutoff - 1] + 0j
+            for L in range(cutoff - 2, -1, -1):
+                n = cutoff - L  # the length of the diagonal L
+                if n == 1:
+                    s = rho[0, L] + 0j
+                else:
+                    y0 = rho[n - 2, n - 2 + L] + 0j
+                    y1 = rho[n - 1, n - 1 + L] + 0j
+                    k = n
+                    for i in range(3, n + 1):
+                        k -= 1
+                        y0, y1 = (
+                            rho[n - i, n - i + L] - y1 * a[L, k],
+                            y0 - y1 * ((L + 2 * k - 1) - x) * b[L, k],
+                        )
+                    s = y0 - y1 * ((L + 1) - x) * b[L, 1]
+                w = s + w * a2 * b[L, 1]
+            W[p] = w.real * np.exp(-x / 2)
+
+
+def wigner_marginal(
+    dm,
+    mode: int,
+    xvec: np.ndarray,
+    pvec: np.ndarray,
+    hbar: Optional[float] = None,
+    method: str = "clenshaw",
+) -> np.ndarray:
+    r"""Returns the Wigner function of one mode of a multimode density matrix, i.e. the Wigner
+    function of its reduced density matrix.
+
+    Args:
+        dm (array): the density matrix of :math:`N` modes, with :math:`2N` axes
+        mode (int): the index of the mode
+        xvec (array): the discretized :math:`x` quadrature values
+        pvec (array): the discretized :math:`p` quadrature values
+        hbar (optional, float): the value of :math:`\hbar` (``settings.HBAR`` if ``None``)
+        method (str): ``"clenshaw"`` or ``"numba"`` (see :func:`wigner`)
+
+    Returns:
+        array: the Wigner function, of shape ``(len(pvec), len(xvec))``
+    """
+    reduced = fock.trace(math.astensor(dm), keep=[mode])
+    return wigner(reduced, xvec, pvec, hbar, method)
+
+
+def quadrature_marginals(
+    W: np.ndarray, xvec: np.ndarray, pvec: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    r"""Returns the probability densities of the :math:`x` and :math:`p` quadratures, obtained by
+    integrating the Wigner function ``W`` (as returned by :func:`wigner`) over the other quadrature.
+
+    Args:
+        W (array): the Wigner function, of shape ``(..., len(pvec), len(xvec))``
+        xvec (array): the discretized :math:`x` quadrature values
+        pvec (array): the discretized :math:`p` quadrature values
+
+    Returns:
+        Tuple[array, array]: the densities of :math:`x` (over ``xvec``) and of :math:`p`
+        (over ``pvec``)
+    """
+    return trapezoid(W, pvec, axis=-2), trapezoid(W, xvec, axis=-1)
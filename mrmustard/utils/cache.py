@@ -0,0 +1,176 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+This module contains the least-recently-used cache of the Fock representations of transformations
+(see :meth:`Transformation.U` and :meth:`Transformation.choi`) and of the stochastic channels of
+the detectors.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+from mrmustard import settings
+from mrmustard.types import Any, Callable, Dict, Hashable, Optional, Tensor
+from mrmustard.math import Math
+
+math = Math()
+
+
+class FockCache:
+    r"""A least-recently-used cache of tensors with a memory budget.
+
+    When adding an entry would exceed the memory budget, the least recently used entries are
+    evicted. Values which depend on trainable parameters are only cached inside
+    :meth:`caching_trainable` (i.e. within a step of the optimizer) and removed when it exits:
+    outside of it they are recomputed at every call, so that they are always differentiable in the
+    gradient context of the caller.
+
+    Args:
+        max_bytes (optional, int): the memory budget in bytes. If ``None`` the budget is read from
+            ``settings.FOCK_CACHE_MAX_BYTES`` at every insertion. A budget of ``0`` disables the cache.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, nbytes, trainable)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._trainable_scopes = 0
+
+    @property
+    def max_bytes(self) -> int:
+        r"""The memory budget in bytes."""
+        return settings.FOCK_CACHE_MAX_BYTES if self._max_bytes is None else self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: Optional[int]):
+        self._max_bytes = value
+        self._evict(0)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Tensor], trainable: bool = False):
+        r"""Returns the value stored under ``key``, computing and storing it on a miss.
+
+        Args:
+            key (Hashable): the key of the entry
+            compute (Callable): a function with no arguments that returns the value
+            trainable (bool): whether the value depends on trainable parameters
+
+        Returns:
+            Tensor: the cached or newly computed value
+        """
+        if trainable and not self._trainable_scopes:
+            return compute()
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+        self.misses += 1
+        value = compute()
+        self.put(key, value, trainable)
+        return value
+
+    def put(self, key: Hashable, value: Tensor, trainable: bool = False):
+        r"""Stores ``value`` under ``key`` if it fits in the memory budget.
+
+        Args:
+            key (Hashable): the key of the entry
+            value (Tensor): the value to store
+            trainable (bool): whether the value depends on trainable parameters
+        """
+        nbytes = getattr(value, "nbytes", None)  # e.g. the stochastic channels of detectors
+        nbytes = math.asnumpy(value).nbytes if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        self._evict(nbytes)
+        self._entries[key] = (value, nbytes, trainable)
+        self.nbytes += nbytes
+
+    @contextmanager
+    def caching_trainable(self):
+        r"""A context in which the values that depend on trainable parameters are cached too.
+
+        The values are computed in the gradient context of the first call, so the context should
+        not outlive it (e.g. it wraps a single training step). The trainable entries are removed
+        when the outermost context exits.
+        """
+        self._trainable_scopes += 1
+        try:
+            yield self
+        finally:
+            self._trainable_scopes -= 1
+            if not self._trainable_scopes:
+                self.invalidate_trainable()
+
+    def invalidate_trainable(self):
+        r"""Removes the entries that depend on trainable parameters."""
+        for key in [key for key, (_, _, trainable) in self._entries.items() if trainable]:
+            self.nbytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        r"""Removes all the entries and resets the hit and miss counters."""
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        r"""The number of hits, misses and entries and the memory used by the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def _evict(self, nbytes: int):
+        r"""Evicts least recently used entries until ``nbytes`` more bytes fit in the budget."""
+        while self._entries and self.nbytes + nbytes > self.max_bytes:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.nbytes -= size
+
+
+def array_key(*arrays: Optional[Tensor]) -> tuple:
+    r"""Returns a hashable key made of the shapes and values of the given arrays.
+
+    ``None`` entries are kept in the key as ``None``.
+    """
+    key = ()
+    for array in arrays:
+        if array is None:
+            key += (None,)
+        else:
+            array = np.ascontiguousarray(math.asnumpy(array))
+            key += ((array.shape, array.dtype.str, array.tobytes()),)
+    return key
+
+
+fock_cache = FockCache()
+r"""The cache of the Fock representations of transformations and of the stochastic channels of
+detectors."""
+
+# the cached tensors belong to the backend that computed them
+settings.on_backend_change(lambda _: fock_cache.clear())
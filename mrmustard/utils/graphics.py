@@ -20,7 +20,7 @@ import numpy as np
 from mrmustard.types import *
 from mrmustard import settings
 from numba import njit
-from copy import copy
+from mrmustard.physics.wigner import wigner, quadrature_marginals
 
 
 class Progressbar:
@@ -65,7 +65,7 @@ class Progressbar:
 def plot_wigner(rho, xvec, pvec, hbar):
     r"""Calculates the discretized Wigner function of the specified mode.
 
-    Lifted from `strawberryfields <https://github.com/XanaduAI/strawberryfields/blob/master/strawberryfields/backends/states.py#L725>`_
+    See :func:`mrmustard.physics.wigner.wigner`.
 
     Args:
         rho (complex array): the state in Fock representation (can be pure or mixed)
@@ -74,48 +74,14 @@ def plot_wigner(rho, xvec, pvec, hbar):
         hbar (float): the value of ``\hbar``
     """
 
-    Q, P = np.meshgrid(xvec, pvec)
-    cutoff = rho.shape[-1]
-    A = (Q + P * 1.0j) / (2 * np.sqrt(hbar / 2))
-
-    Wlist = np.array([np.zeros(np.shape(A), dtype=complex) for k in range(cutoff)])
-
-    # Wigner function for |0><0|
-    Wlist[0] = np.exp(-2.0 * np.abs(A) ** 2) / np.pi
-
-    # W = rho(0,0)W(|0><0|)
-    W = np.real(rho[0, 0]) * np.real(Wlist[0])
-
-    for n in range(1, cutoff):
-        Wlist[n] = (2.0 * A * Wlist[n - 1]) / np.sqrt(n)
-        W += 2 * np.real(rho[0, n] * Wlist[n])
-
-    for m in range(1, cutoff):
-        temp = copy(Wlist[m])
-        # Wlist[m] = Wigner function for |m><m|
-        Wlist[m] = (2 * np.conj(A) * temp - np.sqrt(m) * Wlist[m - 1]) / np.sqrt(m)
-
-        # W += rho(m,m)W(|m><m|)
-        W += np.real(rho[m, m] * Wlist[m])
-
-        for n in range(m + 1, cutoff):
-            temp2 = (2 * A * Wlist[n - 1] - np.sqrt(m) * temp) / np.sqrt(n)
-            temp = copy(Wlist[n])
-            # Wlist[n] = Wigner function for |m><n|
-            Wlist[n] = temp2
-
-            # W += rho(m,n)W(|m><n|) + rho(n,m)W(|n><m|)
-            W += 2 * np.real(rho[m, n] * Wlist[n])
-
-    return W / hbar
+    return wigner(rho, xvec, pvec, hbar)
 
 
 def mikkel_plot(rho: np.ndarray, filename: str = "", xbounds=(-6, 6), ybounds=(-6, 6)):
     X = np.linspace(xbounds[0], xbounds[1], 200)
     P = np.linspace(ybounds[0], ybounds[1], 200)
-    W = plot_wigner(rho, X, P, settings.HBAR)
-    ProbX = np.sum(W, axis=0)
-    ProbP = np.sum(W, axis=1)
+    W = wigner(rho, X, P, settings.HBAR)
+    ProbX, ProbP = quadrature_marginals(W, X, P)
 
     ### PLOTTING ###
 
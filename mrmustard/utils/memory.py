@@ -0,0 +1,262 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""
+This module contains the memory budget of the Fock tensors and the out-of-core store used for
+the tensors that exceed it.
+
+Before allocating a Fock tensor, the functions in :mod:`mrmustard.physics.fock` estimate its size
+with :func:`fits`. If the size exceeds ``settings.FOCK_MAX_BYTES`` a :class:`FockMemoryError` is
+raised with the estimated size, unless ``settings.FOCK_OUT_OF_CORE`` is ``True``, in which case the
+tensor is stored in a ``numpy.memmap`` (in ``settings.FOCK_MEMMAP_DIR`` or in the temporary
+directory) and processed in chunks that fit in the budget.
+
+Out-of-core tensors are NumPy arrays: they are not differentiable and they should only be passed to
+the functions that handle them in chunks (:func:`chunked_tensordot`, :func:`chunked_trace`,
+:func:`chunked_diagonal` and the functions of :mod:`mrmustard.physics.fock` that use them).
+"""
+
+import tempfile
+import numpy as np
+
+from mrmustard import settings
+from mrmustard.types import List, Optional, Sequence, Tuple
+
+__all__ = [
+    "FockMemoryError",
+    "estimate_nbytes",
+    "fits",
+    "allocate",
+    "is_out_of_core",
+    "chunked_outer",
+    "chunked_tensordot",
+    "chunked_trace",
+    "chunked_diagonal",
+]
+
+
+class FockMemoryError(MemoryError):
+    r"""Raised when a Fock tensor would exceed the memory budget ``settings.FOCK_MAX_BYTES``."""
+
+
+def _itemsize(dtype) -> int:
+    r"""Returns the size in bytes of an element of a NumPy, TensorFlow or Torch ``dtype``."""
+    try:
+        return np.dtype(dtype).itemsize
+    except TypeError:
+        return getattr(dtype, "size", None) or dtype.itemsize
+
+
+def estimate_nbytes(shape: Sequence[int], dtype=np.complex128) -> int:
+    r"""Returns the number of bytes of a dense tensor of the given shape and dtype.
+
+    Args:
+        shape (Sequence[int]): the shape of the tensor
+        dtype: the dtype of the tensor (NumPy, TensorFlow or Torch)
+
+    Returns:
+        int: the size of the tensor in bytes
+    """
+    return int(np.prod([int(s) for s in shape], dtype=object)) * _itemsize(dtype)
+
+
+def _format_nbytes(nbytes: int) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB", "PiB"]:
+        if nbytes < 1024 or unit == "PiB":
+            return f"{nbytes:.1f} {unit}" if unit != "B" else f"{nbytes} B"
+        nbytes /= 1024
+    return f"{nbytes} B"  # pragma: no cover
+
+
+def fits(shape: Sequence[int], dtype=np.complex128, name: str = "tensor") -> bool:
+    r"""Checks a tensor of the given shape against the memory budget.
+
+    Args:
+        shape (Sequence[int]): the shape of the tensor
+        dtype: the dtype of the tensor
+        name (str): the name of the tensor, used in the error message
+
+    Returns:
+        bool: ``True`` if the tensor fits in the budget, ``False`` if it does not but it can be
+        stored out of core
+
+    Raises:
+        FockMemoryError: if the tensor does not fit in the budget and ``settings.FOCK_OUT_OF_CORE``
+            is ``False``
+    """
+    if settings.FOCK_MAX_BYTES is None:
+        return True
+    nbytes = estimate_nbytes(shape, dtype)
+    if nbytes <= settings.FOCK_MAX_BYTES:
+        return True
+    if settings.FOCK_OUT_OF_CORE:
+        return False
+    raise FockMemoryError(
+        f"The {name} of shape {tuple(shape)} would take {_format_nbytes(nbytes)}, which exceeds "
+        f"the memory budget of {_format_nbytes(settings.FOCK_MAX_BYTES)} "
+        "(see settings.FOCK_MAX_BYTES and settings.FOCK_OUT_OF_CORE)."
+    )
+
+
+def allocate(shape: Sequence[int], dtype=np.complex128, name: str = "tensor") -> np.ndarray:
+    r"""Returns a zero-filled array, in memory if it fits in the budget and otherwise in a
+    ``numpy.memmap`` backed by a temporary file.
+
+    Args:
+        shape (Sequence[int]): the shape of the array
+        dtype: the NumPy dtype of the array
+        name (str): the name of the tensor, used in the error message
+
+    Returns:
+        array: the allocated array
+    """
+    shape = tuple(int(s) for s in shape)
+    if fits(shape, dtype, name):
+        return np.zeros(shape, dtype=dtype)
+    with tempfile.NamedTemporaryFile(dir=settings.FOCK_MEMMAP_DIR, suffix=".mm") as file:
+        # the mapping keeps the data alive after the file name is removed
+        return np.memmap(file, dtype=dtype, mode="w+", shape=shape)
+
+
+def is_out_of_core(tensor) -> bool:
+    r"""Returns whether ``tensor`` is stored out of core."""
+    return isinstance(tensor, np.memmap)
+
+
+def _chunk_bytes() -> int:
+    r"""The size of the chunks processed in memory by the out-of-core functions."""
+    return max(1, settings.FOCK_MAX_BYTES // 4) if settings.FOCK_MAX_BYTES else 2**28
+
+
+def _rows_per_chunk(row_nbytes: int) -> int:
+    return max(1, _chunk_bytes() // max(1, row_nbytes))
+
+
+def chunked_outer(ket: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    r"""Returns the density matrix :math:`|\psi\rangle\langle\psi|` of ``ket``, filled in chunks of
+    rows so that only one chunk is in memory at a time.
+
+    Args:
+        ket (array): the ket
+        out (array): the output array of shape ``ket.shape * 2``, allocated with :func:`allocate`
+            if not given
+
+    Returns:
+        array: the density matrix
+    """
+    ket = np.asarray(ket)
+    if out is None:
+        out = allocate(ket.shape * 2, ket.dtype, "density matrix")
+    flat = ket.reshape(-1)
+    out_flat = out.reshape(flat.size, flat.size)
+    rows = _rows_per_chunk(flat.size * flat.itemsize)
+    for start in range(0, flat.size, rows):
+        out_flat[start : start + rows] = flat[start : start + rows, None] * np.conj(flat)[None, :]
+    return out
+
+
+def chunked_tensordot(
+    a: np.ndarray, b: np.ndarray, axes: Tuple[List[int], List[int]], out=None
+) -> np.ndarray:
+    r"""Returns ``np.tensordot(a, b, axes)`` computed in chunks along the first free axis of ``a``.
+
+    Only a chunk of ``a`` and the corresponding chunk of the result are in memory at a time, so
+    ``a`` and the result can be out of core. ``b`` is read as a whole.
+
+    Args:
+        a (array): the first tensor
+        b (array): the second tensor
+        axes (Tuple[List[int], List[int]]): the axes of ``a`` and ``b`` to contract
+        out (array): the output array, allocated with :func:`allocate` if not given
+
+    Returns:
+        array: the contracted tensor
+    """
+    a_axes, b_axes = [list(ax) for ax in axes]
+    a_free = [i for i in range(a.ndim) if i not in a_axes]
+    b_free = [i for i in range(b.ndim) if i not in b_axes]
+    out_shape = [a.shape[i] for i in a_free] + [b.shape[i] for i in b_free]
+    dtype = np.result_type(a.dtype, b.dtype)
+    if out is None:
+        out = allocate(out_shape, dtype, "contracted tensor")
+    if not a_free:
+        out[...] = np.tensordot(np.asarray(a), np.asarray(b), axes=(a_axes, b_axes))
+        return out
+    lead = a_free[0]
+    row_nbytes = (a.size // a.shape[lead] + out.size // out.shape[0]) * np.dtype(dtype).itemsize
+    rows = _rows_per_chunk(row_nbytes)
+    index = [slice(None)] * a.ndim
+    for start in range(0, a.shape[lead], rows):
+        index[lead] = slice(start, start + rows)
+        chunk = np.asarray(a[tuple(index)])
+        out[start : start + rows] = np.tensordot(chunk, b, axes=(a_axes, b_axes))
+    return out
+
+
+def chunked_trace(dm: np.ndarray, keep: List[int]) -> np.ndarray:
+    r"""Returns the partial trace of the density matrix ``dm`` over the modes not in ``keep``.
+
+    If ``dm`` is too large to be traced in memory, the trace over the first traced mode is split
+    into a sum over its diagonal entries, each of which is a density matrix with one mode less.
+
+    Args:
+        dm (array): the density matrix
+        keep (List[int]): the modes to keep
+
+    Returns:
+        array: the reduced density matrix
+    """
+    N = dm.ndim // 2
+    keep = list(keep)
+    traced = [m for m in range(N) if m not in keep]
+    if not traced:
+        return dm
+    if estimate_nbytes(dm.shape, dm.dtype) <= _chunk_bytes():
+        return _dense_trace(np.asarray(dm), keep)
+    t = traced[0]
+    sub_keep = [k if k < t else k - 1 for k in keep]
+    out = None
+    for i in range(dm.shape[t]):
+        index = [slice(None)] * dm.ndim
+        index[t] = index[t + N] = i
+        partial = chunked_trace(dm[tuple(index)], sub_keep)
+        if out is None:
+            out = allocate(partial.shape, partial.dtype, "reduced density matrix")
+        out += partial
+    return out
+
+
+def _dense_trace(dm: np.ndarray, keep: List[int]) -> np.ndarray:
+    r"""In-memory partial trace (see :func:`mrmustard.physics.fock.trace`)."""
+    N = dm.ndim // 2
+    traced = [m for m in range(N) if m not in keep]
+    dm = np.transpose(dm, keep + [k + N for k in keep] + traced + [t + N for t in traced])
+    d = int(np.prod([dm.shape[2 * len(keep) + i] for i in range(len(traced))]))
+    dm = np.reshape(dm, dm.shape[: 2 * len(keep)] + (d, d))
+    return np.trace(dm, axis1=-2, axis2=-1)
+
+
+def chunked_diagonal(dm: np.ndarray) -> np.ndarray:
+    r"""Returns the multi-dimensional diagonal ``dm[n, n]`` of a density matrix, reading only the
+    diagonal entries.
+
+    Args:
+        dm (array): the density matrix
+
+    Returns:
+        array: the diagonal, with shape ``dm.shape[: dm.ndim // 2]``
+    """
+    cutoffs = dm.shape[: dm.ndim // 2]
+    D = int(np.prod(cutoffs))
+    return np.array(np.diagonal(dm.reshape(D, D))).reshape(cutoffs)
@@ -12,13 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 from logging import Logger
 import numpy as np
 from scipy.linalg import expm
 from mrmustard.types import *
 from mrmustard.utils import graphics
 from mrmustard.logger import create_logger
+from mrmustard import settings
 from mrmustard.math import Math
+from mrmustard.utils.cache import fock_cache
 
 math = Math()
 
@@ -33,6 +39,8 @@ class Optimizer:
         compile other types of structures like error correcting codes and encoders/decoders.
     """
 
+    max_compiled_steps: int = 4  # the number of compiled training steps kept by the optimizer
+
     def __init__(
         self, symplectic_lr: float = 0.1, orthogonal_lr: float = 0.1, euclidean_lr: float = 0.001
     ):
@@ -40,10 +48,16 @@ class Optimizer:
         self.orthogonal_lr: float = orthogonal_lr
         self.euclidean_lr: float = euclidean_lr
         self.opt_history: List[float] = [0]
+        self.histories: Dict[int, List[float]] = {}
         self.log = create_logger(__name__)
+        self._compiled_steps: Dict[tuple, Callable] = collections.OrderedDict()
 
     def minimize(
-        self, cost_fn: Callable, by_optimizing: Sequence[Trainable], max_steps: int = 1000
+        self,
+        cost_fn: Callable,
+        by_optimizing: Sequence[Trainable],
+        max_steps: int = 1000,
+        compiled: bool = False,
     ):
         r"""Minimizes the given cost function by optimizing circuits and/or detectors.
 
@@ -54,32 +68,142 @@ class Optimizer:
                 contain the parameters to optimize
             max_steps (int): the minimization keeps going until the loss is stable or max_steps are
                 reached (if ``max_steps=0`` it will only stop when the loss is stable)
+            compiled (bool): whether to compile the training step (the cost function, its
+                gradients and the parameter updates) with :meth:`math.compile_function`, so that it
+                is traced once and reused at every step. The cost function must not depend on
+                concrete values of the parameters (e.g. through ``math.asnumpy``).
         """
+        params = _trainable_parameters(by_optimizing)
+        self._minimize(cost_fn, params, max_steps, compiled, graphics.Progressbar(max_steps))
+
+    def _minimize(
+        self,
+        cost_fn: Callable,
+        params: Dict[str, List[Trainable]],
+        max_steps: int,
+        compiled: bool,
+        bar: Optional[graphics.Progressbar] = None,
+    ):
+        r"""The optimization loop of :meth:`minimize`, optionally without a progress bar."""
         try:
-            params = {
-                "symplectic": math.unique_tensors(
-                    [p for item in by_optimizing for p in item.trainable_parameters["symplectic"]]
-                ),
-                "orthogonal": math.unique_tensors(
-                    [p for item in by_optimizing for p in item.trainable_parameters["orthogonal"]]
-                ),
-                "euclidean": math.unique_tensors(
-                    [p for item in by_optimizing for p in item.trainable_parameters["euclidean"]]
-                ),
-            }
-            bar = graphics.Progressbar(max_steps)
-            with bar:
+            step = self._compiled_step(cost_fn, params) if compiled else None
+            with bar or nullcontext():
                 while not self.should_stop(max_steps):
-                    cost, grads = math.value_and_gradients(cost_fn, params)
-                    update_symplectic(params["symplectic"], grads["symplectic"], self.symplectic_lr)
-                    update_orthogonal(params["orthogonal"], grads["orthogonal"], self.orthogonal_lr)
-                    update_euclidean(params["euclidean"], grads["euclidean"], self.euclidean_lr)
+                    # the Fock representations of trainable objects are reused within a step only,
+                    # as they belong to the differentiable context of that step
+                    with fock_cache.caching_trainable():
+                        cost = self._step(cost_fn, params) if step is None else step()
                     self.opt_history.append(cost)
-                    bar.step(math.asnumpy(cost))
+                    if bar is not None:
+                        bar.step(math.asnumpy(cost))
         except KeyboardInterrupt:  # graceful exit
             self.log.info("Optimizer execution halted due to keyboard interruption.")
             raise self.OptimizerInterruptedError() from None
 
+    def minimize_many(
+        self,
+        cost_fn_factory: Callable[[int], Tuple[Callable, Sequence[Trainable]]],
+        n_starts: int,
+        workers: Optional[int] = None,
+        max_steps: int = 1000,
+        halving_steps: Optional[int] = None,
+        eta: int = 2,
+        compiled: bool = False,
+        callback: Optional[Callable[[int, List[float]], None]] = None,
+    ) -> Dict[str, List[np.ndarray]]:
+        r"""Minimizes a cost function from ``n_starts`` independent starting points, in parallel
+        on a pool of processes, and returns the parameters of the best one.
+
+        Each restart builds its own cost function and trainable objects by calling
+        ``cost_fn_factory(index)``, where ``index`` is the index of the restart (e.g. to seed the
+        random initial parameters). The factory must be picklable, i.e. defined at the top level of
+        a module, and the public attributes of ``settings`` are copied to the worker processes.
+
+        With ``halving_steps`` the restarts are optimized by successive halving: all the
+        surviving restarts are optimized for ``halving_steps`` steps, then only the best
+        ``1/eta`` of them (by their last loss) continue, until one restart is left or ``max_steps``
+        steps are reached. The parameters are passed between the rounds, but the state of the
+        Euclidean optimizer is not.
+
+        Args:
+            cost_fn_factory (Callable): a function of the index of the restart that returns the cost
+                function and the list of objects to optimize (see :meth:`minimize`)
+            n_starts (int): the number of restarts
+            workers (optional, int): the number of processes. If ``None`` it is the number of
+                CPUs; if ``0`` or ``1`` the restarts run in the current process
+            max_steps (int): the maximum number of steps of each restart (must be positive)
+            halving_steps (optional, int): the number of steps of each round of successive
+                halving. If ``None`` every restart runs for ``max_steps`` steps
+            eta (int): the inverse of the fraction of restarts kept after each round
+            compiled (bool): whether to compile the training steps (see :meth:`minimize`)
+            callback (optional, Callable): called with the index of a restart and its new losses
+                whenever a round of that restart completes
+
+        Returns:
+            Dict[str, List[array]]: the symplectic, orthogonal and euclidean parameters of the
+            restart with the lowest final loss. Its loss history is stored in ``opt_history`` and
+            the loss histories of all the restarts in ``histories``.
+        """
+        if max_steps <= 0:
+            raise ValueError("minimize_many needs a positive number of steps.")
+        lrs = (self.symplectic_lr, self.orthogonal_lr, self.euclidean_lr)
+        round_steps = halving_steps or max_steps
+        self.histories = {i: [] for i in range(n_starts)}
+        values = {i: None for i in range(n_starts)}
+        survivors = list(range(n_starts))
+        done = 0
+        with _restart_pool(workers) as pool:
+            while survivors and done < max_steps:
+                steps = min(round_steps, max_steps - done)
+                jobs = {
+                    pool.submit(
+                        _run_restart, cost_fn_factory, i, values[i], steps, lrs, compiled
+                    ): i
+                    for i in survivors
+                }
+                for job in as_completed(jobs):
+                    i = jobs[job]
+                    losses, values[i] = job.result()
+                    self.histories[i] += losses
+                    if callback is not None:
+                        callback(i, losses)
+                done += steps
+                if halving_steps is not None and len(survivors) > 1:
+                    survivors.sort(key=lambda i: self.histories[i][-1])
+                    survivors = survivors[: max(1, int(np.ceil(len(survivors) / eta)))]
+        best = min(values, key=lambda i: self.histories[i][-1] if self.histories[i] else np.inf)
+        self.opt_history = [0] + self.histories[best]
+        return values[best]
+
+    def _step(self, cost_fn: Callable, params: Dict[str, List[Trainable]]) -> Tensor:
+        r"""Computes the cost and its gradients and updates the parameters."""
+        cost, grads = math.value_and_gradients(cost_fn, params)
+        update_symplectic(params["symplectic"], grads["symplectic"], self.symplectic_lr)
+        update_orthogonal(params["orthogonal"], grads["orthogonal"], self.orthogonal_lr)
+        update_euclidean(params["euclidean"], grads["euclidean"], self.euclidean_lr)
+        return cost
+
+    def _compiled_step(self, cost_fn: Callable, params: Dict[str, List[Trainable]]) -> Callable:
+        r"""Returns the compiled training step of ``cost_fn`` and ``params``.
+
+        The compiled steps are stored per cost function, parameters and learning rates, so that
+        further calls to :meth:`minimize` with the same structure reuse the same trace. Only the
+        ``max_compiled_steps`` most recently used steps are kept, as each of them holds on to its
+        cost function and to the objects it captures.
+        """
+        key = (
+            cost_fn,
+            tuple(math.hash_tensor(p) for kind in params.values() for p in kind),
+            (self.symplectic_lr, self.orthogonal_lr, self.euclidean_lr),
+        )
+        if key in self._compiled_steps:
+            self._compiled_steps.move_to_end(key)
+        else:
+            self._compiled_steps[key] = math.compile_function(lambda: self._step(cost_fn, params))
+            while len(self._compiled_steps) > self.max_compiled_steps:
+                self._compiled_steps.popitem(last=False)
+        return self._compiled_steps[key]
+
     def should_stop(self, max_steps: int) -> bool:
         r"""Returns ``True`` if the optimization should stop (either because the loss is stable or because the maximum number of steps is reached)."""
         if max_steps != 0 and len(self.opt_history) > max_steps:
@@ -108,6 +232,71 @@ class Optimizer:
 # ~~~~~~~~~~~~~~~~~
 
 
+def _trainable_parameters(by_optimizing: Sequence[Trainable]) -> Dict[str, List[Trainable]]:
+    r"""Returns the unique symplectic, orthogonal and euclidean parameters of the given objects."""
+    return {
+        kind: math.unique_tensors(
+            [p for item in by_optimizing for p in item.trainable_parameters[kind]]
+        )
+        for kind in ["symplectic", "orthogonal", "euclidean"]
+    }
+
+
+def _run_restart(
+    cost_fn_factory: Callable,
+    index: int,
+    values: Optional[Dict[str, List[np.ndarray]]],
+    steps: int,
+    lrs: Tuple[float, float, float],
+    compiled: bool,
+) -> Tuple[List[float], Dict[str, List[np.ndarray]]]:
+    r"""Runs ``steps`` steps of a restart of :meth:`Optimizer.minimize_many` from the given
+    parameter values and returns its losses and its final parameter values."""
+    cost_fn, by_optimizing = cost_fn_factory(index)
+    params = _trainable_parameters(by_optimizing)
+    if values is not None:
+        for kind, tensors in params.items():
+            for tensor, value in zip(tensors, values[kind]):
+                math.assign(tensor, value)
+    opt = Optimizer(*lrs)
+    opt._minimize(cost_fn, params, steps, compiled)  # pylint: disable=protected-access
+    losses = [float(math.asnumpy(cost)) for cost in opt.opt_history[1:]]
+    return losses, {kind: [math.asnumpy(t) for t in tensors] for kind, tensors in params.items()}
+
+
+class _SerialExecutor(Executor):
+    r"""Runs the submitted functions in the current process."""
+
+    def submit(self, fn, /, *args, **kwargs):  # pylint: disable=arguments-differ
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:  # pylint: disable=broad-except
+            future.set_exception(e)
+        return future
+
+
+def _init_worker(public_settings: Dict[str, Any], backend: str):
+    r"""Copies the settings of the parent process to a worker process."""
+    for name, value in public_settings.items():
+        setattr(settings, name, value)
+    settings.backend = backend
+
+
+def _restart_pool(workers: Optional[int]) -> Executor:
+    r"""Returns the executor of the restarts of :meth:`Optimizer.minimize_many`."""
+    if workers is not None and workers <= 1:
+        return _SerialExecutor()
+    public_settings = {k: v for k, v in vars(settings).items() if not k.startswith("_")}
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        # TensorFlow is not fork-safe
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(public_settings, settings.backend),
+    )
+
+
 # def new_variable(
 #     value, bounds: Tuple[Optional[float], Optional[float]], name: str, dtype=math.float64
 # ) -> Trainable:
@@ -159,7 +348,6 @@ def new_orthogonal(num_modes: int) -> Tensor:
 def update_symplectic(
     symplectic_params: Sequence[Trainable], symplectic_grads: Sequence[Tensor], symplectic_lr: float
 ):
-
     r"""Updates the symplectic parameters using the given symplectic gradients.
 
     Implemented from:
@@ -199,5 +387,7 @@ def update_orthogonal(
 def update_euclidean(
     euclidean_params: Sequence[Trainable], euclidean_grads: Sequence[Tensor], euclidean_lr: float
 ):
+    if not euclidean_params:
+        return
     math.euclidean_opt.lr = euclidean_lr
     math.euclidean_opt.apply_gradients(zip(euclidean_grads, euclidean_params))
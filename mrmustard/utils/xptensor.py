@@ -15,6 +15,7 @@
 from __future__ import annotations
 from mrmustard.types import *
 from abc import ABC, abstractmethod, abstractproperty
+from functools import cached_property, lru_cache
 from itertools import product
 import numpy as np
 from mrmustard.math import Math
@@ -99,6 +100,16 @@ class XPTensor(ABC):
     def inmodes(self) -> List[int]:
         return self.modes[1]
 
+    @cached_property
+    def _outindex(self) -> Dict[int, int]:
+        r"""The map from the outmodes to their index in the tensor (computed once)."""
+        return {m: i for i, m in enumerate(self.outmodes)}
+
+    @cached_property
+    def _inindex(self) -> Dict[int, int]:
+        r"""The map from the inmodes to their index in the tensor (computed once)."""
+        return {m: i for i, m in enumerate(self.inmodes)}
+
     @property
     def num_modes(self) -> int:
         # TODO: raise warning for coherence blocks?
@@ -278,9 +289,10 @@ class XPTensor(ABC):
                 self.outmodes,
                 other.inmodes,
             )
-        contracted = [i for i in self.inmodes if i in other.outmodes]
-        uncontracted_self = [i for i in self.inmodes if i not in contracted]
-        uncontracted_other = [o for o in other.outmodes if o not in contracted]
+        inindex, outindex = self._inindex, other._outindex
+        contracted = [i for i in self.inmodes if i in outindex]
+        uncontracted_self = [i for i in self.inmodes if i not in outindex]
+        uncontracted_other = [o for o in other.outmodes if o not in inindex]
         if not (
             set(self.outmodes).isdisjoint(uncontracted_other)
             and set(other.inmodes).isdisjoint(uncontracted_self)
@@ -290,12 +302,8 @@ class XPTensor(ABC):
         copied_rows = None
         copied_cols = None
         if len(contracted) > 0:
-            subtensor1 = math.gather(
-                self.tensor, [self.inmodes.index(m) for m in contracted], axis=1
-            )
-            subtensor2 = math.gather(
-                other.tensor, [other.outmodes.index(m) for m in contracted], axis=0
-            )
+            subtensor1 = math.gather(self.tensor, [inindex[m] for m in contracted], axis=1)
+            subtensor2 = math.gather(other.tensor, [outindex[m] for m in contracted], axis=0)
             if other.isMatrix:
                 bulk = math.tensordot(subtensor1, subtensor2, ((1, 3), (0, 2)))
                 bulk = math.transpose(bulk, (0, 2, 1, 3))
@@ -303,11 +311,11 @@ class XPTensor(ABC):
                 bulk = math.tensordot(subtensor1, subtensor2, ((1, 3), (0, 1)))
         if self.like_1 and len(uncontracted_other) > 0:
             copied_rows = math.gather(
-                other.tensor, [other.outmodes.index(m) for m in uncontracted_other], axis=0
+                other.tensor, [outindex[m] for m in uncontracted_other], axis=0
             )
         if other.like_1 and len(uncontracted_self) > 0:
             copied_cols = math.gather(
-                self.tensor, [self.inmodes.index(m) for m in uncontracted_self], axis=1
+                self.tensor, [inindex[m] for m in uncontracted_self], axis=1
             )
         if copied_rows is not None and copied_cols is not None:
             if bulk is None:
@@ -335,18 +343,18 @@ class XPTensor(ABC):
         if other.like_0 and len(contracted) == 0:
             outmodes = uncontracted_other
         if self.like_0:
-            outmodes = [m for m in outmodes if m in self.outmodes]
+            outmodes = [m for m in outmodes if m in self._outindex]
 
         inmodes = uncontracted_self + other.inmodes
         if self.like_0 and len(contracted) == 0:
             inmodes = uncontracted_self
         if other.like_0:
-            inmodes = [m for m in inmodes if m in other.inmodes]
+            inmodes = [m for m in inmodes if m in other._inindex]
 
         if final is not None:
-            final = math.gather(final, [outmodes.index(o) for o in sorted(outmodes)], axis=0)
+            final = _sort_modes(final, outmodes, axis=0)
             if other.isMatrix:
-                final = math.gather(final, [inmodes.index(i) for i in sorted(inmodes)], axis=1)
+                final = _sort_modes(final, inmodes, axis=1)
         return final, (sorted(outmodes), sorted(inmodes))
 
     def _mode_aware_vecvec(self, other: XPVector) -> Scalar:
@@ -418,9 +426,11 @@ class XPTensor(ABC):
                 dtype=self.tensor.dtype,
             )
             to_add = [self, other]
+        outindex = {m: i for i, m in enumerate(outmodes)}
+        inindex = {m: i for i, m in enumerate(inmodes)}
         for t in to_add:
-            outmodes_indices = [outmodes.index(o) for o in t.outmodes]
-            inmodes_indices = [inmodes.index(i) for i in t.inmodes]
+            outmodes_indices = [outindex[o] for o in t.outmodes]
+            inmodes_indices = [inindex[i] for i in t.inmodes]
             if (
                 t.isMatrix
             ):  # e.g. outmodes of to_update are [self]+[other_new] = (e.g.) [9,1,2]+[0,20]
@@ -473,7 +483,7 @@ class XPTensor(ABC):
                 _modes = self.outmodes
             else:
                 raise ValueError(f"Usage: V[1], V[[1,2,3]] or V[:]")
-            rows = [self.outmodes.index(m) for m in modes]
+            rows = [self._outindex[m] for m in modes]
             return XPVector(math.gather(self.tensor, rows, axis=0), modes)
         else:
             _modes = [None, None]
@@ -497,8 +507,8 @@ class XPTensor(ABC):
                         )
             else:
                 raise ValueError(f"Invalid modes: {modes} (tensor has modes {self.modes})")
-            rows = [self.outmodes.index(m) for m in _modes[0]]
-            columns = [self.inmodes.index(m) for m in _modes[1]]
+            rows = [self._outindex[m] for m in _modes[0]]
+            columns = [self._inindex[m] for m in _modes[1]]
             subtensor = math.gather(self.tensor, rows, axis=0)
             subtensor = math.gather(subtensor, columns, axis=1)
             return XPMatrix(
@@ -603,3 +613,252 @@ class XPVector(XPTensor):
 
     def __repr__(self) -> str:
         return f"XPVector(modes={self.outmodes}, tensor_xpxp=\n{self.to_xpxp()})"
+
+
+def _sort_modes(tensor: Tensor, modes: List[int], axis: int) -> Tensor:
+    r"""Reorders the axis ``axis`` of ``tensor``, which runs over ``modes``, by increasing mode."""
+    order = np.argsort(modes, kind="stable")
+    if np.all(order[:-1] < order[1:]):  # already sorted
+        return tensor
+    return math.gather(tensor, order, axis=axis)
+
+
+####################################################################################################
+# Fused products of chains of Gaussian channels
+####################################################################################################
+
+
+def compose_XYd(
+    channels: Sequence[Tuple[Optional[Matrix], Optional[Matrix], Optional[Vector], List[int]]],
+    modes: Optional[List[int]] = None,
+    differentiable: bool = True,
+) -> Tuple[Optional[Matrix], Optional[Matrix], Optional[Vector]]:
+    r"""Returns the ``(X, Y, d)`` triple of a chain of Gaussian channels applied one after another.
+
+    The result is the same as accumulating the channels one at a time as ``XPMatrix`` and
+    ``XPVector`` products (``X = X_i @ X``, ``Y = X_i @ Y @ X_i.T + Y_i``, ``d = X_i @ d + d_i``),
+    but the chain is fused: the channels are scheduled in layers of channels acting on disjoint
+    modes, the blocks of each layer are stored block-sparsely (only the non-identity blocks of its
+    channels), and each layer only updates the rows (and the columns of ``Y``) of its modes. The
+    schedule and all the index maps only depend on the modes of the channels, so they are computed
+    once per structure of the chain.
+
+    If the result does not need to be differentiable (and the values are concrete), the chain is
+    accumulated in place in NumPy arrays, with one vectorized update per layer and size of
+    channel, which avoids the overhead of a backend op per channel and of copying the matrices at
+    every update.
+
+    Args:
+        channels (Sequence): the ``(X, Y, d, modes)`` of each channel, with ``X``, ``Y`` and ``d``
+            in ``xxpp`` ordering on its modes (or ``None``). A ``2 x 2`` matrix or a vector of
+            length 2 on more than one mode is applied to each mode. ``Y`` must be symmetric.
+        modes (optional, List[int]): the modes of the result. If ``None``, the result is defined
+            on the modes where the chain acts as a non-trivial ``X``, ``Y`` or ``d``, like the
+            products of ``XPTensor`` objects, and ``X``, ``Y`` or ``d`` is ``None`` if it is
+            trivial on all the modes.
+        differentiable (bool): whether the result must be differentiable with respect to the
+            ``X``, ``Y`` and ``d`` of the channels
+
+    Returns:
+        Tuple[Matrix, Matrix, Vector]: the ``X``, ``Y`` and ``d`` of the chain in ``xxpp`` ordering,
+        with the modes in increasing order
+    """
+    channels = [_broadcast_channel(*channel) for channel in channels]
+    key = tuple(
+        (tuple(channel_modes), X is not None, Y is not None, d is not None)
+        for X, Y, d, channel_modes in channels
+    )
+    schedule = _ChainSchedule.get(key, None if modes is None else tuple(modes))
+    if differentiable or not math.executing_eagerly():
+        X, Y, d = _compose_tensors(channels, schedule)
+    else:
+        X, Y, d = (math.astensor(t) for t in _compose_numpy(channels, schedule))
+    return (
+        schedule.restrict(X, schedule.X_rows),
+        schedule.restrict(Y, schedule.Y_rows),
+        schedule.restrict(d, schedule.d_rows),
+    )
+
+
+def _compose_tensors(channels: List[tuple], schedule: _ChainSchedule) -> Tuple[Matrix, ...]:
+    r"""Returns the ``(X, Y, d)`` of a chain on all the modes of its schedule, computed with
+    differentiable backend ops."""
+    tensors = [t for channel in channels for t in channel[:3] if t is not None]
+    dtype = tensors[0].dtype if tensors else "float64"
+    size = 2 * len(schedule.modes)
+    X, Y, d = math.eye(size, dtype=dtype), math.zeros((size, size), dtype), math.zeros(size, dtype)
+    for layer in schedule.layers:
+        rows = layer.rows
+        if layer.X_indices is not None:
+            values = [
+                math.reshape(channels[i][0], [-1])
+                if channels[i][0] is not None
+                else math.reshape(math.eye(2 * len(channels[i][3]), dtype=dtype), [-1])
+                for i in layer.channels
+            ]
+            L = math.update_tensor(
+                math.zeros((len(rows), len(rows)), dtype), layer.X_indices, math.concat(values, 0)
+            )
+            X = math.update_tensor(X, rows[:, None], math.matmul(L, math.gather(X, rows, axis=0)))
+            d = math.update_tensor(d, rows[:, None], math.matvec(L, math.gather(d, rows, axis=0)))
+            # the rows of L @ Y @ L^T are those of L @ Y with the columns of the layer's modes
+            # multiplied by L^T, and the columns follow by symmetry (the columns are updated as
+            # the rows of the transposed matrices, R is the transpose of these rows)
+            R = math.transpose(math.matmul(L, math.gather(Y, rows, axis=0)))
+            R = math.update_tensor(R, rows[:, None], math.matmul(L, math.gather(R, rows, axis=0)))
+            Y = math.transpose(math.update_tensor(Y, rows[:, None], math.transpose(R)))
+            Y = math.update_tensor(Y, rows[:, None], math.transpose(R))
+        if layer.Y_indices is not None:
+            values = [math.reshape(channels[i][1], [-1]) for i in layer.Y_channels]
+            Y = math.update_add_tensor(Y, layer.Y_indices, math.concat(values, 0))
+        if layer.d_indices is not None:
+            values = [channels[i][2] for i in layer.d_channels]
+            d = math.update_add_tensor(d, layer.d_indices, math.concat(values, 0))
+    return X, Y, d
+
+
+def _compose_numpy(channels: List[tuple], schedule: _ChainSchedule) -> Tuple[np.ndarray, ...]:
+    r"""Returns the ``(X, Y, d)`` of a chain on all the modes of its schedule, accumulated in
+    place in NumPy arrays."""
+    channels = [
+        tuple(None if t is None else np.asarray(math.asnumpy(t)) for t in channel[:3])
+        for channel in channels
+    ]
+    arrays = [t for channel in channels for t in channel if t is not None]
+    dtype = np.result_type(*arrays) if arrays else np.float64
+    size = 2 * len(schedule.modes)
+    X, Y, d = np.eye(size, dtype=dtype), np.zeros((size, size), dtype), np.zeros(size, dtype)
+    for layer in schedule.layers:
+        for indices, rows in layer.X_groups:
+            S = np.stack([channels[i][0] for i in indices])
+            X[rows] = np.einsum("gij,gjk->gik", S, X[rows])
+            d[rows] = np.einsum("gij,gj->gi", S, d[rows])
+            Y[rows] = np.einsum("gij,gjk->gik", S, Y[rows])
+            Y[:, rows] = np.einsum("agj,gij->agi", Y[:, rows], S)
+        if layer.Y_indices is not None:
+            values = np.concatenate([channels[i][1].ravel() for i in layer.Y_channels])
+            Y[layer.Y_indices[:, 0], layer.Y_indices[:, 1]] += values
+        if layer.d_indices is not None:
+            values = np.concatenate([channels[i][2] for i in layer.d_channels])
+            d[layer.d_indices[:, 0]] += values
+    return X, Y, d
+
+
+def _broadcast_channel(X, Y, d, modes: List[int]) -> tuple:
+    r"""Expands the ``2 x 2`` matrices and the vectors of length 2 of a channel on more than one
+    mode to a copy on each mode."""
+    modes = list(modes)
+    if len(modes) > 1:
+        if X is not None and X.shape[-1] == 2:
+            X = XPMatrix.from_xxpp(X, like_1=True).clone(len(modes), (modes, modes)).to_xxpp()
+        if Y is not None and Y.shape[-1] == 2:
+            Y = XPMatrix.from_xxpp(Y, like_0=True).clone(len(modes), (modes, modes)).to_xxpp()
+        if d is not None and d.shape[-1] == 2:
+            d = math.reshape(math.tile(math.reshape(d, (2, 1)), (1, len(modes))), [-1])
+    return X, Y, d, modes
+
+
+class _ChainSchedule:
+    r"""The layers of a chain of channels and the index maps of their updates, which only depend
+    on the modes of the channels (and on which of their ``X``, ``Y`` and ``d`` are defined)."""
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def get(key: tuple, modes: Optional[tuple]) -> _ChainSchedule:
+        r"""Returns the (cached) schedule of a chain with the given structure."""
+        return _ChainSchedule(key, modes)
+
+    def __init__(self, key: tuple, modes: Optional[tuple]):
+        all_modes = {m for channel_modes, *_ in key for m in channel_modes}
+        self.modes = sorted(all_modes.union(modes or ()))
+        self.index = {m: i for i, m in enumerate(self.modes)}
+
+        # the modes on which X, Y and d are non-trivial (as in the products of XPTensors)
+        X_modes, Y_modes, d_modes = set(), set(), set()
+        for channel_modes, has_X, has_Y, has_d in key:
+            channel_modes = set(channel_modes)
+            if has_X:
+                X_modes |= channel_modes
+                Y_modes |= channel_modes if Y_modes & channel_modes else set()
+                d_modes |= channel_modes if d_modes & channel_modes else set()
+            Y_modes |= channel_modes if has_Y else set()
+            d_modes |= channel_modes if has_d else set()
+        if modes is not None:
+            X_modes = Y_modes = d_modes = set(modes)
+        self.X_rows, self.Y_rows, self.d_rows = (self._rows(m) for m in (X_modes, Y_modes, d_modes))
+
+        # as soon as possible scheduling: each channel goes in the layer after the last one that
+        # acts on one of its modes, so that the channels of a layer commute
+        depth = {}
+        layers = []
+        for i, (channel_modes, *_) in enumerate(key):
+            level = max((depth.get(m, -1) for m in channel_modes), default=-1) + 1
+            depth.update((m, level) for m in channel_modes)
+            if level == len(layers):
+                layers.append([])
+            layers[level].append(i)
+        self.layers = [_Layer(self, [(i,) + key[i] for i in layer]) for layer in layers]
+
+    def _rows(self, modes) -> Optional[np.ndarray]:
+        r"""The ``xxpp`` indices of the given modes, or ``None`` if there are none."""
+        if not modes:
+            return None
+        indices = [self.index[m] for m in sorted(modes)]
+        return np.array(indices + [len(self.modes) + i for i in indices])
+
+    def restrict(self, tensor: Tensor, rows: Optional[np.ndarray]) -> Optional[Tensor]:
+        r"""Returns the restriction of a matrix or vector on all the modes to the given rows."""
+        if rows is None:
+            return None
+        if len(rows) == 2 * len(self.modes):
+            return tensor
+        tensor = math.gather(tensor, rows, axis=0)
+        return math.gather(tensor, rows, axis=1) if len(tensor.shape) == 2 else tensor
+
+
+class _Layer:
+    r"""The index maps of a layer of channels acting on disjoint modes."""
+
+    def __init__(self, schedule: _ChainSchedule, channels: List[tuple]):
+        M = len(schedule.modes)
+        modes = [m for _, channel_modes, *_ in channels for m in channel_modes]
+        # the local xxpp index of the x and p quadratures of each mode of each channel
+        local, offset = [], 0
+        for _, channel_modes, *_ in channels:
+            n = len(channel_modes)
+            local.append(np.r_[offset : offset + n, len(modes) + offset : len(modes) + offset + n])
+            offset += n
+        global_ = np.array([schedule.index[m] for m in modes])
+        self.rows = np.concatenate([global_, global_ + M])
+        self.channels = [i for i, *_ in channels]
+
+        self.X_indices = None
+        if any(has_X for _, _, has_X, _, _ in channels):
+            self.X_indices = np.concatenate([_pairs(l, l) for l in local])
+
+        # the channels with an X and their rows, grouped by size (for the in-place updates)
+        groups = {}
+        for l, (i, channel_modes, has_X, _, _) in zip(local, channels):
+            if has_X:
+                groups.setdefault(len(channel_modes), []).append((i, self.rows[l]))
+        self.X_groups = [
+            ([i for i, _ in group], np.stack([rows for _, rows in group]))
+            for group in groups.values()
+        ]
+
+        self.Y_channels = [i for i, _, _, has_Y, _ in channels if has_Y]
+        self.Y_indices = None
+        if self.Y_channels:
+            rows = [self.rows[l] for l, (_, _, _, has_Y, _) in zip(local, channels) if has_Y]
+            self.Y_indices = np.concatenate([_pairs(r, r) for r in rows])
+
+        self.d_channels = [i for i, _, _, _, has_d in channels if has_d]
+        self.d_indices = None
+        if self.d_channels:
+            rows = [self.rows[l] for l, (*_, has_d) in zip(local, channels) if has_d]
+            self.d_indices = np.concatenate(rows)[:, None]
+
+
+def _pairs(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    r"""The ``(row, column)`` indices of all the entries of a block, in row-major order."""
+    return np.stack(np.meshgrid(rows, columns, indexing="ij"), axis=-1).reshape(-1, 2)
@@ -0,0 +1,96 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from hypothesis import given, strategies as st
+
+from mrmustard.lab.abstract import State
+from mrmustard.lab.states import Coherent, SqueezedVacuum, Vacuum
+from mrmustard.lab.gates import Attenuator, BSgate, Dgate, Sgate
+from mrmustard.physics import gaussian, fidelity, von_neumann_entropy
+from mrmustard import settings
+
+
+def batch_of(states):
+    return State(cov=np.stack([s.cov for s in states]), means=np.stack([s.means for s in states]))
+
+
+def single_mode_states(size):
+    return [SqueezedVacuum(r=0.1 * k, phi=0.3) >> Dgate(x=0.1 * k, y=-0.2) for k in range(size)]
+
+
+@given(size=st.integers(1, 5))
+def test_batched_transformation_matches_single_states(size):
+    """Tests that a channel acts on each state of the batch as on the individual states"""
+    states = [s & Vacuum(1) for s in single_mode_states(size)]
+    circuit = BSgate(theta=0.4, phi=0.2) >> Attenuator([0.7], modes=[1])
+    batch = batch_of(states) >> circuit
+    assert batch.batch_size == size
+    assert np.allclose(batch.cov, np.stack([(s >> circuit).cov for s in states]))
+    assert np.allclose(batch.means, np.stack([(s >> circuit).means for s in states]))
+    assert np.allclose(batch.number_means, np.stack([(s >> circuit).number_means for s in states]))
+    assert np.allclose(batch.purity, np.stack([(s >> circuit).purity for s in states]))
+
+
+def test_batched_fock_representation():
+    """Tests the Fock representation of pure and mixed batches"""
+    states = single_mode_states(3)
+    ket = batch_of(states).ket(cutoffs=[5])
+    assert ket.shape == (3, 5)
+    assert np.allclose(ket, np.stack([s.ket(cutoffs=[5]) for s in states]))
+    mixed = [s >> Attenuator([0.6]) for s in states]
+    dm = batch_of(mixed).dm(cutoffs=[4])
+    assert dm.shape == (3, 4, 4)
+    assert np.allclose(dm, np.stack([s.dm(cutoffs=[4]) for s in mixed]))
+
+
+def test_batched_general_dyne_and_fidelity():
+    """Tests general-dyne measurements and fidelities of a batch of states"""
+    states = [(s & Vacuum(1)) >> BSgate(theta=0.5) for s in single_mode_states(4)]
+    batch = batch_of(states)
+    proj = Coherent(x=0.2, y=0.1)
+    prob, cov, means = gaussian.general_dyne(
+        batch.cov, batch.means, proj.cov, proj.means, [1], settings.HBAR
+    )
+    for k, state in enumerate(states):
+        p, c, m = gaussian.general_dyne(
+            state.cov, state.means, proj.cov, proj.means, [1], settings.HBAR
+        )
+        assert np.allclose(prob[k], p) and np.allclose(cov[k], c) and np.allclose(means[k], m)
+    target = states[0]
+    fids = gaussian.fidelity(batch.means, batch.cov, target.means, target.cov, settings.HBAR)
+    assert np.allclose(fids, [fidelity(s, target) for s in states])
+
+
+def test_batched_williamson_decomposition_is_cached():
+    """Tests that the symplectic eigenvalues, purity and entropy of a batch are those of its states
+    and that the Williamson decomposition is computed once"""
+    states = [s >> Attenuator([0.3 + 0.2 * k]) for k, s in enumerate(single_mode_states(3))]
+    batch = batch_of(states)
+    assert batch.williamson is batch.williamson
+    assert batch.symplectic_eigenvalues.shape == (3, 1)
+    assert np.allclose(batch.symplectic_eigenvalues, [s.symplectic_eigenvalues for s in states])
+    assert np.allclose(batch.purity, [s.purity for s in states])
+    assert np.allclose(von_neumann_entropy(batch), [von_neumann_entropy(s) for s in states])
+    assert batch.is_mixed and not batch_of(single_mode_states(3)).is_mixed
+
+
+def test_batched_marginal_probabilities():
+    """Tests that the marginal probabilities of a batch keep the batch axis first"""
+    states = [(s & Vacuum(1)) >> BSgate(theta=0.5) for s in single_mode_states(3)]
+    states = [s >> Attenuator([0.9, 0.8]) for s in states]
+    probs = batch_of(states).marginal_probabilities([1, 0], [4, 3])
+    assert probs.shape == (3, 4, 3)
+    for k, state in enumerate(states):
+        assert np.allclose(probs[k], state.marginal_probabilities([1, 0], [4, 3]))
@@ -14,9 +14,102 @@
 
 import numpy as np
 import pytest
+import tensorflow as tf
 from hypothesis import given, strategies as st, assume
 from hypothesis.extra.numpy import arrays
 from mrmustard.physics import gaussian
 from mrmustard.lab import *
 from mrmustard import settings
 from tests import random
+
+
+def test_compile_fuses_gaussian_ops():
+    """Tests that a run of Gaussian ops is fused into a single op and that the flag is set"""
+    circ = Circuit([Sgate(r=[0.1, 0.2]), BSgate(theta=0.4), Dgate(x=[0.1, 0.2])])
+    assert not circ._compiled
+    circ.compile()
+    assert circ._compiled
+    assert len(circ._compiled_ops) == 1
+    assert isinstance(circ._compiled_ops[0], FusedGaussian)
+
+
+def test_fused_gaussian_matches_sequential_gaussian():
+    """Tests that the fused channel acts on Gaussian states as the sequence of its ops"""
+    state = Coherent(x=[0.1, 0.3], y=[0.2, 0.1]) >> Sgate(r=[0.2, 0.1])
+    ops = [
+        Sgate(r=[0.1, 0.2], phi=[0.3, 0.1]),
+        BSgate(theta=0.4, phi=0.2),
+        Attenuator([0.8, 0.9]),
+        Dgate(x=0.3, modes=[1]),
+        Sgate(r=0.2, modes=[0]),
+    ]
+    sequential = state
+    for op in ops:
+        sequential = sequential >> op
+    fused = state >> FusedGaussian(ops)
+    assert np.allclose(fused.cov, sequential.cov)
+    assert np.allclose(fused.means, sequential.means)
+
+
+def test_compiled_circuit_on_fock_state():
+    """Tests that the compiled circuit acts on a Fock state as the sequence of its ops"""
+    state = Fock([1, 2], cutoffs=[20, 20])
+    ops = [
+        Sgate(r=[0.1, 0.2], phi=[0.3, 0.1]),
+        BSgate(theta=0.4, phi=0.2),
+        Dgate(x=[0.1, 0.0], y=[0.2, 0.1]),
+        Rgate(angle=[0.3, 0.4]),
+    ]
+    sequential = state
+    for op in ops:
+        sequential = sequential >> op
+    circ = Circuit(ops)
+    out = state >> circ
+    assert circ._compiled
+    assert np.allclose(out.ket([5, 5]), sequential.ket([5, 5]), atol=1e-6)
+
+
+def test_compiled_circuit_with_loss_on_fock_state():
+    """Tests the compiled circuit with a non-unitary channel"""
+    state = Fock([1], cutoffs=[12])
+    ops = [Sgate(r=0.2), Attenuator([0.7]), Dgate(x=0.1)]
+    sequential = state
+    for op in ops:
+        sequential = sequential >> op
+    out = state >> Circuit(ops)
+    assert np.allclose(out.dm([4]), sequential.dm([4]), atol=1e-4)
+
+
+def test_circuit_XYd_matches_sequential_gaussian():
+    """Tests that the (X, Y, d) of a circuit with noise and displacements before gates on
+    overlapping modes acts on Gaussian states as the sequence of its ops"""
+    state = Coherent(x=[0.1, 0.3, 0.2], y=[0.2, 0.1, 0.0]) >> Sgate(r=[0.2, 0.1, 0.3])
+    ops = [
+        Attenuator([0.8], modes=[0]),
+        Dgate(x=0.2, y=0.1, modes=[1, 2]),
+        BSgate(theta=0.4, phi=0.2)[0, 1],
+        Rgate(angle=0.3, modes=[2]),
+        BSgate(theta=0.3)[2, 0],
+        Sgate(r=[0.1, 0.2, 0.3]),
+    ]
+    sequential = state
+    for op in ops:
+        sequential = sequential >> op
+    X, Y, d = Circuit(ops).XYd
+    cov, means = gaussian.CPTP(state.cov, state.means, X, Y, d, [0, 1, 2], [0, 1, 2])
+    assert np.allclose(cov, sequential.cov)
+    assert np.allclose(means, sequential.means)
+
+
+def test_trainable_circuit_XYd_is_differentiable():
+    """Tests that the (X, Y, d) of a circuit with trainable gates is differentiable and that it
+    is the same as without trainable gates"""
+    BS = BSgate(theta=0.4, phi=0.2, theta_trainable=True)[0, 1]
+    ops = [Sgate(r=[0.1, 0.2]), BS, Attenuator([0.9, 0.8])]
+    with tf.GradientTape() as tape:
+        X, Y, d = Circuit(ops).XYd
+        cost = tf.reduce_sum(X) + tf.reduce_sum(Y)
+    assert tape.gradient(cost, BS.theta) is not None
+    ops[1] = BSgate(theta=0.4, phi=0.2)[0, 1]
+    for fused, expected in zip(Circuit(ops).XYd[:2], [X, Y]):
+        assert np.allclose(fused, expected)
@@ -17,12 +17,14 @@ from hypothesis.extra.numpy import arrays
 from mrmustard.math import Math
 
 math = Math()
+import tracemalloc
 import numpy as np
 import tensorflow as tf
 from scipy.stats import poisson
 
 from mrmustard.lab import *
 from mrmustard.utils.training import Optimizer
+from mrmustard.utils.cache import fock_cache
 from mrmustard.physics import gaussian
 from mrmustard import physics
 from mrmustard import settings
@@ -267,3 +269,134 @@ def test_norm_2mode_normalized():
 def test_norm_2mode_gaussian_normalized():
     leftover = Coherent(x=[2.0, 2.0]) << Coherent(x=1.0, normalize=True)[0]
     assert np.isclose(1.0, physics.norm(leftover), atol=1e-5)
+
+
+def test_pnr_on_pure_state_matches_density_matrix():
+    """Tests that the ket path of FockMeasurement.primal agrees with the density matrix path"""
+    circ = Sgate([0.3, 0.2, 0.4]) >> BSgate(0.5)[0, 1] >> BSgate(0.3)[1, 2]
+    ket = (Vacuum(3) >> circ).ket([5, 5, 5])
+    detectors = [
+        PNRDetector(efficiency=[0.8, 0.7], dark_counts=[0.01, 0.02], modes=[0, 2]),
+        ThresholdDetector(efficiency=0.9, modes=[1]),
+        PNRDetector(efficiency=[0.8, 0.9, 0.7], modes=[0, 1, 2]),
+    ]
+    for detector in detectors:
+        from_ket = detector.primal(State(ket=ket))
+        from_dm = detector.primal(State(dm=physics.fock.ket_to_dm(ket)))
+        assert np.allclose(from_ket, from_dm)
+
+
+@given(angle=st.floats(0, np.pi), x=st.floats(-1, 1), y=st.floats(-1, 1))
+def test_homodyne_samples_of_coherent_state(angle, x, y):
+    """Tests the mean and variance of the homodyne outcomes of a coherent state"""
+    results, conditional = Homodyne(angle)[0].sample(Coherent(x=[x], y=[y]), 5000, seed=1)
+    assert results.shape == (5000, 1) and conditional is None
+    assert np.isclose(results.mean(), x * np.cos(angle) + y * np.sin(angle), atol=0.03)
+    assert np.isclose(results.var(), 0.25, rtol=0.08)
+
+
+def test_homodyne_samples_of_fock_state_match_gaussian_samples():
+    """Tests that the homodyne outcomes of a state in Fock representation have the distribution
+    of those of the same Gaussian state"""
+    state = SqueezedVacuum(r=[0.4], phi=[0.3]) >> Dgate([0.5], [-0.2])
+    gaussian_results, _ = Homodyne(0.6)[0].sample(state, 4000, seed=2)
+    fock_results, _ = Homodyne(0.6)[0].sample(State(dm=state.dm([30])), 4000, seed=3)
+    assert np.isclose(gaussian_results.mean(), fock_results.mean(), atol=0.03)
+    assert np.isclose(gaussian_results.var(), fock_results.var(), rtol=0.1)
+
+
+def test_conditional_states_of_homodyne_samples():
+    """Tests that the conditional states are the normalized projections onto the outcomes, for
+    Gaussian states and states in Fock representation"""
+    state = TMSV(r=0.5) >> Sgate([0.0, 0.3]) >> Dgate([0.2, 0.0])
+    results, conditional = Homodyne(0.7)[0].sample(state, 4, seed=3)
+    assert conditional.batch_size == 4 and conditional.modes == [1]
+    fock_results, fock_conditional = Homodyne(0.7)[0].sample(State(ket=state.ket([25, 25])), 4, 3)
+    for k in range(4):
+        expected = state << Homodyne(0.7, result=results[k, 0])[0]
+        assert np.allclose(expected.means, conditional.means[k])
+        assert np.allclose(expected.cov, conditional.cov[k])
+        expected = state << Homodyne(0.7, result=fock_results[k, 0])[0]
+        ket = State(cov=expected.cov, means=expected.means).ket([25])
+        assert np.isclose(np.abs(np.vdot(ket, fock_conditional[k].ket())), 1.0)
+
+
+def test_conditional_states_of_heterodyne_samples():
+    """Tests the heterodyne outcomes of a state and its conditional states"""
+    state = TMSV(r=0.5) >> Dgate([0.3, 0.0], [0.1, 0.0])
+    alphas, conditional = Heterodyne()[0].sample(state, 4000, seed=4)
+    assert np.isclose(alphas.mean(), 0.3 + 0.1j, atol=0.04)
+    assert np.isclose(alphas.real.var(), (np.cosh(1.0) + 1) / 4, rtol=0.08)
+    fock_alphas, fock_conditional = Heterodyne()[0].sample(State(dm=state.dm([20, 20])), 3, 5)
+    for k in range(3):
+        expected = state << Heterodyne(alphas[k, 0].real, alphas[k, 0].imag)[0]
+        assert np.allclose(expected.means, conditional.means[k])
+        expected = state << Heterodyne(fock_alphas[k, 0].real, fock_alphas[k, 0].imag)[0]
+        dm = State(cov=expected.cov, means=expected.means).dm([20])
+        assert np.isclose(np.real(np.trace(dm @ fock_conditional[k].dm())), 1.0)
+
+
+def test_dyne_samples_of_many_shots_in_fock_representation():
+    """Tests the homodyne and heterodyne outcomes of many shots of a state in Fock representation,
+    whose memory must not grow with the number of shots times the size of the grid"""
+    ket = np.array(SqueezedVacuum(r=[0.3, 0.2]).ket([30, 30]))
+    tracemalloc.start()
+    x, _ = physics.sampling.fock_homodyne(ket, False, [0, 1], [0.0, np.pi / 2], 20000, seed=1)
+    alphas, _ = physics.sampling.fock_heterodyne(ket, False, [0], 4000, seed=2)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 100e6
+    assert np.allclose(x.var(axis=0), settings.HBAR / 2 * np.exp([-0.6, 0.4]), rtol=0.05)
+    assert np.isclose(alphas.real.var(), (np.exp(-0.6) + 1) / 4, rtol=0.08)
+
+
+def test_dyne_samples_are_reproducible():
+    """Tests that the same seed gives the same outcomes"""
+    state = TMSV(r=0.5)
+    for detector in [Homodyne(0.3)[1], Heterodyne()[0]]:
+        assert np.all(detector.sample(state, 10, 7)[0] == detector.sample(state, 10, 7)[0])
+
+
+def test_detector_channels_are_cached_and_shared():
+    """Tests that the modes and the detectors with the same parameters share their stochastic
+    channel, and that the channel of a state in Fock representation matches its cutoffs"""
+    fock_cache.clear()
+    detector = PNRDetector(efficiency=[0.8, 0.8], dark_counts=0.01, modes=[0, 1])
+    assert detector._internal_stochastic_channel[0] is detector._internal_stochastic_channel[1]
+    other = PNRDetector(efficiency=0.8, dark_counts=0.01, modes=[2])
+    assert other._internal_stochastic_channel[0] is detector._internal_stochastic_channel[0]
+    state = State(dm=(TMSV(r=0.5) >> Attenuator([0.9, 0.9])).dm([10, 10]))
+    probs = detector.primal(state)
+    assert detector._internal_stochastic_channel[0].shape == (settings.PNR_INTERNAL_CUTOFF, 10)
+    gaussian_probs = detector.primal(TMSV(r=0.5) >> Attenuator([0.9, 0.9]))
+    assert np.allclose(probs[:8, :8], gaussian_probs[:8, :8], atol=1e-4)
+
+
+def test_trainable_detector_channel_is_differentiable_after_eager_call():
+    """Tests that the channel of a trainable detector is differentiable under a gradient tape
+    after an eager evaluation of the detector"""
+    detector = PNRDetector(efficiency=np.array([0.8]), efficiency_trainable=True, modes=[0])
+    state = Coherent(x=0.5)
+    detector.primal(state)
+    with tf.GradientTape() as tape:
+        cost = detector.primal(state)[1]
+    assert tape.gradient(cost, detector.efficiency) is not None
+
+
+def test_pattern_probabilities_match_primal():
+    """Tests the pattern probabilities of the detectors against the probabilities of primal
+    (without the dark counts of the threshold detector, which primal models differently) and that
+    the patterns follow the order of the modes"""
+    state = Vacuum(2) >> Sgate([0.3, 0.4]) >> BSgate(0.5)[0, 1] >> Dgate([0.1, -0.2])
+    state = state >> Attenuator([0.9, 0.95])
+    pnr = PNRDetector(efficiency=[0.8, 0.7], dark_counts=[0.01, 0.02], modes=[0, 1])
+    threshold = ThresholdDetector(efficiency=[0.9, 0.85], modes=[0, 1])
+    patterns = np.array([[0, 0], [1, 0], [2, 1], [0, 3]])
+    for detector, patterns in [(pnr, patterns), (threshold, np.minimum(patterns, 1))]:
+        expected = np.array(detector.primal(state))[patterns[:, 0], patterns[:, 1]]
+        assert np.allclose(detector.pattern_probabilities(state, patterns), expected)
+    swapped = PNRDetector(efficiency=[0.7, 0.8], dark_counts=[0.02, 0.01], modes=[1, 0])
+    assert np.allclose(
+        swapped.pattern_probabilities(state, patterns[:, ::-1]),
+        pnr.pattern_probabilities(state, patterns),
+    )
@@ -0,0 +1,96 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from mrmustard.lab import Circuit, GaussianEngine, gaussian_engine
+from mrmustard.lab.abstract import State
+from mrmustard.lab.gates import (
+    Attenuator,
+    BSgate,
+    CXgate,
+    CZgate,
+    Dgate,
+    Interferometer,
+    MZgate,
+    Rgate,
+    S2gate,
+    Sgate,
+)
+from mrmustard.lab.states import Coherent, Fock, SqueezedVacuum, Thermal
+
+
+def mixed_circuit():
+    np.random.seed(0)
+    return [
+        Sgate([0.3, 0.1, 0.2, 0.4, 0.5], [0.1, 0.2, 0.3, 0.4, 0.5]),
+        BSgate(0.4, 0.2)[0, 1],
+        MZgate(0.3, 0.7, internal=True)[3, 1],
+        MZgate(0.2, 0.5)[2, 4],
+        S2gate(0.2, 0.3)[4, 0],
+        CXgate(0.5)[1, 2],
+        CZgate(0.3)[3, 4],
+        BSgate(0.7, 0.1)[2, 3],
+        Dgate([0.2], [0.1], modes=[3]),
+        Attenuator([0.9, 0.8], modes=[2, 0]),
+        Rgate(0.3, modes=[1]),
+        Interferometer(5),
+        BSgate(0.1)[4, 2],
+    ]
+
+
+@pytest.mark.parametrize("numba", [True, False])
+def test_engine_agrees_with_the_circuit(monkeypatch, numba):
+    """Tests that the engine computes the same state as applying the ops one by one, with and
+    without the Numba kernel"""
+    if numba and not gaussian_engine.NUMBA_AVAILABLE:
+        pytest.skip("requires numba")
+    monkeypatch.setattr(gaussian_engine, "NUMBA_AVAILABLE", numba)
+    state = Thermal(nbar=[0.1, 0.2, 0.3, 0.4, 0.5]) >> Dgate([0.1] * 5, [0.2] * 5)
+    ops = mixed_circuit()
+    expected = state >> Circuit(ops)
+    result = GaussianEngine.from_state(state).apply(ops).state
+    assert np.allclose(result.cov, expected.cov)
+    assert np.allclose(result.means, expected.means)
+
+
+def test_engine_on_a_subset_of_modes():
+    """Tests the engine on a state whose modes are not 0, ..., N-1 and on nested circuits"""
+    coherent = Coherent(x=[0.1, 0.2, 0.3], y=[0.3, 0.2, 0.1])
+    state = State(cov=coherent.cov, means=coherent.means, modes=[5, 2, 7])
+    ops = [BSgate(0.3, 0.4)[7, 5], Circuit([Sgate(0.2, modes=[2]), CXgate(0.4)[2, 7]])]
+    expected = state >> ops[0] >> ops[1]
+    result = GaussianEngine.from_state(state).apply(ops).state
+    assert result.modes == [5, 2, 7]
+    assert np.allclose(result.cov, expected.cov)
+    assert np.allclose(result.means, expected.means)
+
+
+def test_engine_scales_to_many_modes():
+    """Tests a brickwork circuit of beam splitters on many modes against the dense symplectic"""
+    num_modes = 200
+    state = SqueezedVacuum([0.2] * num_modes)
+    ops = [BSgate(0.3 + 0.01 * m, 0.1)[m, m + 1] for m in range(0, num_modes - 1, 2)]
+    ops += [BSgate(0.2, 0.5 - 0.01 * m)[m, m + 1] for m in range(1, num_modes - 1, 2)]
+    engine = GaussianEngine.from_state(state).apply(ops)
+    S = Circuit(ops).XYd[0]
+    assert np.allclose(engine.cov, S @ np.array(state.cov) @ np.transpose(S))
+    assert np.allclose(engine.means, 0.0)
+
+
+def test_engine_rejects_non_gaussian_states():
+    """Tests that the engine only accepts Gaussian states"""
+    with pytest.raises(ValueError):
+        GaussianEngine.from_state(Fock([1]))
@@ -14,11 +14,13 @@
 
 import numpy as np
 import pytest
+import tensorflow as tf
 from hypothesis import given, strategies as st, assume
 from hypothesis.extra.numpy import arrays
 from mrmustard.physics import gaussian as gp
 from mrmustard.lab.states import *
 from mrmustard.lab.gates import *
+from mrmustard.lab.abstract import State
 from mrmustard import settings
 from tests import random
 
@@ -175,3 +177,94 @@ def test_random_state_is_entangled():
     assert N1 > 0
     assert N2 > 0
     assert np.allclose(N1, N2)
+
+
+def test_ket_is_extended_incrementally():
+    """Tests that the ket of a Gaussian state is extended to larger cutoffs and sliced for smaller
+    ones, agreeing with the ket computed from scratch"""
+    state = SqueezedVacuum(r=[0.5, 0.3], phi=[0.1, 0.2]) >> BSgate(0.4) >> Dgate([0.3, 0.1])
+    for cutoffs in ([5, 5], [8, 6], [4, 9], [3, 3]):
+        fresh = SqueezedVacuum(r=[0.5, 0.3], phi=[0.1, 0.2]) >> BSgate(0.4) >> Dgate([0.3, 0.1])
+        ket = state.ket(cutoffs)
+        assert list(ket.shape) == cutoffs
+        assert np.allclose(ket, fresh.ket(cutoffs))
+    assert state.cutoffs == [3, 3]  # the cutoffs of the last call, not of the largest tensor
+    assert list(state._gaussian_fock_cache[1].shape) == [8, 9]
+
+
+def test_dm_is_extended_incrementally():
+    """Tests that the density matrix of a mixed Gaussian state is extended to larger cutoffs and
+    sliced for smaller ones, agreeing with the one computed from scratch"""
+    state = SqueezedVacuum(r=0.5) >> Attenuator([0.6])
+    for cutoffs in ([5], [10], [3]):
+        dm = state.dm(cutoffs)
+        assert np.allclose(dm, (SqueezedVacuum(r=0.5) >> Attenuator([0.6])).dm(cutoffs))
+    assert list(state._gaussian_fock_cache[1].shape) == [10, 10]
+
+
+def test_ket_follows_trainable_parameters():
+    """Tests that the ket of a state with trainable parameters follows the updates of its
+    parameters and is differentiable under successive gradient tapes"""
+    state = Coherent(x=[0.3], y=[0.1], x_trainable=True)
+    state.ket([4])
+    state.x.assign([0.5])
+    assert np.allclose(state.ket([6]), Coherent(x=[0.5], y=[0.1]).ket([6]))
+    for _ in range(2):
+        with tf.GradientTape() as tape:
+            cost = tf.abs(state.ket([6])[1]) ** 2
+        assert tape.gradient(cost, state.x) is not None
+
+
+def test_ket_follows_the_covariance_matrix():
+    """Tests that the ket of a Gaussian state is recomputed when its moments change"""
+    first, second = Coherent(x=[0.3], y=[0.1]), Coherent(x=[0.5], y=[0.1])
+    state = State(cov=first.cov, means=first.means)
+    state.ket([4])
+    state._means = second.means  # pylint: disable=protected-access
+    assert np.allclose(state.ket([6]), second.ket([6]))
+
+
+def test_get_modes_of_fock_state():
+    """Tests that get_modes of a state in Fock representation traces out the other modes"""
+    state = State(ket=(Vacuum(2) >> Sgate([0.3, 0.1]) >> BSgate(0.4)).ket([6, 5]))
+    reduced = state.get_modes(1)
+    dm = np.array(state.dm())
+    assert reduced.modes == [1]
+    assert np.allclose(reduced.dm(), np.einsum("ijik->jk", dm))
+
+
+@pytest.mark.parametrize("modes", [[2], [0, 2], [2, 0, 1]])
+def test_marginal_probabilities(modes):
+    """Tests the marginal probabilities of pure and mixed Gaussian states and of states in Fock
+    representation (including a pure state given by its density matrix) against the sum of the
+    joint probabilities"""
+    pure = Vacuum(3) >> Sgate([0.3, 0.2, 0.4]) >> BSgate(0.5)[0, 1] >> BSgate(0.3)[1, 2]
+    mixed = pure >> Dgate([0.1, 0.2, -0.1]) >> Attenuator([0.9, 0.8, 0.7])
+    cutoffs = [5, 6, 7]
+    fock_states = [State(dm=pure.dm([8, 8, 8])), State(dm=mixed.dm([8, 8, 8]))]
+    for state in [pure, mixed] + fock_states:
+        joint = np.array(state.fock_probabilities([8, 8, 8]))
+        expected = np.sum(joint, axis=tuple(m for m in range(3) if m not in modes))
+        expected = np.transpose(expected, np.argsort(np.argsort(modes)))
+        expected = expected[tuple(slice(cutoffs[k]) for k in range(len(modes)))]
+        result = state.marginal_probabilities(modes, cutoffs[: len(modes)])
+        assert np.allclose(result, expected, atol=1e-6)
+
+
+def test_marginal_probabilities_of_pure_density_matrix():
+    """Tests the marginal probabilities of a pure state in Fock representation without a ket"""
+    state = State(dm=Coherent([0.5]).dm([8]))
+    assert np.allclose(
+        state.marginal_probabilities([0], [8]), Coherent([0.5]).fock_probabilities([8])
+    )
+
+
+def test_marginal_probabilities_of_many_modes():
+    """Tests the marginal probabilities of a state with too many modes for its Fock
+    representation against the photon number statistics of its modes"""
+    state = SqueezedVacuum([0.3] * 20) >> Attenuator([0.8] * 20)
+    probs = np.array(state.marginal_probabilities(7, [30]))
+    n = np.arange(30)
+    assert np.isclose(np.sum(probs), 1.0)
+    assert np.isclose(n @ probs, state.number_means[7])
+    assert np.isclose(n**2 @ probs - (n @ probs) ** 2, state.number_stdev[7] ** 2)
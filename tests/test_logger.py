@@ -47,10 +47,25 @@ https://github.com/pallets/flask/blob/master/tests/test_logging.py
 
 # pylint: disable=no-self-use
 
+import json
 import logging
 import pytest
+from mrmustard import settings
+from mrmustard.lab.gates import Attenuator, BSgate, Sgate
+from mrmustard.lab.states import Fock, Vacuum
+from mrmustard.math import Math
 from mrmustard.utils import training
-from mrmustard.logger import logging_handler_defined, default_handler, create_logger
+from mrmustard.utils.cache import fock_cache
+from mrmustard.logger import (
+    logging_handler_defined,
+    default_handler,
+    create_logger,
+    instrumented,
+    profile,
+    profiler,
+)
+
+math = Math()
 
 modules_contain_logging = [training]
 
@@ -169,3 +184,55 @@ class TestLoggerIntegration:
 
         assert logging_handler_defined(logger)
         assert logger.getEffectiveLevel() == custom_level
+
+
+def test_profile_records_the_hot_paths(tmpdir):
+    """Tests that the profile context manager records the instrumented functions and the
+    backend dispatch, and that the recorded calls can be exported as a Chrome trace"""
+    fock_cache.clear()
+    with profile() as prof:
+        assert settings.PROFILE
+        state = Fock([2, 1]) >> BSgate(0.3) >> Attenuator([0.8, 0.9])
+        state.dm()
+    assert not settings.PROFILE
+
+    summary = prof.summary()
+    for name in ["Transformation.U", "fock.CPTP", "gaussian.CPTP", "math.hermite_renormalized"]:
+        assert summary[name]["calls"] >= 1
+        assert summary[name]["total"] >= summary[name]["mean"] > 0
+    assert summary["Transformation.U"]["max_size"] == (3 * 2) ** 2  # U of shape (3, 2, 3, 2)
+    assert "math.hermite_renormalized" in str(prof)
+
+    filename = str(tmpdir.join("trace.json"))
+    prof.save_chrome_trace(filename)
+    with open(filename, encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+    assert len(events) == len(prof.events)
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+
+
+def test_instrumentation_is_off_by_default():
+    """Tests that nothing is recorded and the backend methods are not wrapped unless
+    settings.PROFILE is True"""
+    profiler.clear()
+    Vacuum(1) >> Sgate([0.1])
+    assert not profiler.events
+    assert math.matmul.__self__ is Math._backend  # pylint: disable=protected-access
+
+
+def test_global_profile_is_bounded_and_skipped_inside_profile():
+    """Tests that the global profile keeps the most recent calls only and that the calls made
+    inside profile() are only recorded in its own profile"""
+    profiler.clear()
+    noop = instrumented("noop")(lambda: None)
+    with profile() as prof:
+        noop()
+    assert len(prof.events) == 1 and not profiler.events
+    settings.PROFILE = True
+    try:
+        for _ in range(profiler.events.maxlen + 10):
+            noop()
+    finally:
+        settings.PROFILE = False
+    assert len(profiler.events) == profiler.events.maxlen
+    profiler.clear()
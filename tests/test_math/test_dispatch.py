@@ -0,0 +1,45 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import pytest
+
+from mrmustard import settings
+from mrmustard.math import Math, TFMath
+
+
+def test_math_dispatches_to_active_backend():
+    """Tests that the cached switcher returns the methods of the active backend"""
+    math = Math()
+    assert math.matmul.__self__ is TFMath()
+    assert math.matmul is math.matmul
+
+
+def test_backend_change_rebinds_math():
+    """Tests that changing the backend re-binds the switcher and that changing it back restores it"""
+    math = Math()
+    calls = []
+    settings.on_backend_change(calls.append)
+    try:
+        settings.backend = "torch"
+        if importlib.util.find_spec("torch"):
+            assert type(math.matmul.__self__).__name__ == "TorchMath"
+        else:
+            with pytest.raises(ValueError):
+                math.matmul  # pylint: disable=pointless-statement
+    finally:
+        settings.backend = "tensorflow"
+        settings._backend_callbacks.remove(calls.append)  # pylint: disable=protected-access
+    assert calls == ["tensorflow", "torch", "tensorflow"]
+    assert math.matmul.__self__ is TFMath()
@@ -0,0 +1,160 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+import tensorflow as tf
+from hypothesis import given, strategies as st
+from thewalrus import hermite_multidimensional
+
+from mrmustard.math import hermite, Math
+
+math = Math()
+
+shapes = st.lists(st.integers(1, 5), min_size=1, max_size=3)
+
+
+def random_ABC(num_indices, seed=137):
+    rng = np.random.default_rng(seed)
+    shape = (num_indices, num_indices)
+    A = rng.normal(size=shape) + 1j * rng.normal(size=shape)
+    A = 0.25 * (A + A.T)
+    B = rng.normal(size=num_indices) + 1j * rng.normal(size=num_indices)
+    return A, B, 0.7 + 0.2j
+
+
+@given(shape=shapes)
+def test_numpy_engine_agrees_with_thewalrus(shape):
+    """Tests the vectorized NumPy recursion against thewalrus"""
+    A, B, C = random_ABC(len(shape))
+    expected = hermite_multidimensional(A, shape, B, C, True, True, True)
+    assert np.allclose(hermite.hermite_renormalized_numpy(A, B, C, shape), expected)
+
+
+@pytest.mark.skipif(not hermite.NUMBA_AVAILABLE, reason="requires numba")
+@given(shape=shapes)
+def test_numba_engine_agrees_with_numpy(shape):
+    """Tests that the Numba and NumPy recursions return the same tensor"""
+    A, B, C = random_ABC(len(shape))
+    assert np.allclose(
+        hermite.hermite_renormalized_numba(A, B, C, shape),
+        hermite.hermite_renormalized_numpy(A, B, C, shape),
+    )
+
+
+def test_invalid_shape_raises():
+    """Tests that incompatible inputs are rejected"""
+    A, B, C = random_ABC(2)
+    with pytest.raises(ValueError):
+        hermite.hermite_renormalized(A, B, C, (3, 3, 3))
+    with pytest.raises(ValueError):
+        hermite.hermite_renormalized(A, B, C, (3, 0))
+
+
+@pytest.mark.parametrize("shape", [(6,), (4, 3), (3, 2, 3)])
+def test_vjp_agrees_with_finite_differences(shape):
+    """Tests the vjp kernel against central finite differences along symmetric directions"""
+    A, B, C = random_ABC(len(shape))
+    rng = np.random.default_rng(42)
+    dLdG = rng.normal(size=shape)
+    G = hermite.hermite_renormalized(A, B, C, shape)
+    dLdA, dLdB, dLdC = hermite.hermite_renormalized_vjp(G, dLdG, A, B, C)
+    loss = lambda A, B, C: np.sum(dLdG * np.real(hermite.hermite_renormalized(A, B, C, shape)))
+    eps = 1e-6
+    dA = rng.normal(size=A.shape)
+    dA = dA + dA.T
+    dB = rng.normal(size=B.shape)
+    fd_A = (loss(A + eps * dA, B, C) - loss(A - eps * dA, B, C)) / (2 * eps)
+    fd_B = (loss(A, B + eps * dB, C) - loss(A, B - eps * dB, C)) / (2 * eps)
+    fd_C = (loss(A, B, C + eps) - loss(A, B, C - eps)) / (2 * eps)
+    assert np.allclose(fd_A, np.sum(np.real(dLdA) * dA), atol=1e-5)
+    assert np.allclose(fd_B, np.sum(np.real(dLdB) * dB), atol=1e-5)
+    assert np.allclose(fd_C, np.real(dLdC), atol=1e-5)
+
+
+def test_tf_gradient_of_hermite_renormalized():
+    """Tests that the gradient flows through math.hermite_renormalized"""
+    A, B, C = random_ABC(2)
+    A = tf.constant(A)
+    B = tf.constant(B)
+    C = tf.constant(C, dtype=tf.complex128)
+    with tf.GradientTape() as tape:
+        tape.watch(B)
+        G = math.hermite_renormalized(A, B, C, shape=(3, 3))
+        loss = tf.math.real(tf.reduce_sum(G))
+    grad = tape.gradient(loss, B)
+    expected = hermite.hermite_renormalized_vjp(
+        G.numpy(), np.ones((3, 3)), A.numpy(), B.numpy(), C.numpy()
+    )[1]
+    assert np.allclose(grad, expected)
+
+
+@given(shape=shapes, batch=st.integers(1, 4))
+def test_batch_engine_agrees_with_single_calls(shape, batch):
+    """Tests that the batched recursion and its vjp agree with the unbatched ones"""
+    triples = [random_ABC(len(shape), seed=k) for k in range(batch)]
+    A = np.stack([t[0] for t in triples])
+    B = np.stack([t[1] for t in triples])
+    C = np.array([t[2] * (k + 1) for k, t in enumerate(triples)])
+    G = hermite.hermite_renormalized_batch(A, B, C, shape)
+    assert np.allclose(hermite._fill_shells(A, B, C, tuple(shape)), G)
+    dLdG = np.ones_like(G)
+    batch_grads = hermite.hermite_renormalized_batch_vjp(G, dLdG, A, B, C)
+    for k in range(batch):
+        assert np.allclose(G[k], hermite.hermite_renormalized(A[k], B[k], C[k], shape))
+        grads = hermite.hermite_renormalized_vjp(G[k], dLdG[k], A[k], B[k], C[k])
+        assert all(np.allclose(bg[k], g) for bg, g in zip(batch_grads, grads))
+
+
+@given(data=st.data(), shape=shapes)
+def test_extend_agrees_with_full_recursion(data, shape):
+    """Tests that extending a smaller tensor gives the tensor computed from scratch"""
+    A, B, C = random_ABC(len(shape))
+    small = data.draw(st.tuples(*[st.integers(1, s) for s in shape]))
+    G = hermite.hermite_renormalized(A, B, C, small)
+    expected = hermite.hermite_renormalized(A, B, C, shape)
+    assert np.allclose(hermite.hermite_renormalized_extend(A, B, C, G, shape), expected)
+    known = np.array(small)
+    extended = np.zeros((1,) + tuple(shape), dtype=np.complex128)
+    extended[(0,) + tuple(slice(k) for k in small)] = G
+    numpy_extended = hermite._fill_shells(
+        A[None], B[None], np.array([C]), tuple(shape), known, extended
+    )
+    assert np.allclose(numpy_extended[0], expected)
+
+
+def test_extend_rejects_larger_tensor():
+    """Tests that a tensor can only be extended to a larger shape"""
+    A, B, C = random_ABC(2)
+    G = hermite.hermite_renormalized(A, B, C, (4, 2))
+    with pytest.raises(ValueError):
+        hermite.hermite_renormalized_extend(A, B, C, G, (3, 3))
+
+
+def test_tf_gradient_of_hermite_renormalized_extend():
+    """Tests that the gradient of an extended tensor is that of the full tensor"""
+    A, B, C = random_ABC(2)
+    A = tf.constant(A)
+    B = tf.constant(B)
+    C = tf.constant(C, dtype=tf.complex128)
+    G = math.hermite_renormalized(A, B, C, shape=(2, 2))
+    with tf.GradientTape() as tape:
+        tape.watch(B)
+        extended = math.hermite_renormalized_extend(A, B, C, G, shape=(3, 4))
+        loss = tf.math.real(tf.reduce_sum(extended))
+    with tf.GradientTape() as tape_full:
+        tape_full.watch(B)
+        loss_full = tf.math.real(tf.reduce_sum(math.hermite_renormalized(A, B, C, shape=(3, 4))))
+    assert np.allclose(loss, loss_full)
+    assert np.allclose(tape.gradient(loss, B), tape_full.gradient(loss_full, B))
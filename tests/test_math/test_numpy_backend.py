@@ -0,0 +1,115 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+import tensorflow as tf
+from hypothesis import given, strategies as st
+
+from mrmustard import settings
+from mrmustard.lab.gates import Attenuator, BSgate, Dgate, Sgate
+from mrmustard.lab.states import Coherent, Fock, Vacuum
+from mrmustard.math import Math, NumpyMath, TFMath
+
+math = Math()
+
+
+@pytest.fixture
+def numpy_backend():
+    r"""Switches to the NumPy backend for the duration of a test."""
+    settings.backend = "numpy"
+    yield
+    settings.backend = "tensorflow"
+
+
+def circuit_outputs():
+    state = Vacuum(2) >> Sgate([0.3, 0.2], [0.1, 0.4]) >> BSgate(0.4, 0.2)
+    state = state >> Dgate([0.2, 0.1], [0.1, 0.0]) >> Attenuator([0.8, 0.9])
+    fock_state = Fock([1, 2]) >> BSgate(0.3)
+    return [
+        state.cov,
+        state.means,
+        state.dm([4, 4]),
+        state.get_modes(0).dm([4]),
+        (Coherent([0.3]) >> Sgate([0.2])).ket([5]),
+        fock_state.ket([4, 4]),
+        Attenuator([0.7]).choi([4]),
+    ]
+
+
+def test_numpy_backend_is_selected(numpy_backend):
+    """Tests that the switcher dispatches to the NumPy backend and that it returns arrays"""
+    assert math.matmul.__self__ is NumpyMath()
+    assert isinstance((Vacuum(1) >> Sgate([0.2])).cov, np.ndarray)
+
+
+def test_numpy_backend_agrees_with_tensorflow():
+    """Tests that states, gates and Fock representations agree across the two backends"""
+    expected = [np.array(x) for x in circuit_outputs()]
+    settings.backend = "numpy"
+    try:
+        results = circuit_outputs()
+    finally:
+        settings.backend = "tensorflow"
+    for result, exp in zip(results, expected):
+        assert isinstance(result, np.ndarray)
+        assert np.allclose(result, exp, atol=1e-6)
+
+
+@given(n=st.integers(1, 4), k=st.integers(0, 3))
+def test_matvec_and_scatter_like_tensorflow(n, k):
+    """Tests the batched and flagged linear algebra and the scatter ops against TensorFlow"""
+    tfm, npm = TFMath(), NumpyMath()
+    rng = np.random.default_rng(n + k)
+    a = rng.normal(size=(k + 1, n, n)) + 1j * rng.normal(size=(k + 1, n, n))
+    b = rng.normal(size=(k + 1, n)) + 1j * rng.normal(size=(k + 1, n))
+    assert np.allclose(npm.matvec(a, b, adjoint_a=True), tfm.matvec(a, b, adjoint_a=True))
+    assert np.allclose(npm.matmul(a, a, transpose_b=True), tfm.matmul(a, a, transpose_b=True))
+    assert np.allclose(npm.diag(b, k=k), tfm.diag(b, k=k))
+    indices = np.array([[i] for i in range(min(k + 1, n))], dtype=np.int32)
+    values = rng.normal(size=(len(indices), n))
+    tensor = rng.normal(size=(n, n))
+    assert np.allclose(
+        npm.update_add_tensor(tensor, indices, values),
+        tfm.update_add_tensor(tensor, indices, values),
+    )
+    assert np.allclose(
+        npm.update_tensor(tensor, indices, values), tfm.update_tensor(tensor, indices, values)
+    )
+    assert np.allclose(npm.sum(a, axes=[0, 2]), tf.reduce_sum(a, [0, 2]))
+
+
+def test_convolve_probs_like_tensorflow():
+    """Tests the NumPy convolution used by the detectors against TensorFlow"""
+    rng = np.random.default_rng(1)
+    prob, other = rng.random((4, 5)), rng.random((4, 5))
+    assert np.allclose(
+        NumpyMath().convolve_probs(prob, other), TFMath().convolve_probs(prob, other)
+    )
+
+
+def test_numpy_backend_does_not_fall_back_to_numpy(numpy_backend):
+    """Tests that the NumPy backend only provides the methods of the interface"""
+    with pytest.raises(AttributeError):
+        NumpyMath().linspace  # pylint: disable=expression-not-assigned
+    with pytest.raises(AttributeError):
+        math.linspace  # pylint: disable=expression-not-assigned
+    assert math.allclose(np.eye(2), np.eye(2) + 1e-10)
+    assert Attenuator([0.7]).is_phase_covariant
+
+
+def test_numpy_backend_is_not_differentiable(numpy_backend):
+    """Tests that the NumPy backend refuses to compute gradients"""
+    with pytest.raises(NotImplementedError):
+        math.value_and_gradients(lambda: 0.0, {})
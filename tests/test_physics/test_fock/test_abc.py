@@ -0,0 +1,59 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from hypothesis import given, strategies as st
+
+from mrmustard.lab import Vacuum, Sgate, Dgate, BSgate
+from mrmustard.physics import fock
+
+st_r = st.floats(0, 1)
+st_angle = st.floats(0, 2 * np.pi)
+
+
+def pure_state(r, phi, x):
+    return Vacuum(2) >> Sgate(r=[r, 0.5 * r], phi=[phi, 0.3]) >> BSgate(0.4, phi) >> Dgate([x, 0.1])
+
+
+@given(r=st_r, phi=st_angle, x=st.floats(-1, 1))
+def test_half_size_ABC_matches_full_size(r, phi, x):
+    """Tests that the half-size A, B and C of a pure state agree with those derived from the
+    full-size A, B and C"""
+    state = pure_state(r, phi, x)
+    A, B, C = fock.ABC(state.cov, state.means, full=False)
+    A_full, B_full, C_full = fock.ABC(state.cov, state.means, full=True)
+    assert np.allclose(A, A_full[:2, :2])
+    assert np.allclose(A, np.transpose(A))
+    assert np.allclose(B, np.conj(B_full[2:]))
+    assert np.allclose(np.abs(C) ** 2, C_full)
+
+
+def test_half_size_ABC_batch():
+    """Tests that the half-size A, B and C of a batch of states are those of each state"""
+    states = [pure_state(0.1 * k, 0.2 * k, 0.3 - 0.1 * k) for k in range(4)]
+    covs = np.stack([s.cov for s in states])
+    means = np.stack([s.means for s in states])
+    A, B, C = fock.ABC(covs, means, full=False)
+    for k, state in enumerate(states):
+        A_k, B_k, C_k = fock.ABC(state.cov, state.means, full=False)
+        assert np.allclose(A[k], A_k)
+        assert np.allclose(B[k], B_k)
+        assert np.allclose(C[k], C_k)
+
+
+def test_half_size_ABC_choi_gives_unitary():
+    """Tests that the Fock representation of a Gaussian unitary from the half-size ABC is unitary
+    on the low photon number subspace"""
+    U = np.array((Sgate(0.4, 0.2) >> Dgate(0.3, -0.1)).U(cutoffs=[40]))
+    assert np.allclose((U @ np.conj(U.T))[:5, :5], np.eye(5), atol=1e-6)
@@ -12,13 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import importlib
+
 from hypothesis import settings, given, strategies as st
 
 import numpy as np
+import pytest
+import tensorflow as tf
+from scipy.linalg import sqrtm
 from scipy.special import factorial
 from thewalrus.quantum import total_photon_number_distribution
 from mrmustard.lab import *
+from mrmustard import settings as mm_settings
+from mrmustard.physics import fock
+from mrmustard.math import Math
 
+math = Math()
 
 # helper strategies
 st_angle = st.floats(min_value=0, max_value=2 * np.pi)
@@ -139,3 +148,139 @@ def test_density_matrix(num_modes):
     # rho_legit = L[modes](G(Vacuum(num_modes))).dm(cutoffs=cutoffs)
     # rho_built = G(Vacuum(num_modes=num_modes)).dm(cutoffs=cutoffs)
     assert np.allclose(rho_legit, rho_made)
+
+
+def test_partial_trace_of_fock_state():
+    """Tests that fock.trace keeps the requested modes in the standard density matrix layout"""
+    dm = np.random.default_rng(7).normal(size=(2, 3, 4, 2, 3, 4))
+    assert np.allclose(fock.trace(dm, [0, 2]), np.einsum("ijkljm->iklm", dm))
+    assert np.allclose(fock.trace(dm, [1]), np.einsum("ijkilk->jl", dm))
+
+
+def test_unitary_on_dm_with_different_cutoffs():
+    """Tests that a unitary acts as U rho U^dagger on a multimode density matrix"""
+    U = np.random.default_rng(7).normal(size=(3, 2, 3, 2))
+    dm = np.random.default_rng(8).normal(size=(3, 2, 3, 2))
+    expected = np.einsum("abij,ijkl,cdkl->abcd", U, dm, np.conj(U))
+    assert np.allclose(fock.CPTP(U, dm, True, True), expected)
+
+
+@given(eta=st.floats(0, 1), dc=st.floats(0, 0.5), cutoff_in=st.integers(1, 12))
+def test_pnr_channel_is_the_dense_channel(eta, dc, cutoff_in):
+    """Tests that the factored channel of a PNR detector is the binomial loss convolved with the
+    Poissonian dark counts"""
+    cutoff_out = 8
+    channel = fock.pnr_channel(eta, dc, cutoff_in, cutoff_out)
+    binomial = np.array(math.binomial_conditional_prob(eta, dim_out=cutoff_out, dim_in=cutoff_in))
+    dark = np.array(math.poisson(cutoff_out, dc))
+    expected = np.array(
+        [[dark[: m + 1] @ binomial[m::-1, n] for n in range(cutoff_in)] for m in range(cutoff_out)]
+    )
+    assert np.allclose(channel.matrix, expected)
+    probs = np.random.default_rng(cutoff_in).random((3, cutoff_in, 2))
+    assert np.allclose(channel.contract(probs, 1), np.einsum("anb,mn->abm", probs, expected))
+
+
+@given(eta=st.floats(0, 1), dc=st.floats(0, 0.2))
+def test_threshold_channel_is_the_dense_channel(eta, dc):
+    """Tests that the channel of a threshold detector gives the no-click and click probabilities"""
+    channel = fock.threshold_channel(math.astensor(eta, dtype="float64"), dc, 6)
+    no_click = (1 - eta) ** np.arange(6) - dc
+    assert np.allclose(channel.matrix, [no_click, 1 - no_click])
+    probs = np.random.default_rng(0).random((6, 3))
+    assert np.allclose(channel.contract(probs, 0), (np.array(channel.matrix) @ probs).T)
+
+
+def random_dm(cutoff, rank, seed):
+    rng = np.random.default_rng(seed)
+    M = rng.normal(size=(cutoff, rank)) + 1j * rng.normal(size=(cutoff, rank))
+    rho = M @ M.conj().T
+    return rho / np.trace(rho)
+
+
+def sqrtm_fidelity(rho, sigma):
+    sqrt_rho = sqrtm(rho)
+    return np.real(np.trace(sqrtm(sqrt_rho @ sigma @ sqrt_rho))) ** 2
+
+
+@given(rank_a=st.integers(1, 6), rank_b=st.integers(1, 6), seed=st.integers(0, 100))
+def test_fidelity_of_mixed_states(rank_a, rank_b, seed):
+    """Tests the fidelity between two density matrices (of full or low rank) against the formula
+    with matrix square roots, and that it is symmetric"""
+    rho, sigma = random_dm(6, rank_a, seed), random_dm(6, rank_b, seed + 1)
+    expected = sqrtm_fidelity(rho, sigma)
+    assert np.isclose(fock.fidelity(rho, sigma, False, False), expected, atol=1e-6)
+    assert np.isclose(fock.fidelity(sigma, rho, False, False), expected, atol=1e-6)
+
+
+def test_fidelity_of_mixed_states_is_that_of_kets():
+    """Tests that the fidelity between the density matrices of pure states is that of their kets,
+    for two modes with different cutoffs"""
+    ket_a = (Vacuum(2) >> Sgate([0.3, 0.1]) >> BSgate(0.4)).ket([5, 6])
+    ket_b = (Coherent(x=[0.2, 0.1], y=[0.1, 0.0]) >> BSgate(0.2)).ket([6, 5])
+    dm_a, dm_b = fock.ket_to_dm(ket_a), fock.ket_to_dm(ket_b)
+    expected = fock.fidelity(ket_a, ket_b, True, True)
+    assert np.isclose(fock.fidelity(dm_a, dm_b, False, False), expected)
+    assert np.isclose(fock.fidelity(ket_a, dm_b, True, False), expected)
+    assert np.isclose(fock.fidelity(dm_a, ket_b, False, True), expected)
+
+
+def test_batched_fidelity():
+    """Tests that the fidelity of two batches is the fidelity of each pair of states"""
+    rhos = np.stack([random_dm(5, rank, rank) for rank in [1, 3, 5]])
+    sigmas = np.stack([random_dm(5, 2, 10 + rank) for rank in [1, 3, 5]])
+    kets = np.stack([random_dm(5, 1, 20 + k)[:, 0] for k in range(3)])
+    fids = fock.fidelity(rhos, sigmas, False, False, batched=True)
+    assert np.allclose(fids, [sqrtm_fidelity(r, s) for r, s in zip(rhos, sigmas)], atol=1e-6)
+    # the purer state of each pair is decomposed (rank 1 for the first pair, 2 for the others)
+    assert np.allclose(fock.fidelity(sigmas, rhos, False, False, batched=True), fids)
+    fids = fock.fidelity(kets, rhos, True, False, batched=True)
+    assert np.allclose(fids, [fock.fidelity(k, r, True, False) for k, r in zip(kets, rhos)])
+
+
+def thermal_fidelity(a, b):
+    """The fidelity between two thermal states with mean photon numbers ``a`` and ``b``"""
+    return 1 / (np.sqrt((1 + a) * (1 + b)) - np.sqrt(a * b)) ** 2
+
+
+def test_fidelity_of_mixed_states_is_differentiable():
+    """Tests the gradient of the fidelity between two thermal states against its closed form"""
+    cutoff = 40
+    nbar_b = 0.3
+    sigma = np.diag(nbar_b ** np.arange(cutoff) / (1 + nbar_b) ** (np.arange(cutoff) + 1))
+    nbar = tf.Variable(0.5, dtype=tf.float64)
+    with tf.GradientTape() as tape:
+        n = math.cast(math.arange(cutoff, dtype=tf.float64), tf.float64)
+        rho = math.cast(math.diag(nbar**n / (1 + nbar) ** (n + 1)), tf.complex128)
+        fid = fock.fidelity(rho, sigma, False, False)
+    assert np.isclose(fid, thermal_fidelity(0.5, nbar_b))
+    h = 1e-6
+    expected_grad = (thermal_fidelity(0.5 + h, nbar_b) - thermal_fidelity(0.5 - h, nbar_b)) / (
+        2 * h
+    )
+    assert np.isclose(tape.gradient(fid, nbar), expected_grad, rtol=1e-4)
+
+
+@pytest.mark.skipif(not importlib.util.find_spec("torch"), reason="requires torch")
+def test_fidelity_of_mixed_states_is_differentiable_with_torch():
+    """Tests the gradient of the fidelity between two thermal states with the torch backend"""
+    import torch  # pylint: disable=import-outside-toplevel
+
+    cutoff = 40
+    nbar_b = 0.3
+    mm_settings.backend = "torch"
+    try:
+        n = torch.arange(cutoff, dtype=torch.float64)
+        sigma = torch.diag(nbar_b**n / (1 + nbar_b) ** (n + 1)).to(torch.complex128)
+        nbar = torch.tensor(0.5, dtype=torch.float64, requires_grad=True)
+        rho = torch.diag(nbar**n / (1 + nbar) ** (n + 1)).to(torch.complex128)
+        fid = fock.fidelity(rho, sigma, False, False)
+        fid.backward()
+    finally:
+        mm_settings.backend = "tensorflow"
+    assert np.isclose(fid.item(), thermal_fidelity(0.5, nbar_b))
+    h = 1e-6
+    expected_grad = (thermal_fidelity(0.5 + h, nbar_b) - thermal_fidelity(0.5 - h, nbar_b)) / (
+        2 * h
+    )
+    assert np.isclose(nbar.grad.item(), expected_grad, rtol=1e-4)
@@ -60,3 +60,62 @@ def test_partition_cov_3modes():
     #                 [25,26,27,28,29,30],
     #                 [31,32,33,34,35,36]])
     # A,B,AB = gp.partition_cov(gp.math.astensor(arr), Amodes=[0,2])
+
+
+@given(num_modes=st.integers(1, 4), seed=st.integers(0, 1000))
+def test_williamson_decomposition(num_modes, seed):
+    """Tests that the Williamson decomposition recovers the symplectic eigenvalues and a symplectic
+    matrix of a random mixed state, one state at a time and in a batch"""
+    np.random.seed(seed)
+    eigenvalues = np.sort(1 + np.random.exponential(size=(2, num_modes)), axis=-1)
+    symplectics = [gp.math.random_symplectic(num_modes) for _ in range(2)]
+    covs = [gp.gaussian_cov(S, e, settings.HBAR) for S, e in zip(symplectics, eigenvalues)]
+    covs = np.stack(covs)
+    J = gp.math.J(num_modes)
+    for cov, expected in zip(covs, eigenvalues):
+        nu, S = gp.williamson(cov, settings.HBAR)
+        assert np.allclose(nu, expected)
+        assert np.allclose(S @ J @ np.transpose(S), J)
+        assert np.allclose(gp.gaussian_cov(S, nu, settings.HBAR), cov)
+        assert np.allclose(gp.symplectic_eigenvals(cov, settings.HBAR), expected)
+        assert np.isclose(gp.purity_from_eigenvals(nu), gp.purity(cov, settings.HBAR))
+    nu, S = gp.williamson(covs, settings.HBAR)
+    assert np.allclose(nu, eigenvalues)
+    assert np.allclose(gp.math.matmul(gp.math.matmul(S, J), S, transpose_b=True), J)
+
+
+@given(nbar=st.floats(0.0, 5.0))
+def test_von_neumann_entropy_of_thermal_state(nbar):
+    """Tests the entropy of a thermal state and of a pure state"""
+    cov = gp.math.astensor((2 * nbar + 1) * np.eye(2))
+    expected = (nbar + 1) * np.log(nbar + 1) - (nbar * np.log(nbar) if nbar > 0 else 0)
+    assert np.isclose(gp.von_neumann_entropy(cov, 2.0), expected, atol=1e-7)
+    squeezed = gp.squeezed_vacuum_cov(np.array([nbar]), np.array([0.0]), 2.0)
+    assert np.isclose(gp.von_neumann_entropy(squeezed, 2.0), 0.0, atol=1e-7)
+
+
+@given(seed=st.integers(0, 1000), kind=st.sampled_from(["single-mode", "diagonal", "general"]))
+def test_CPTP_updates_only_the_modes_of_the_channel(seed, kind):
+    """Tests the channels on some modes of a state against their embedding in the full phase space,
+    for single-mode, per-mode diagonal and general multimode channels"""
+    rng = np.random.default_rng(seed)
+    N, modes = 5, list(rng.choice(5, size=rng.integers(1, 4), replace=False))
+    M = len(modes)
+    A = rng.normal(size=(2 * N, 2 * N))
+    cov, means = A @ A.T, rng.normal(size=2 * N)
+    if kind == "single-mode":
+        X, Y, d = rng.normal(size=(2, 2)), np.diag(rng.random(2)), rng.normal(size=2)
+        X_full, Y_full, d_full = np.kron(X, np.eye(M)), np.kron(Y, np.eye(M)), np.repeat(d, M)
+    else:
+        X = np.diag(rng.normal(size=2 * M)) if kind == "diagonal" else rng.normal(size=(2 * M,) * 2)
+        B = rng.normal(size=(2 * M, 2 * M))
+        X_full, Y_full, d_full = X, B @ B.T, rng.normal(size=2 * M)
+        Y, d = Y_full, d_full
+    rows = modes + [m + N for m in modes]
+    embedding = np.eye(2 * N)[:, rows]
+    X_expected = embedding @ X_full @ embedding.T + np.eye(2 * N) - embedding @ embedding.T
+    expected_cov = X_expected @ cov @ X_expected.T + embedding @ Y_full @ embedding.T
+    expected_means = X_expected @ means + embedding @ d_full
+    new_cov, new_means = gp.CPTP(cov, means, X, Y, d, list(range(N)), modes)
+    assert np.allclose(new_cov, expected_cov)
+    assert np.allclose(new_means, expected_means)
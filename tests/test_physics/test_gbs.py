@@ -0,0 +1,82 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+
+import numpy as np
+import pytest
+from scipy.stats import poisson
+from thewalrus import threshold_detection_prob
+
+from mrmustard import settings
+from mrmustard.lab.gates import Attenuator, BSgate, Dgate
+from mrmustard.lab.states import SqueezedVacuum
+from mrmustard.physics.gbs import pnr_probabilities, threshold_probabilities
+
+
+def gaussian_state(mixed):
+    state = SqueezedVacuum([0.5, 0.3, 0.4]) >> Dgate([0.2, 0.1, -0.3], [0.1, 0.0, 0.2])
+    state = state >> BSgate(0.5, 0.2)[0, 1] >> BSgate(0.3)[1, 2]
+    return state >> Attenuator([0.9, 0.8, 0.95]) if mixed else state
+
+
+@pytest.mark.parametrize("mixed", [False, True])
+def test_pnr_probabilities_are_the_fock_probabilities(mixed):
+    """Tests the loop hafnian probabilities of pure and mixed states against their Fock
+    representation, for a batch of patterns with repetitions"""
+    state = gaussian_state(mixed)
+    probs = np.array(state.fock_probabilities([6, 6, 6]))
+    patterns = np.array([[[0, 0, 0], [1, 0, 2]], [[2, 1, 1], [1, 0, 2]], [[0, 3, 1], [4, 0, 0]]])
+    result = pnr_probabilities(state.cov, state.means, patterns, workers=2)
+    assert result.shape == (3, 2)
+    assert np.allclose(result, probs[tuple(np.moveaxis(patterns, -1, 0))])
+
+
+@pytest.mark.parametrize("mixed", [False, True])
+def test_threshold_probabilities(mixed):
+    """Tests the loop Torontonian probabilities against thewalrus and their normalization"""
+    state = gaussian_state(mixed)
+    patterns = np.array(list(itertools.product([0, 1], repeat=3)))
+    result = threshold_probabilities(state.cov, state.means, patterns)
+    cov, means = np.array(state.cov), np.array(state.means)
+    expected = [threshold_detection_prob(means, cov, s, hbar=settings.HBAR) for s in patterns]
+    assert np.allclose(result, expected)
+    assert np.isclose(np.sum(result), 1.0)
+
+
+def test_probabilities_with_dark_counts():
+    """Tests that the dark counts spread the probabilities of the patterns"""
+    state = gaussian_state(mixed=True)
+    clicks = np.array(list(itertools.product([0, 1], repeat=3)))
+    noisy = threshold_probabilities(state.cov, state.means, clicks, dark_count_prob=[0.1, 0.2, 0.0])
+    ideal = threshold_probabilities(state.cov, state.means, clicks)
+    assert np.isclose(np.sum(noisy), 1.0)
+    assert np.isclose(noisy[0], ideal[0] * 0.9 * 0.8)
+    noisy = pnr_probabilities(state.cov, state.means, [0, 2, 1], dark_counts=0.1)
+    arrived = [(0, k1, k2) for k1 in range(3) for k2 in range(2)]
+    ideal = pnr_probabilities(state.cov, state.means, arrived)
+    dark = [
+        poisson.pmf(0, 0.1) * poisson.pmf(2 - k1, 0.1) * poisson.pmf(1 - k2, 0.1)
+        for _, k1, k2 in arrived
+    ]
+    assert np.isclose(noisy, np.dot(dark, ideal))
+
+
+def test_invalid_patterns():
+    """Tests that the patterns must have the modes of the state and threshold patterns 0 or 1"""
+    state = gaussian_state(mixed=False)
+    with pytest.raises(ValueError):
+        pnr_probabilities(state.cov, state.means, [[1, 0]])
+    with pytest.raises(ValueError):
+        threshold_probabilities(state.cov, state.means, [[2, 0, 0]])
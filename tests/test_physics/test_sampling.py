@@ -0,0 +1,118 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from mrmustard.lab.abstract import State
+from mrmustard.lab.gates import Attenuator, BSgate, Dgate, Interferometer, Sgate
+from mrmustard.lab.states import Coherent, Fock, SqueezedVacuum, TMSV
+from mrmustard.physics import sample
+from mrmustard.physics.sampling import sample_fock
+
+SHOTS = 20000
+
+
+def empirical(samples, shape):
+    freqs = np.zeros(shape)
+    np.add.at(freqs, tuple(samples.T), 1)
+    return freqs / len(samples)
+
+
+def mixed_state():
+    state = SqueezedVacuum([0.5, 0.3, 0.4]) >> BSgate(0.5)[0, 1] >> BSgate(0.3)[1, 2]
+    return state >> Attenuator([0.9, 0.8, 0.95])
+
+
+def displaced_state():
+    return mixed_state() >> Dgate([0.3, -0.2, 0.1], [0.1, 0.4, -0.3])
+
+
+@pytest.mark.parametrize("state_fn", [mixed_state, displaced_state])
+@pytest.mark.parametrize("modes", [None, [2, 0], [1]])
+def test_gaussian_samples_follow_the_fock_probabilities(state_fn, modes):
+    """Tests that the photon-number samples of a mixed Gaussian state (optionally displaced) have
+    the distribution of its Fock probabilities, for all the modes and for subsets of modes in any
+    order"""
+    state = state_fn()
+    probs = np.array(state.fock_probabilities([12, 12, 12]))
+    if modes is not None:
+        probs = np.sum(probs, axis=tuple(m for m in range(3) if m not in modes))
+        probs = np.transpose(probs, np.argsort(np.argsort(modes)))
+    samples = sample(state, SHOTS, modes=modes, seed=1)
+    assert samples.shape == (SHOTS, probs.ndim)
+    assert np.allclose(empirical(samples, probs.shape), probs / probs.sum(), atol=0.01)
+
+
+def test_samples_of_displaced_squeezed_state():
+    """Tests the photon-number distribution of a squeezed and displaced single-mode state"""
+    state = SqueezedVacuum([0.5], [0.3]) >> Dgate([0.3], [0.1])
+    probs = np.array(state.fock_probabilities([20]))
+    samples = sample(state, SHOTS, seed=2)
+    assert np.allclose(probs[[0, 2]], [0.768, 0.025], atol=1e-3)
+    assert np.allclose(empirical(samples, probs.shape), probs / probs.sum(), atol=0.01)
+
+
+def test_pure_gaussian_samples_are_photon_number_correlated():
+    """Tests that the two modes of a two-mode squeezed vacuum always have the same number of
+    photons"""
+    samples = sample(TMSV(r=0.8), 1000, seed=3)
+    assert np.all(samples[:, 0] == samples[:, 1])
+    assert np.isclose(samples[:, 0].mean(), np.sinh(0.8) ** 2, rtol=0.15)
+
+
+def test_samples_of_many_modes():
+    """Tests the samples of a state with too many modes for its Fock representation against the
+    mean photon numbers"""
+    np.random.seed(2)
+    state = SqueezedVacuum([0.4] * 16) >> Interferometer(16)
+    samples = sample(state, 2000, seed=4)
+    assert samples.shape == (2000, 16)
+    assert np.isclose(samples.sum(axis=1).mean(), np.sum(state.number_means), rtol=0.1)
+
+
+def test_samples_of_coherent_state():
+    """Tests that the photon numbers of a coherent state are Poisson distributed"""
+    samples = sample(Coherent(x=[1.0], y=[0.5]) >> Sgate([0.0]), SHOTS, seed=5)
+    assert np.isclose(samples.mean(), 1.25, rtol=0.03)
+    assert np.isclose(samples.var(), 1.25, rtol=0.05)
+
+
+def test_samples_of_fock_states():
+    """Tests the samples of states in Fock representation"""
+    assert np.all(sample(Fock([2, 1]), 10, seed=0) == [2, 1])
+    assert np.all(sample(Fock([2, 1]), 10, modes=[1], seed=0) == [1])
+    state = mixed_state()
+    dm = state.dm([8, 8, 8])
+    probs = np.sum(np.array(state.fock_probabilities([8, 8, 8])), axis=1).T
+    samples = sample(State(dm=dm), SHOTS, modes=[2, 0], seed=6)
+    assert np.allclose(empirical(samples, probs.shape), probs / probs.sum(), atol=0.01)
+
+
+def test_samples_of_pure_density_matrix():
+    """Tests the samples of a pure state given by its density matrix"""
+    coherent = Coherent(x=[0.5], y=[0.2])
+    state = State(dm=coherent.dm([10]))
+    assert state.is_pure and state.ket() is None
+    probs = np.array(coherent.fock_probabilities([10]))
+    samples = sample(state, SHOTS, seed=4)
+    assert np.allclose(empirical(samples, probs.shape), probs / probs.sum(), atol=0.01)
+
+
+def test_samples_are_reproducible():
+    """Tests that the same seed gives the same samples and that a generator can be passed"""
+    state = mixed_state()
+    assert np.all(sample(state, 100, seed=7) == sample(state, 100, seed=7))
+    rng = np.random.default_rng(8)
+    assert np.all(sample_fock(np.eye(3) / 3, 50, rng) == sample_fock(np.eye(3) / 3, 50, 8))
@@ -0,0 +1,108 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+from hypothesis import given, settings as hyp_settings, strategies as st
+from scipy.integrate import trapezoid
+from scipy.special import eval_laguerre
+
+from mrmustard import settings
+from mrmustard.lab.states import Coherent, Thermal
+from mrmustard.physics.wigner import (
+    NUMBA_AVAILABLE,
+    quadrature_marginals,
+    wigner,
+    wigner_marginal,
+)
+
+xvec = np.linspace(-6, 6, 81)
+pvec = np.linspace(-5, 5, 71)
+
+
+def random_dm(cutoff, seed):
+    rng = np.random.default_rng(seed)
+    M = rng.normal(size=(cutoff, cutoff)) + 1j * rng.normal(size=(cutoff, cutoff))
+    rho = M @ M.conj().T
+    return rho / np.trace(rho)
+
+
+@given(n=st.integers(0, 7))
+def test_wigner_of_fock_state(n):
+    """Tests the Wigner function of a Fock state against the Laguerre polynomial formula"""
+    hbar = settings.HBAR
+    rho = np.zeros((n + 3, n + 3))
+    rho[n, n] = 1.0
+    Q, P = np.meshgrid(xvec, pvec)
+    r2 = 2 * (Q**2 + P**2) / hbar  # 4|alpha|^2
+    expected = (-1) ** n * np.exp(-r2 / 2) * eval_laguerre(n, r2) / (np.pi * hbar)
+    assert np.allclose(wigner(rho, xvec, pvec), expected)
+
+
+def test_wigner_of_coherent_state():
+    """Tests the Wigner function of a coherent state against its Gaussian form"""
+    state = Coherent(x=[0.8], y=[-0.5])
+    W = wigner(state.dm([30]), xvec, pvec)
+    (x0, p0), hbar = np.array(state.means), settings.HBAR
+    Q, P = np.meshgrid(xvec, pvec)
+    expected = np.exp(-((Q - x0) ** 2 + (P - p0) ** 2) / hbar) / (np.pi * hbar)
+    assert np.allclose(W, expected, atol=1e-8)
+
+
+@given(cutoff=st.integers(1, 8), seed=st.integers(0, 100))
+def test_batched_wigner_is_the_wigner_of_each_state(cutoff, seed):
+    """Tests that the leading axes of the density matrices are batch axes"""
+    rhos = np.array([[random_dm(cutoff, seed + i + 2 * j) for i in range(2)] for j in range(3)])
+    W = wigner(rhos, xvec, pvec)
+    assert W.shape == (3, 2, len(pvec), len(xvec))
+    for j in range(3):
+        for i in range(2):
+            assert np.allclose(W[j, i], wigner(rhos[j, i], xvec, pvec))
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="requires numba")
+@hyp_settings(deadline=None)
+@given(cutoff=st.integers(1, 10), seed=st.integers(0, 100))
+def test_numba_agrees_with_clenshaw(cutoff, seed):
+    """Tests that the compiled kernel computes the same Wigner function"""
+    rhos = np.array([random_dm(cutoff, seed), random_dm(cutoff, seed + 1)])
+    assert np.allclose(wigner(rhos, xvec, pvec, method="numba"), wigner(rhos, xvec, pvec))
+
+
+def test_wigner_unknown_method():
+    """Tests that an unknown method is rejected"""
+    with pytest.raises(ValueError):
+        wigner(random_dm(3, 0), xvec, pvec, method="loop")
+
+
+def test_wigner_is_normalized_and_has_the_right_marginals():
+    """Tests that the Wigner function integrates to one and that its marginals are the
+    quadrature distributions of a thermal state"""
+    x = np.linspace(-12, 12, 241)
+    state = Thermal(nbar=[0.5])
+    ProbX, ProbP = quadrature_marginals(wigner(state.dm([40]), x, x), x, x)
+    var = settings.HBAR * (2 * 0.5 + 1) / 2
+    expected = np.exp(-(x**2) / (2 * var)) / np.sqrt(2 * np.pi * var)
+    assert np.isclose(trapezoid(ProbX, x), 1.0)
+    assert np.allclose(ProbX, expected, atol=1e-6)
+    assert np.allclose(ProbP, expected, atol=1e-6)
+
+
+def test_wigner_marginal_of_product_state():
+    """Tests that the Wigner function of a mode of a product state is the Wigner function of
+    that mode"""
+    thermal, coherent = Thermal(nbar=[0.4]), Coherent(x=[0.3], y=[0.2])
+    dm = (thermal & coherent).dm([10, 10])
+    assert np.allclose(wigner_marginal(dm, 0, xvec, pvec), wigner(thermal.dm([10]), xvec, pvec))
+    assert np.allclose(wigner_marginal(dm, 1, xvec, pvec), wigner(coherent.dm([10]), xvec, pvec))
@@ -0,0 +1,89 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import tensorflow as tf
+
+from mrmustard.lab.gates import BSgate, Dgate, Sgate
+from mrmustard.lab.states import Fock
+from mrmustard.utils.cache import FockCache, fock_cache
+from mrmustard.utils.training import Optimizer
+from mrmustard.math import Math
+
+math = Math()
+
+
+def test_lru_eviction_respects_memory_budget():
+    """Tests that the least recently used entries are evicted when the budget is exceeded"""
+    cache = FockCache(max_bytes=3 * 80)
+    for key in "abc":
+        cache.put(key, np.zeros(10))
+    cache.get_or_compute("a", lambda: None)  # "a" becomes the most recently used
+    cache.put("d", np.zeros(10))
+    assert "b" not in cache
+    assert all(key in cache for key in "acd")
+    assert cache.nbytes == 3 * 80
+    cache.put("e", np.zeros(100))  # larger than the whole budget: not stored
+    assert "e" not in cache and len(cache) == 3
+
+
+def test_hit_and_miss_counters():
+    """Tests that hits and misses are counted"""
+    cache = FockCache(max_bytes=1000)
+    cache.get_or_compute("a", lambda: np.ones(2))
+    cache.get_or_compute("a", lambda: np.ones(2))
+    cache.get_or_compute("b", lambda: np.ones(2))
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+
+def test_unitary_is_cached_per_parameters_and_cutoffs():
+    """Tests that the Fock unitary of a gate is reused for equal parameters, modes and cutoffs"""
+    fock_cache.clear()
+    state = Fock([1, 0])
+    first = state >> BSgate(theta=0.3, phi=0.1)
+    second = state >> BSgate(theta=0.3, phi=0.1)
+    assert fock_cache.hits == 1 and fock_cache.misses == 1
+    assert np.allclose(first.ket(), second.ket())
+    state >> BSgate(theta=0.4, phi=0.1)  # pylint: disable=expression-not-assigned
+    Fock([2, 0]) >> BSgate(theta=0.3, phi=0.1)  # pylint: disable=expression-not-assigned
+    assert fock_cache.misses == 3
+
+
+def test_optimizer_invalidates_trainable_entries():
+    """Tests that the representations of trainable gates are only cached within a step of the
+    optimizer"""
+    fock_cache.clear()
+    D = Dgate(x=0.1, x_trainable=True)
+    Dgate(x=0.2).U(cutoffs=[3])
+    D.U(cutoffs=[3])
+    assert len(fock_cache) == 1
+
+    def cost_fn():
+        assert D.U(cutoffs=[3]) is D.U(cutoffs=[3])  # cached within the step
+        return -math.abs(D.U(cutoffs=[3])[1, 0]) ** 2
+
+    Optimizer(euclidean_lr=0.01).minimize(cost_fn, by_optimizing=[D], max_steps=5)
+    assert len(fock_cache) == 1
+    assert not np.allclose(D.x, 0.1)
+
+
+def test_trainable_gradients_under_successive_tapes():
+    """Tests that the representation of a trainable gate is differentiable under every gradient
+    tape, and not only under the first one"""
+    S = Sgate(r=0.3, r_trainable=True)[0]
+    S.U([5])  # e.g. an eager evaluation for logging
+    for _ in range(2):
+        with tf.GradientTape() as tape:
+            cost = tf.math.real(S.U([5])[0, 0])
+        assert np.isclose(tape.gradient(cost, S.r), -0.142, atol=1e-3)
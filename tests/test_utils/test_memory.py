@@ -0,0 +1,88 @@
+# Copyright 2021 Xanadu Quantum Technologies Inc.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from mrmustard import settings
+from mrmustard.lab.gates import BSgate, Sgate
+from mrmustard.lab.states import SqueezedVacuum
+from mrmustard.physics import fock
+from mrmustard.utils import memory
+
+
+@pytest.fixture
+def small_budget():
+    r"""Restores the memory budget after a test that lowers it."""
+    max_bytes, out_of_core = settings.FOCK_MAX_BYTES, settings.FOCK_OUT_OF_CORE
+    yield
+    settings.FOCK_MAX_BYTES, settings.FOCK_OUT_OF_CORE = max_bytes, out_of_core
+
+
+def random_dm(shape, seed=7):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=shape) + 1j * rng.normal(size=shape)
+
+
+def test_estimate_nbytes():
+    """Tests the estimated size of a tensor"""
+    assert memory.estimate_nbytes([20] * 12) == 20**12 * 16
+    assert memory.estimate_nbytes([3, 4], np.float32) == 48
+
+
+def test_over_budget_raises_early(small_budget):
+    """Tests that a tensor over the budget raises an error with its estimated size"""
+    ket = (SqueezedVacuum(r=[0.5, 0.3]) >> BSgate(0.4)).ket([5, 5])
+    settings.FOCK_MAX_BYTES = 2048
+    with pytest.raises(memory.FockMemoryError, match="9.8 KiB"):
+        fock.ket_to_dm(ket)
+
+
+def test_out_of_core_matches_in_memory(small_budget):
+    """Tests that the out-of-core Fock representation, density matrix, probabilities, partial trace
+    and channels agree with the in-memory ones"""
+    state = SqueezedVacuum(r=[0.5, 0.3]) >> BSgate(0.4)
+    ket = np.array(state.ket([6, 5]))
+    dm_ref = np.array(fock.ket_to_dm(ket))
+    U = np.array(Sgate([0.1, 0.2]).U([6, 5]))
+    choi = np.array(fock.U_to_choi(U))
+    expected = [
+        np.array(fock.CPTP(U, dm_ref, True, True)),
+        np.array(fock.CPTP(choi, dm_ref, False, True)),
+        np.array(fock.CPTP(choi, ket, False, False)),
+    ]
+    settings.FOCK_MAX_BYTES = 2048
+    settings.FOCK_OUT_OF_CORE = True
+    dm = fock.ket_to_dm(ket)
+    assert memory.is_out_of_core(dm) and np.allclose(dm, dm_ref)
+    rep = fock.fock_representation(state.cov, state.means, [6, 5] * 2, return_dm=True)
+    assert memory.is_out_of_core(rep) and np.allclose(rep, dm_ref)
+    assert np.allclose(fock.dm_to_probs(dm), np.abs(ket) ** 2)
+    assert np.allclose(fock.trace(dm, [1]), np.einsum("ijik->jk", dm_ref))
+    assert np.allclose(fock.trace(dm, []), np.einsum("ijij", dm_ref))
+    results = [fock.CPTP(U, dm, True, True), fock.CPTP(choi, dm, False, True)]
+    results.append(fock.CPTP(choi, ket, False, False))
+    assert all(memory.is_out_of_core(r) and np.allclose(r, e) for r, e in zip(results, expected))
+
+
+def test_chunked_trace_and_tensordot(small_budget):
+    """Tests the chunked partial trace and contraction against NumPy"""
+    dm = random_dm((3, 4, 5, 3, 4, 5))
+    settings.FOCK_MAX_BYTES = 2048
+    settings.FOCK_OUT_OF_CORE = True
+    assert np.allclose(memory.chunked_trace(dm, [1]), np.einsum("ijkilk->jl", dm))
+    assert np.allclose(memory.chunked_trace(dm, [0, 2]), np.einsum("ijkljm->iklm", dm))
+    b = random_dm((4, 3, 2))
+    expected = np.tensordot(dm, b, axes=([1, 3], [0, 1]))
+    assert np.allclose(memory.chunked_tensordot(dm, b, axes=([1, 3], [0, 1])), expected)
@@ -20,7 +20,7 @@ import tensorflow as tf
 
 from thewalrus.symplectic import two_mode_squeezing
 
-from mrmustard.lab.gates import Sgate, BSgate, S2gate, Ggate, Interferometer, Ggate
+from mrmustard.lab.gates import Sgate, BSgate, S2gate, Ggate, Interferometer, Ggate, Attenuator
 from mrmustard.lab.circuit import Circuit
 from mrmustard.utils.training import Optimizer
 from mrmustard.lab.states import Vacuum
@@ -258,3 +258,104 @@ def test_making_thermal_state_as_one_half_two_mode_squeezed_vacuum():
     S = G.symplectic.numpy()
     cov = S @ S.T
     assert np.allclose(cov, two_mode_squeezing(2 * np.arcsinh(np.sqrt(nbar)), 0.0))
+
+
+def test_compiled_minimize_matches_eager():
+    """Tests that the compiled training step follows the same trajectory as the eager one for
+    symplectic and orthogonal parameters, and that it is traced once"""
+    histories, values = [], []
+    for compiled in [False, True]:
+        np.random.seed(3)
+        G = Ggate(num_modes=2, symplectic_trainable=True)
+        I = Interferometer(num_modes=2, orthogonal_trainable=True)
+        state_in = Vacuum(2)
+
+        def cost_fn():
+            amps = (state_in >> G >> I).ket(cutoffs=[2, 2])
+            return -tf.abs(amps[1, 1]) ** 2 + tf.abs(amps[0, 1]) ** 2
+
+        opt = Optimizer(symplectic_lr=0.5, orthogonal_lr=0.5)
+        opt.minimize(cost_fn, by_optimizing=[G, I], max_steps=20, compiled=compiled)
+        histories.append(np.array(opt.opt_history[1:], dtype=np.float64))
+        values.append([np.array(G.symplectic), np.array(I.orthogonal)])
+
+    assert np.allclose(histories[0], histories[1])
+    assert all(np.allclose(a, b) for a, b in zip(*values))
+    (step,) = opt._compiled_steps.values()  # pylint: disable=protected-access
+    assert step.experimental_get_tracing_count() == 1
+
+
+def test_compiled_minimize_of_lossy_circuit():
+    """Tests that a circuit with a non-unitary channel can be optimized in a compiled training
+    step, following the same trajectory as the eager one"""
+    histories = []
+    for compiled in [False, True]:
+        np.random.seed(4)
+        G = Ggate(num_modes=1, symplectic_trainable=True)
+        L = Attenuator(transmissivity=[0.8])
+
+        def cost_fn():
+            return -(Vacuum(1) >> G >> L).fock_probabilities([4])[2]
+
+        opt = Optimizer(symplectic_lr=0.1)
+        opt.minimize(cost_fn, by_optimizing=[G], max_steps=10, compiled=compiled)
+        histories.append(np.array(opt.opt_history[1:], dtype=np.float64))
+
+    assert np.allclose(histories[0], histories[1])
+    assert histories[1][-1] < histories[1][0]
+
+
+def test_compiled_steps_are_evicted():
+    """Tests that the optimizer only keeps its most recently used compiled steps"""
+    G = Ggate(num_modes=1, symplectic_trainable=True)
+    opt = Optimizer(symplectic_lr=0.1)
+    cost_fns = [lambda k=k: k * tf.abs((Vacuum(1) >> G).ket(cutoffs=[2])[1]) ** 2 for k in range(6)]
+    for cost_fn in cost_fns:
+        opt.minimize(cost_fn, by_optimizing=[G], max_steps=1, compiled=True)
+    assert len(opt._compiled_steps) == opt.max_compiled_steps  # pylint: disable=protected-access
+    keys = [key[0] for key in opt._compiled_steps]  # pylint: disable=protected-access
+    assert keys == cost_fns[-opt.max_compiled_steps :]
+
+
+def two_photons_factory(index):
+    """The cost function of a two-mode Ggate making a pair of single photons, from a random start"""
+    np.random.seed(index)
+    G = Ggate(num_modes=2, symplectic_trainable=True)
+
+    def cost_fn():
+        amps = (Vacuum(2) >> G).ket(cutoffs=[2, 2])
+        return -tf.abs(amps[1, 1]) ** 2 + tf.abs(amps[0, 1]) ** 2
+
+    return cost_fn, [G]
+
+
+def test_minimize_many_successive_halving():
+    """Tests that the restarts are halved after each round, that the losses are streamed and that
+    the parameters of the best restart are returned"""
+    streamed = []
+    opt = Optimizer(symplectic_lr=0.5)
+    best = opt.minimize_many(
+        two_photons_factory,
+        n_starts=4,
+        workers=0,
+        max_steps=30,
+        halving_steps=10,
+        callback=lambda i, losses: streamed.append((i, len(losses))),
+    )
+    assert sorted(len(h) for h in opt.histories.values()) == [10, 10, 20, 30]
+    assert len(streamed) == 4 + 2 + 1 and all(n == 10 for _, n in streamed)
+    assert opt.opt_history[-1] == min(h[-1] for h in opt.histories.values())
+
+    cost_fn, (G,) = two_photons_factory(0)
+    G.symplectic.assign(best["symplectic"][0])
+    assert np.isclose(cost_fn(), opt.opt_history[-1], atol=1e-2)
+
+
+def test_minimize_many_on_processes():
+    """Tests that the restarts run on a pool of processes give the losses of the restarts run in
+    the current process"""
+    serial, parallel = Optimizer(symplectic_lr=0.5), Optimizer(symplectic_lr=0.5)
+    serial.minimize_many(two_photons_factory, n_starts=2, workers=0, max_steps=3)
+    parallel.minimize_many(two_photons_factory, n_starts=2, workers=2, max_steps=3)
+    for i in range(2):
+        assert np.allclose(parallel.histories[i], serial.histories[i])
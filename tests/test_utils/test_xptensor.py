@@ -16,7 +16,7 @@ from hypothesis import strategies as st, given, assume
 from hypothesis.extra.numpy import arrays
 import pytest
 from mrmustard.lab.states import DisplacedSqueezed
-from mrmustard.utils.xptensor import XPVector, XPMatrix
+from mrmustard.utils.xptensor import XPVector, XPMatrix, compose_XYd
 import numpy as np
 from tests.random import pure_state
 
@@ -270,3 +270,75 @@ def test_addition_all_different_modes_coherences(coherence):
     matrix1 = np.block([[coherence, np.zeros((2 * N, 2 * M))]])
     matrix2 = np.block([[np.zeros((2 * N, 2 * M)), coherence]])
     assert np.allclose((coh1 + coh2).to_xpxp(), matrix1 + matrix2, rtol=1e-5)
+
+
+@st.composite
+def channel_chain(draw, num_modes=5):  # random X, Y and d on random subsets of modes
+    rng = np.random.default_rng(draw(st.integers(0, 2**32 - 1)))
+    chain = []
+    for _ in range(draw(st.integers(1, 8))):
+        modes = draw(st.lists(st.integers(0, num_modes - 1), min_size=1, max_size=3, unique=True))
+        size = 2 * len(modes) if draw(st.booleans()) else 2  # 2 x 2 blocks apply to each mode
+        shapes = [(size, size), (size, size), (size,)]
+        X, Y, d = [rng.normal(size=shape) if draw(st.booleans()) else None for shape in shapes]
+        Y = None if Y is None else Y @ Y.T  # noise matrices are symmetric
+        chain.append((X, Y, d, modes))
+    return chain
+
+
+def dense_XYd(chain, modes):
+    index = {m: i for i, m in enumerate(modes)}
+    M = len(modes)
+    X, Y, d = np.eye(2 * M), np.zeros((2 * M, 2 * M)), np.zeros(2 * M)
+    for opX, opY, opd, op_modes in chain:
+        rows = [index[m] for m in op_modes] + [M + index[m] for m in op_modes]
+        K = len(op_modes)
+        X_, Y_, d_ = np.eye(2 * M), np.zeros((2 * M, 2 * M)), np.zeros(2 * M)
+        if opX is not None:
+            X_[np.ix_(rows, rows)] = np.kron(opX, np.eye(K)) if len(opX) < 2 * K else opX
+        if opY is not None:
+            Y_[np.ix_(rows, rows)] = np.kron(opY, np.eye(K)) if len(opY) < 2 * K else opY
+        if opd is not None:
+            d_[rows] = np.repeat(opd, K) if len(opd) < 2 * K else opd
+        X, Y, d = X_ @ X, X_ @ Y @ X_.T + Y_, X_ @ d + d_
+    return X, Y, d
+
+
+@given(channel_chain())
+def test_compose_XYd_is_the_sequential_product(chain):
+    """Tests that the fused product of a chain of channels is the product of the channels on
+    all the modes, one after the other"""
+    modes = [0, 1, 2, 3, 4, 6]
+    for differentiable in [True, False]:
+        fused = compose_XYd(chain, modes=modes, differentiable=differentiable)
+        for fused, expected in zip(fused, dense_XYd(chain, modes)):
+            assert np.allclose(fused, expected)
+
+
+X1, Y1, d1 = np.array([[1.0, 2.0], [3.0, 4.0]]), np.eye(2), np.array([1.0, 2.0])
+X2 = np.arange(16.0).reshape(4, 4)
+
+
+@pytest.mark.parametrize(
+    "chain, X_modes, Y_modes, d_modes",
+    [
+        ([(X1, None, None, [1])], [1], None, None),
+        ([(X1, None, None, [0]), (None, Y1, None, [2])], [0], [2], None),
+        ([(None, Y1, d1, [0]), (X2, None, None, [0, 1])], [0, 1], [0, 1], [0, 1]),
+        ([(None, None, d1, [3]), (X2, Y1, None, [0, 1])], [0, 1], [0, 1], [3]),
+    ],
+)
+def test_compose_XYd_modes(chain, X_modes, Y_modes, d_modes):
+    """Tests that without modes the fused product is restricted to the modes where it is not
+    trivial, as the products of XPTensors"""
+    all_modes = [0, 1, 2, 3]
+    expected = dense_XYd(chain, all_modes)
+    for differentiable in [True, False]:
+        fused = compose_XYd(chain, differentiable=differentiable)
+        for fused, full, modes in zip(fused, expected, (X_modes, Y_modes, d_modes)):
+            if modes is None:
+                assert fused is None
+            else:
+                rows = modes + [4 + m for m in modes]
+                expected_rows = full[np.ix_(rows, rows)] if full.ndim == 2 else full[rows]
+                assert np.allclose(fused, expected_rows)